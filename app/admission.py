@@ -0,0 +1,328 @@
+"""
+Per-tenant admission control for the expensive routes.
+
+Reconcile, import and explain requests pass ``AdmissionMiddleware`` before they run:
+
+- a token bucket per tenant limits how often they can start (``rate``
+  requests per second, up to ``burst`` at once);
+- at most ``ADMISSION_SLOTS`` run at a time across all tenants, and at most
+  ``concurrency`` per tenant;
+- requests that cannot start yet wait in a weighted fair queue, so a tenant
+  with many queued requests cannot starve the others;
+- when a bucket is empty, the queue is full or a request waited longer than
+  ``ADMISSION_QUEUE_TIMEOUT_SECONDS``, the request is rejected with ``429``
+  and a ``Retry-After`` header.
+
+Limits default to the ``ADMISSION_*`` settings and can be overridden per
+tenant with ``ADMISSION_TENANT_LIMITS``. State lives in the process by
+default; ``set_backend`` swaps in another ``AdmissionBackend`` (for example
+one sharing buckets across workers).
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Protocol
+
+from fastapi.responses import JSONResponse
+from starlette.routing import compile_path
+
+from app import metrics
+from app.config import settings
+
+
+_MAX_RETRY_AFTER = 3_600
+
+
+@dataclass(frozen=True)
+class TenantLimits:
+    rate: float
+    burst: int
+    concurrency: int
+    weight: float = 1.0
+
+
+def limits_for(tenant_id: str) -> TenantLimits:
+    defaults = TenantLimits(
+        rate=settings.ADMISSION_RATE,
+        burst=settings.ADMISSION_BURST,
+        concurrency=settings.ADMISSION_CONCURRENCY,
+        weight=settings.ADMISSION_WEIGHT,
+    )
+    overrides = settings.ADMISSION_TENANT_LIMITS.get(tenant_id)
+    return replace(defaults, **overrides) if overrides else defaults
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1) -> float:
+        """Take ``cost`` tokens; return 0, or the seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float = 1):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+    def full(self, now: float) -> bool:
+        """True once refilled to ``burst``, when the bucket is as good as a new one."""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class AdmissionBackend(Protocol):
+    async def acquire(self, tenant_id: str, limits: TenantLimits, cost: float = 1) -> None:
+        """Wait until the request may run, or raise ``Rejected``."""
+
+    def release(self, tenant_id: str) -> None:
+        """Give back the slot taken by a successful ``acquire``."""
+
+
+@dataclass
+class _Waiter:
+    tenant_id: str
+    concurrency: int
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    started: bool = False
+    cancelled: bool = False
+
+
+class InMemoryBackend:
+    """
+    Token buckets, concurrency counters and a weighted fair queue in this process.
+
+    Each queued request gets a virtual finish tag of
+    ``max(virtual_time, tenant's last tag) + cost / weight``; free slots go to
+    the lowest tag whose tenant is under its concurrency quota. A tenant's
+    requests therefore interleave with everyone else's in proportion to its
+    weight, however many it queues.
+
+    Tenants are keyed by the raw path parameter, so state is dropped once it
+    is no longer needed: a tenant's last tag when it has nothing queued, and
+    full buckets whenever the number of buckets doubles.
+    """
+
+    _SWEEP_MIN = 1_024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._running = {}
+        self._running_total = 0
+        self._queued = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag = {}
+        self._sweep_at = self._SWEEP_MIN
+
+    def _bucket(self, tenant_id: str, limits: TenantLimits) -> TokenBucket:
+        bucket = self._buckets.get(tenant_id)
+        if bucket is None or (bucket.rate, bucket.burst) != (limits.rate, limits.burst):
+            if bucket is None and len(self._buckets) >= self._sweep_at:
+                self._sweep()
+            bucket = self._buckets[tenant_id] = TokenBucket(limits.rate, limits.burst)
+        return bucket
+
+    def _sweep(self):
+        now = time.monotonic()
+        for tenant_id, bucket in list(self._buckets.items()):
+            if bucket.full(now):
+                del self._buckets[tenant_id]
+        self._sweep_at = max(self._SWEEP_MIN, 2 * len(self._buckets))
+
+    def _unqueue(self, tenant_id: str):
+        self._queued[tenant_id] -= 1
+        if not self._queued[tenant_id]:
+            del self._queued[tenant_id]
+            # Nothing left to order against: the next request starts from the virtual time.
+            self._last_tag.pop(tenant_id, None)
+
+    def _start(self, tenant_id: str):
+        self._running[tenant_id] = self._running.get(tenant_id, 0) + 1
+        self._running_total += 1
+
+    async def acquire(self, tenant_id: str, limits: TenantLimits, cost: float = 1):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            bucket = self._bucket(tenant_id, limits)
+            wait = bucket.take(cost)
+            if wait:
+                raise Rejected("rate_limited", wait)
+
+            if (
+                not self._queue
+                and self._running_total < settings.ADMISSION_SLOTS
+                and self._running.get(tenant_id, 0) < limits.concurrency
+            ):
+                self._start(tenant_id)
+                return
+
+            queued = self._queued.get(tenant_id, 0)
+            if (
+                sum(self._queued.values()) >= settings.ADMISSION_MAX_QUEUE
+                or queued >= settings.ADMISSION_MAX_QUEUE_PER_TENANT
+            ):
+                bucket.refund(cost)
+                raise Rejected("queue_full", settings.ADMISSION_RETRY_AFTER_SECONDS)
+
+            tag = max(self._virtual_time, self._last_tag.get(tenant_id, 0.0)) + cost / limits.weight
+            self._last_tag[tenant_id] = tag
+            waiter = _Waiter(tenant_id, limits.concurrency, loop.create_future(), loop)
+            heapq.heappush(self._queue, (tag, next(self._sequence), waiter))
+            self._queued[tenant_id] = queued + 1
+            # A slot may be free for this tenant even though others are queued.
+            self._dispatch()
+
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(waiter.future),
+                timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            )
+        except BaseException as exc:
+            # Timed out, or the client went away while queued.
+            with self._lock:
+                started = waiter.started
+                if not started:
+                    waiter.cancelled = True
+                    self._unqueue(tenant_id)
+
+            if started:
+                if isinstance(exc, asyncio.TimeoutError):
+                    # Dispatched just as the wait timed out: keep the slot.
+                    return
+                self.release(tenant_id)
+                raise
+            if isinstance(exc, asyncio.TimeoutError):
+                raise Rejected("queue_timeout", settings.ADMISSION_RETRY_AFTER_SECONDS)
+            raise
+
+    def release(self, tenant_id: str):
+        with self._lock:
+            self._running[tenant_id] -= 1
+            if not self._running[tenant_id]:
+                del self._running[tenant_id]
+            self._running_total -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        skipped = []
+        while self._queue and self._running_total < settings.ADMISSION_SLOTS:
+            tag, sequence, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            if self._running.get(waiter.tenant_id, 0) >= waiter.concurrency:
+                skipped.append((tag, sequence, waiter))
+                continue
+
+            self._virtual_time = max(self._virtual_time, tag)
+            self._unqueue(waiter.tenant_id)
+            self._start(waiter.tenant_id)
+            waiter.started = True
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+        for item in skipped:
+            heapq.heappush(self._queue, item)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._running_total,
+                "queued": sum(1 for _, _, waiter in self._queue if not waiter.cancelled),
+            }
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+_backend: AdmissionBackend = InMemoryBackend()
+
+
+def get_backend() -> AdmissionBackend:
+    return _backend
+
+
+def set_backend(backend: AdmissionBackend):
+    global _backend
+    _backend = backend
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests to ``routes`` through the backend.
+
+    ``routes`` are ``(method, path template)`` pairs whose template has a
+    ``{tenant_id}`` parameter. The slot is held until the response body has
+    been sent, so streaming responses count for as long as they run.
+    Rejections are answered with ``429``, a ``Retry-After`` header and the
+    usual ``{"detail": ...}`` body.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = [
+            (method, compile_path(path)[0])
+            for method, path in routes
+        ]
+
+    def _tenant(self, scope):
+        for method, pattern in self.routes:
+            if scope["method"] == method:
+                match = pattern.match(scope["path"])
+                if match:
+                    return match.group("tenant_id")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        tenant_id = None
+        if scope["type"] == "http" and settings.ADMISSION_ENABLED:
+            tenant_id = self._tenant(scope)
+
+        if tenant_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        backend = _backend
+        tenant = metrics.tenant_label(tenant_id, admit=False)
+        started = time.perf_counter()
+        try:
+            await backend.acquire(tenant_id, limits_for(tenant_id))
+        except Rejected as exc:
+            metrics.ADMISSION_REJECTED.inc(reason=exc.reason, tenant=tenant)
+            retry_after = max(1, math.ceil(min(exc.retry_after, _MAX_RETRY_AFTER)))
+            response = JSONResponse(
+                {"detail": f"Too many requests for tenant ({exc.reason})"},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        metrics.ADMISSION_WAIT.observe(time.perf_counter() - started, tenant=tenant)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            backend.release(tenant_id)
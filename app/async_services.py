@@ -0,0 +1,135 @@
+"""
+``AsyncSession`` counterparts of the request-path functions in ``app.services``.
+
+Used by the ``async def`` routes when ``ASYNC_DB`` is enabled. They share the
+tenant cache, filter and cursor helpers with the sync services so both modes
+return the same results. Imports and reconciliation stay on the sync engine:
+they are CPU-bound and already run off the event loop. Explain routes also
+use the sync engine for their row lookups, in the threadpool, but await the
+LLM call itself (``ai.explain_async``).
+"""
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.services import (
+    _after_cursor,
+    _count,
+    _invoice_conditions,
+    _page,
+    _tenant_cache,
+)
+
+
+async def _get_tenant_or_404(db: AsyncSession, tenant_id: str):
+    if _tenant_cache.get(tenant_id):
+        return
+
+    exists = (await db.execute(
+        select(models.Tenant.id).filter_by(id=tenant_id)
+    )).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    _tenant_cache.set(tenant_id, True)
+
+
+async def create_tenant(db: AsyncSession, name: str):
+    tenant = models.Tenant(name=name)
+    db.add(tenant)
+    await db.commit()
+    await db.refresh(tenant)
+    _tenant_cache.set(tenant.id, True)
+    return tenant
+
+
+async def create_invoice(db: AsyncSession, tenant_id: str, data):
+    await _get_tenant_or_404(db, tenant_id)
+
+    invoice = models.Invoice(tenant_id=tenant_id, **data)
+    db.add(invoice)
+    await db.commit()
+    await db.refresh(invoice)
+
+    return invoice
+
+
+async def list_invoices(db: AsyncSession, tenant_id: str, filters, cursor=None, limit=20, count="none"):
+    """Async ``services.list_invoices``: same keyset pages, cursors and counts."""
+    await _get_tenant_or_404(db, tenant_id)
+    conditions = _invoice_conditions(tenant_id, filters)
+
+    total = None
+    if count == "estimated":
+        # The planner estimate needs EXPLAIN on a sync connection.
+        total = await db.run_sync(
+            lambda sync_db: _count(
+                sync_db,
+                sync_db.query(models.Invoice).filter(*conditions),
+                count,
+            )
+        )
+    elif count == "exact":
+        total = await db.scalar(
+            select(func.count()).select_from(models.Invoice).where(*conditions)
+        )
+
+    if cursor:
+        conditions.append(_after_cursor(models.Invoice, cursor))
+
+    rows = (await db.scalars(
+        select(models.Invoice)
+        .where(*conditions)
+        .order_by(models.Invoice.created_at, models.Invoice.id)
+        .limit(limit + 1)
+    )).all()
+
+    return _page(rows, limit, total)
+
+
+async def delete_invoice(db: AsyncSession, tenant_id: str, invoice_id: str):
+    await _get_tenant_or_404(db, tenant_id)
+
+    invoice = await db.scalar(
+        select(models.Invoice).filter_by(id=invoice_id, tenant_id=tenant_id)
+    )
+
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found for tenant")
+
+    # Matches cascade on PostgreSQL; SQLite does not enforce foreign keys.
+    await db.execute(
+        delete(models.Match).filter_by(tenant_id=tenant_id, invoice_id=invoice_id)
+    )
+    await db.delete(invoice)
+    await db.commit()
+
+
+async def confirm_match(db: AsyncSession, tenant_id: str, match_id: str):
+    await _get_tenant_or_404(db, tenant_id)
+
+    match = await db.scalar(
+        select(models.Match).filter_by(id=match_id, tenant_id=tenant_id)
+    )
+
+    if not match:
+        raise HTTPException(status_code=404, detail="Match not found for tenant")
+
+    if match.status == "confirmed":
+        raise HTTPException(status_code=409, detail="Match is already confirmed")
+
+    match.status = "confirmed"
+
+    invoice = await db.scalar(
+        select(models.Invoice).filter_by(id=match.invoice_id, tenant_id=tenant_id)
+    )
+
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice for match not found")
+
+    invoice.status = "matched"
+
+    await db.commit()
+    await db.refresh(match)
+
+    return match
@@ -1,10 +1,154 @@
+from typing import Dict, Literal, Optional
+
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+_ADMISSION_LIMIT_KEYS = {"rate": float, "burst": int, "concurrency": int, "weight": float}
+
 
 class Settings(BaseSettings):
     DATABASE_URL: str
     GOOGLE_API_KEY: str
 
+    # Tenants with at least this many invoice x transaction pairs are scored
+    # with the vectorized NumPy batch scorer instead of the candidate index.
+    RECONCILE_BATCH_MIN_PAIRS: int = 250_000
+
+    # Batch-scored tenants with at least RECONCILE_PARALLEL_MIN_PAIRS pairs are
+    # split into invoice shards scored by this many processes (capped at the
+    # CPU count). 1 scores everything in the request's process.
+    RECONCILE_PROCESSES: int = 1
+    RECONCILE_PARALLEL_MIN_PAIRS: int = 20_000_000
+
+    # Incremental reconciles never move their watermark closer to now() than
+    # this, so rows stamped before a run but committed after it (long imports,
+    # clock skew between workers) are still scanned by a later run.
+    RECONCILE_WATERMARK_LAG_SECONDS: float = 600
+
+    # Worker threads running `POST /reconcile?async=true` jobs.
+    RECONCILE_JOB_WORKERS: int = 2
+    # Running jobs refresh their heartbeat this often; on startup, running jobs
+    # whose heartbeat is older than RECONCILE_JOB_STALE_SECONDS are failed.
+    RECONCILE_JOB_HEARTBEAT_SECONDS: float = 15
+    RECONCILE_JOB_STALE_SECONDS: float = 120
+
+    # Rows per executemany batch when writing proposed matches.
+    MATCH_INSERT_CHUNK_SIZE: int = 5_000
+
+    # "python" scores in-process; "sql" pushes `mode=all` reconciles into a
+    # single INSERT ... SELECT so rows never leave the database.
+    RECONCILE_ENGINE: Literal["python", "sql"] = "python"
+
+    # Rows validated, inserted and committed together by streaming imports.
+    IMPORT_STREAM_BATCH_SIZE: int = 1_000
+
+    # Idempotency keys expire after this long and are purged in the background.
+    IDEMPOTENCY_TTL_SECONDS: int = 86_400
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 300
+    # In-process cache of recently used keys and their replay payloads.
+    IDEMPOTENCY_CACHE_SIZE: int = 10_000
+    IDEMPOTENCY_CACHE_TTL_SECONDS: int = 300
+    # How long a duplicate request waits for the in-flight import sharing its key.
+    IDEMPOTENCY_WAIT_SECONDS: float = 30
+
+    # Process-local cache of tenant ids known to exist.
+    TENANT_CACHE_SIZE: int = 10_000
+    TENANT_CACHE_TTL_SECONDS: int = 600
+
+    # Serve tenant and invoice routes from `async def` handlers on an
+    # AsyncEngine (aiosqlite / asyncpg) instead of the threadpool.
+    ASYNC_DB: bool = False
+    # Defaults to DATABASE_URL with its driver swapped for the asyncio one.
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Connection pool per engine: steady connections, extra burst connections,
+    # and how long a request waits for one before "QueuePool limit" errors.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # Reopen connections older than this (-1 disables) and ping them on checkout.
+    DB_POOL_RECYCLE_SECONDS: int = 1_800
+    DB_POOL_PRE_PING: bool = True
+    # PostgreSQL statement_timeout for every connection; 0 disables it.
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    # Memoized LLM explanations, keyed by a hash of the sanitized prompt inputs.
+    EXPLANATION_CACHE_SIZE: int = 1_000
+    EXPLANATION_CACHE_TTL_SECONDS: int = 86_400
+    # Also keep explanations in the `explanations` table, shared across workers.
+    EXPLANATION_CACHE_PERSIST: bool = False
+
+    # Batch explain: pairs per request, LLM calls in flight and per-call timeout.
+    EXPLAIN_BATCH_MAX_PAIRS: int = 200
+    EXPLAIN_BATCH_CONCURRENCY: int = 8
+    EXPLAIN_TIMEOUT_SECONDS: float = 20
+
+    # Run `Base.metadata.create_all` at startup. Turn off where the schema is
+    # managed separately to skip the catalog round-trips on every worker start.
+    CREATE_SCHEMA_ON_STARTUP: bool = True
+
+    # Parsed and validated GraphQL documents, keyed by the sha256 of the query.
+    GRAPHQL_DOCUMENT_CACHE_SIZE: int = 1_000
+    GRAPHQL_DOCUMENT_CACHE_TTL_SECONDS: int = 86_400
+    # Per-operation limits: selection depth and estimated objects resolved.
+    GRAPHQL_MAX_DEPTH: int = 10
+    GRAPHQL_MAX_COST: int = 10_000
+    # Largest `first` a connection accepts; also the size assumed for list
+    # fields without `first` when estimating the cost of a query.
+    GRAPHQL_MAX_PAGE_SIZE: int = 100
+
+    # Prometheus metrics at GET /metrics. Tenants beyond the first
+    # METRICS_MAX_TENANTS seen by a process share the `other` label.
+    METRICS_ENABLED: bool = True
+    METRICS_MAX_TENANTS: int = 100
+
+    # Log statements at or above this duration to `app.sql.slow`; 0 disables.
+    SLOW_QUERY_MS: int = 500
+    # Return X-DB-Query-Count / X-DB-Time-Ms headers and log per-request totals.
+    DEBUG_SQL: bool = False
+
+    # Admission control for reconcile, import and explain routes. At most
+    # ADMISSION_SLOTS run at once; the rest wait in a weighted fair queue, and
+    # are rejected with 429 when it is full or they waited too long.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_SLOTS: int = 8
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_MAX_QUEUE_PER_TENANT: int = 16
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10
+    ADMISSION_RETRY_AFTER_SECONDS: float = 1
+    # Per-tenant defaults: token bucket refill per second and size, requests
+    # running at once, and share of the fair queue.
+    ADMISSION_RATE: float = 5
+    ADMISSION_BURST: int = 20
+    ADMISSION_CONCURRENCY: int = 2
+    ADMISSION_WEIGHT: float = 1
+    # Per-tenant overrides of the above, e.g. '{"<tenant id>": {"rate": 20, "concurrency": 4}}'.
+    ADMISSION_TENANT_LIMITS: Dict[str, Dict[str, float]] = {}
+
+    @field_validator("ADMISSION_TENANT_LIMITS")
+    @classmethod
+    def _check_tenant_limits(cls, value):
+        # Checked here so a bad override fails startup instead of every
+        # request from that tenant.
+        for tenant_id, overrides in value.items():
+            for key, limit in overrides.items():
+                kind = _ADMISSION_LIMIT_KEYS.get(key)
+                if kind is None:
+                    raise ValueError(
+                        f"Unknown admission limit {key!r} for tenant {tenant_id}; "
+                        f"expected one of {', '.join(_ADMISSION_LIMIT_KEYS)}"
+                    )
+                if kind is int and not limit.is_integer():
+                    raise ValueError(f"Admission limit {key!r} for tenant {tenant_id} must be an integer")
+                if key in ("rate", "burst") and limit < 0:
+                    raise ValueError(f"Admission limit {key!r} for tenant {tenant_id} must not be negative")
+                if key == "concurrency" and limit < 1:
+                    raise ValueError(f"Admission concurrency for tenant {tenant_id} must be at least 1")
+                if key == "weight" and limit <= 0:
+                    raise ValueError(f"Admission weight for tenant {tenant_id} must be positive")
+                overrides[key] = kind(limit)
+        return value
+
     class Config:
         env_file = ".env"
 
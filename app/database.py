@@ -1,9 +1,44 @@
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from app.config import settings
+from app.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
-engine = create_engine(settings.DATABASE_URL, echo=False)
+
+def engine_options(url: str, is_async: bool = False):
+    """Pool and statement-timeout arguments for ``create_engine`` from settings."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps one connection per thread; there is no pool to size.
+        return {}
+
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout and backend == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+
+    return options
+
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    **engine_options(settings.DATABASE_URL),
+)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -11,6 +46,35 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# asyncio drivers used when ASYNC_DB is enabled.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a sync ``DATABASE_URL`` for its asyncio counterpart."""
+    url = make_url(url)
+    drivername = _ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB:
+    _async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(
+        _async_url,
+        echo=False,
+        **engine_options(_async_url, is_async=True),
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
 Base = declarative_base()
 
 
@@ -20,3 +84,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
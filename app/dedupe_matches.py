@@ -0,0 +1,74 @@
+"""
+One-off cleanup of duplicate matches before the ``uq_match_pair`` index exists.
+
+Usage:
+    python -m app.dedupe_matches            # report duplicates only
+    python -m app.dedupe_matches --apply    # delete them and create the matches indexes
+
+``create_all`` does not add indexes to existing tables, and the unique index
+cannot be created while duplicates remain. For every
+``(tenant_id, invoice_id, bank_transaction_id)`` this keeps one row: a
+confirmed match if there is one, otherwise the highest score, then the
+oldest. Run it once per existing database.
+"""
+import argparse
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+_DELETE_CHUNK = 500
+
+
+def duplicate_match_ids(db: Session):
+    """Ids of every match that is not the one kept for its pair."""
+    match = models.Match
+    rank = func.row_number().over(
+        partition_by=(match.tenant_id, match.invoice_id, match.bank_transaction_id),
+        order_by=(
+            case((match.status == "confirmed", 0), else_=1),
+            func.coalesce(match.score, -1).desc(),
+            match.created_at,
+            match.id,
+        ),
+    ).label("rank")
+    ranked = select(match.id, rank).subquery()
+    return list(db.scalars(select(ranked.c.id).where(ranked.c.rank > 1)))
+
+
+def dedupe_matches(db: Session) -> int:
+    """Delete duplicate matches; returns how many were deleted."""
+    ids = duplicate_match_ids(db)
+    for start in range(0, len(ids), _DELETE_CHUNK):
+        db.query(models.Match).filter(
+            models.Match.id.in_(ids[start:start + _DELETE_CHUNK])
+        ).delete(synchronize_session=False)
+    db.commit()
+    return len(ids)
+
+
+def create_match_indexes(bind):
+    for index in models.Match.__table__.indexes:
+        index.create(bind, checkfirst=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apply", action="store_true", help="delete duplicates and create indexes")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal, engine
+
+    with SessionLocal() as db:
+        if not args.apply:
+            print(f"{len(duplicate_match_ids(db))} duplicate matches; rerun with --apply to delete them")
+            return
+        print(f"deleted {dedupe_matches(db)} duplicate matches")
+
+    create_match_indexes(engine)
+    print("matches indexes are in place")
+
+
+if __name__ == "__main__":
+    main()
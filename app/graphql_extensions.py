@@ -0,0 +1,199 @@
+"""
+Persisted queries, a parsed-document cache and a cost limit for GraphQL.
+
+Clients repeat the same few operations, so each distinct query text is
+parsed and validated once and kept in a bounded cache under its sha256.
+Clients may send only that hash (Apollo's automatic persisted queries
+protocol) instead of the query text.
+"""
+import hashlib
+
+from graphql import GraphQLError, get_named_type, get_nullable_type, is_list_type
+from graphql.language import (
+    FieldNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+)
+from graphql.utilities import get_operation_ast, value_from_ast_untyped
+from strawberry.extensions import SchemaExtension
+
+from app.cache import TTLCache
+from app.config import settings
+
+# sha256 of the query text -> (query text, parsed and validated document).
+_documents = TTLCache(
+    maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE,
+    ttl=settings.GRAPHQL_DOCUMENT_CACHE_TTL_SECONDS,
+)
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueries(SchemaExtension):
+    """
+    Serve known queries from the document cache, by text or by hash.
+
+    A request carrying ``extensions.persistedQuery.sha256Hash`` without a
+    query is answered from the cache; an unknown hash gets a
+    ``PersistedQueryNotFound`` error, and the client retries with the full
+    query, which registers it. Cached documents skip parsing and validation.
+    """
+
+    def on_operation(self):
+        context = self.execution_context
+        persisted = (context.operation_extensions or {}).get("persistedQuery") or {}
+        digest = persisted.get("sha256Hash")
+
+        if context.query is not None:
+            actual = query_hash(context.query)
+            if digest is not None and digest != actual:
+                raise GraphQLError(
+                    "provided sha does not match query",
+                    extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+                )
+            digest = actual
+        elif digest is None:
+            # Neither query nor hash: let Strawberry reject the request.
+            yield
+            return
+
+        cached = _documents.get(digest)
+        if cached is None and context.query is None:
+            raise GraphQLError(
+                "PersistedQueryNotFound",
+                extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+            )
+
+        if cached is not None:
+            context.query, context.graphql_document = cached
+            # Only documents that passed validation are cached.
+            context.pre_execution_errors = []
+
+        self._digest = digest
+        self._cached = cached is not None
+        yield
+
+    def on_validate(self):
+        yield
+        context = self.execution_context
+        if not self._cached and not context.pre_execution_errors:
+            _documents.set(self._digest, (context.query, context.graphql_document))
+
+
+def _page_size(node: FieldNode, field, variables, paged: bool) -> int:
+    """
+    How many objects ``field`` can return: its ``first`` argument (or that
+    argument's default), else ``GRAPHQL_MAX_PAGE_SIZE`` for a list, unless
+    the list is the page of an enclosing field that took ``first``.
+    """
+    if field is None:
+        return 1
+
+    argument = field.args.get("first")
+    if argument is None:
+        if paged or not is_list_type(get_nullable_type(field.type)):
+            return 1
+        return settings.GRAPHQL_MAX_PAGE_SIZE
+
+    for arg in node.arguments:
+        if arg.name.value != "first":
+            continue
+        if isinstance(arg.value, IntValueNode):
+            return int(arg.value.value)
+        if isinstance(arg.value, VariableNode):
+            value = variables.get(arg.value.name.value)
+            if value is not None:
+                return int(value)
+
+    return argument.default_value if isinstance(argument.default_value, int) else 1
+
+
+def _selection_cost(schema, parent_type, selection_set, fragments, variables, paged=False) -> int:
+    total = 0
+    for node in selection_set.selections:
+        if isinstance(node, FieldNode):
+            if node.name.value.startswith("__"):
+                continue
+            field = getattr(parent_type, "fields", {}).get(node.name.value)
+            child_cost = 0
+            if node.selection_set is not None and field is not None:
+                child_cost = _selection_cost(
+                    schema,
+                    get_named_type(field.type),
+                    node.selection_set,
+                    fragments,
+                    variables,
+                    paged="first" in field.args,
+                )
+            total += 1 + _page_size(node, field, variables, paged) * child_cost
+
+        elif isinstance(node, FragmentSpreadNode):
+            fragment = fragments[node.name.value]
+            fragment_type = schema.get_type(fragment.type_condition.name.value)
+            total += _selection_cost(
+                schema, fragment_type, fragment.selection_set, fragments, variables, paged
+            )
+
+        elif isinstance(node, InlineFragmentNode):
+            fragment_type = (
+                schema.get_type(node.type_condition.name.value)
+                if node.type_condition is not None else parent_type
+            )
+            total += _selection_cost(
+                schema, fragment_type, node.selection_set, fragments, variables, paged
+            )
+    return total
+
+
+def query_cost(schema, document, operation_name=None, variables=None) -> int:
+    """
+    Estimated number of objects an operation can resolve.
+
+    Every field costs 1, and a field with a ``first`` argument multiplies the
+    cost of its sub-selection by the requested (or default) page size. A
+    ``first`` bound to a variable the request leaves out takes the
+    variable's default. Other list fields multiply by
+    ``GRAPHQL_MAX_PAGE_SIZE``, except the edges of a page, which ``first``
+    already counts.
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == "fragment_definition"
+    }
+    defaults = {
+        definition.variable.name.value: value_from_ast_untyped(definition.default_value)
+        for definition in operation.variable_definitions
+        if definition.default_value is not None
+    }
+    root_type = schema.get_root_type(operation.operation)
+    return _selection_cost(
+        schema, root_type, operation.selection_set, fragments, {**defaults, **(variables or {})}
+    )
+
+
+class QueryCostLimiter(SchemaExtension):
+    """Reject operations whose ``query_cost`` exceeds ``GRAPHQL_MAX_COST`` before executing them."""
+
+    def on_execute(self):
+        context = self.execution_context
+        cost = query_cost(
+            context.schema._schema,
+            context.graphql_document,
+            context.provided_operation_name,
+            context.variables,
+        )
+        if cost > settings.GRAPHQL_MAX_COST:
+            raise GraphQLError(
+                f"Query cost {cost} exceeds the limit of {settings.GRAPHQL_MAX_COST}",
+                extensions={"code": "QUERY_TOO_EXPENSIVE"},
+            )
+        yield
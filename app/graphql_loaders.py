@@ -0,0 +1,148 @@
+"""
+Per-request DataLoaders and column pushdown for the GraphQL resolvers.
+
+Nested fields resolve through ``Loaders``, so every sibling lookup of the same
+kind in a request becomes one ``IN (...)`` query. Queries only load the
+columns the operation selected (plus the keys the resolvers need); anything
+else raises instead of silently lazy loading one row at a time.
+"""
+import re
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, load_only
+from strawberry.dataloader import DataLoader
+from strawberry.types import Info
+from strawberry.types.nodes import SelectedField
+
+from app.services import _after_cursor
+
+_IN_CHUNK = 500
+
+_CAMEL_BOUNDARY = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def _flatten(selections):
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            yield selection
+        else:
+            # Fragment spreads (which also have a name) and inline fragments
+            # carry their own selections.
+            yield from _flatten(selection.selections)
+
+
+def selected_fields(info: Info, *path: str):
+    """Names of the fields selected under the current field, following ``path``."""
+    selections = list(_flatten(info.selected_fields[0].selections))
+    for name in path:
+        selections = [
+            child
+            for field in selections if field.name == name
+            for child in _flatten(field.selections)
+        ]
+    return {field.name for field in selections}
+
+
+def columns_for(model, names, required=("id",)):
+    """Mapped columns of ``model`` named by GraphQL ``names``, plus ``required``."""
+    table_columns = model.__table__.columns
+    wanted = set(required)
+    wanted.update(_CAMEL_BOUNDARY.sub("_", name).lower() for name in names)
+    return [getattr(model, name) for name in sorted(wanted) if name in table_columns]
+
+
+class Loaders:
+    """
+    Lazily created DataLoaders for one request's session.
+
+    A loader is keyed by model, key column and loaded columns, so fields
+    selecting different columns never share a partially loaded batch.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._loaders = {}
+
+    def get(self, model, key: str, columns, many: bool = False) -> DataLoader:
+        cache_key = (model, key, tuple(column.key for column in columns), many)
+        loader = self._loaders.get(cache_key)
+        if loader is None:
+            loader = DataLoader(load_fn=self._batch(model, key, columns, many))
+            self._loaders[cache_key] = loader
+        return loader
+
+    def page(self, model, key: str, columns, first: int, after=None) -> DataLoader:
+        """
+        Loader of keyset pages: up to ``first + 1`` rows per key in
+        ``(created_at, id)`` order, after the ``after`` cursor.
+        """
+        cache_key = (model, key, tuple(column.key for column in columns), "page", first, after)
+        loader = self._loaders.get(cache_key)
+        if loader is None:
+            loader = DataLoader(load_fn=self._page_batch(model, key, columns, first, after))
+            self._loaders[cache_key] = loader
+        return loader
+
+    def _page_batch(self, model, key: str, columns, first: int, after):
+        key_column = getattr(model, key)
+        loaded = {column.key for column in columns}
+        columns = [*columns, *(
+            column for column in (key_column, model.created_at, model.id)
+            if column.key not in loaded
+        )]
+
+        # Every key's page comes from the same query: rows are numbered per
+        # key and only the first ``first + 1`` of each are loaded.
+        async def load(keys):
+            grouped = {k: [] for k in keys}
+            for start in range(0, len(keys), _IN_CHUNK):
+                conditions = [key_column.in_(keys[start:start + _IN_CHUNK])]
+                if after:
+                    conditions.append(_after_cursor(model, after))
+                ranked = select(
+                    model.id,
+                    func.row_number().over(
+                        partition_by=key_column,
+                        order_by=(model.created_at, model.id),
+                    ).label("position"),
+                ).where(*conditions).subquery()
+
+                rows = self.db.query(model).options(
+                    load_only(*columns, raiseload=True)
+                ).join(
+                    ranked, ranked.c.id == model.id
+                ).filter(
+                    ranked.c.position <= first + 1
+                ).order_by(model.created_at, model.id).all()
+                for row in rows:
+                    grouped[getattr(row, key)].append(row)
+            return [grouped[k] for k in keys]
+
+        return load
+
+    def _batch(self, model, key: str, columns, many: bool):
+        key_column = getattr(model, key)
+        if key not in {column.key for column in columns}:
+            columns = [*columns, key_column]
+
+        # The session is synchronous and shared by the request, so batches
+        # run inline on the event loop rather than concurrently in threads.
+        async def load(keys):
+            rows = []
+            for start in range(0, len(keys), _IN_CHUNK):
+                rows += self.db.query(model).options(
+                    load_only(*columns, raiseload=True)
+                ).filter(
+                    key_column.in_(keys[start:start + _IN_CHUNK])
+                ).order_by(model.id).all()
+
+            if many:
+                grouped = {k: [] for k in keys}
+                for row in rows:
+                    grouped[getattr(row, key)].append(row)
+                return [grouped[k] for k in keys]
+
+            by_key = {getattr(row, key): row for row in rows}
+            return [by_key.get(k) for k in keys]
+
+        return load
@@ -1,13 +1,46 @@
 import strawberry
+from datetime import datetime
 from typing import List, Optional
+from strawberry.extensions import QueryDepthLimiter
 from strawberry.types import Info
 from sqlalchemy.orm import Session
 
-from app.database import get_db
-from app import services, models
+from app import models, services
+from app.config import settings
+from app.graphql_extensions import PersistedQueries, QueryCostLimiter
+from app.graphql_loaders import Loaders, columns_for, selected_fields
+
+MAX_PAGE_SIZE = settings.GRAPHQL_MAX_PAGE_SIZE
+
+# Columns every loaded row needs whatever the selection: primary keys,
+# foreign keys followed by nested fields, and the keyset cursor.
+_TENANT_KEYS = ("id", "created_at")
+_INVOICE_KEYS = ("id", "tenant_id", "created_at")
+_MATCH_KEYS = ("id", "invoice_id", "bank_transaction_id")
+_TRANSACTION_KEYS = ("id",)
+
+
+
+def get_db_from_context(info: Info) -> Session:
+    return info.context["db"]
+
+
+def get_loaders(info: Info) -> Loaders:
+    return info.context["loaders"]
+
+
+def _check_page_size(first: int):
+    if not 1 <= first <= MAX_PAGE_SIZE:
+        raise ValueError(f"first must be between 1 and {MAX_PAGE_SIZE}")
 
 
 
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str]
+
+
 @strawberry.type
 class TenantType:
     id: str
@@ -15,12 +48,14 @@ class TenantType:
 
 
 @strawberry.type
-class InvoiceType:
+class BankTransactionType:
     id: str
     tenant_id: str
+    external_id: Optional[str]
     amount: float
     currency: str
-    status: str
+    description: Optional[str]
+    posted_at: Optional[datetime]
 
 
 @strawberry.type
@@ -31,10 +66,98 @@ class MatchType:
     score: float
     status: str
 
+    @strawberry.field
+    async def invoice(self, info: Info) -> Optional["InvoiceType"]:
+        columns = columns_for(models.Invoice, selected_fields(info), _INVOICE_KEYS)
+        loader = get_loaders(info).get(models.Invoice, "id", columns)
+        return await loader.load(self.invoice_id)
 
+    @strawberry.field
+    async def transaction(self, info: Info) -> Optional[BankTransactionType]:
+        columns = columns_for(models.BankTransaction, selected_fields(info), _TRANSACTION_KEYS)
+        loader = get_loaders(info).get(models.BankTransaction, "id", columns)
+        return await loader.load(self.bank_transaction_id)
+
+
+@strawberry.type
+class InvoiceType:
+    id: str
+    tenant_id: str
+    amount: float
+    currency: str
+    status: str
+    description: Optional[str]
+    invoice_date: Optional[datetime]
+
+    @strawberry.field
+    async def tenant(self, info: Info) -> Optional[TenantType]:
+        columns = columns_for(models.Tenant, selected_fields(info), _TENANT_KEYS)
+        loader = get_loaders(info).get(models.Tenant, "id", columns)
+        return await loader.load(self.tenant_id)
+
+    @strawberry.field
+    async def matches(
+        self,
+        info: Info,
+        first: int = 20,
+        after: Optional[str] = None,
+    ) -> "MatchConnection":
+        _check_page_size(first)
+        columns = columns_for(models.Match, selected_fields(info, "edges", "node"), _MATCH_KEYS)
+        loader = get_loaders(info).page(models.Match, "invoice_id", columns, first, after)
+        page = services._page(await loader.load(self.id), first, None)
+        return _connection(MatchConnection, MatchEdge, page)
 
-def get_db_from_context(info: Info) -> Session:
-    return info.context["db"]
+
+@strawberry.type
+class TenantEdge:
+    cursor: str
+    node: TenantType
+
+
+@strawberry.type
+class TenantConnection:
+    edges: List[TenantEdge]
+    page_info: PageInfo
+
+
+@strawberry.type
+class InvoiceEdge:
+    cursor: str
+    node: InvoiceType
+
+
+@strawberry.type
+class InvoiceConnection:
+    edges: List[InvoiceEdge]
+    page_info: PageInfo
+
+
+@strawberry.type
+class MatchEdge:
+    cursor: str
+    node: MatchType
+
+
+@strawberry.type
+class MatchConnection:
+    edges: List[MatchEdge]
+    page_info: PageInfo
+
+
+
+def _connection(connection_type, edge_type, page):
+    edges = [
+        edge_type(cursor=services.encode_cursor(row.created_at, row.id), node=row)
+        for row in page["items"]
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=page["next_cursor"] is not None,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+    )
 
 
 
@@ -42,9 +165,18 @@ def get_db_from_context(info: Info) -> Session:
 class Query:
 
     @strawberry.field
-    def tenants(self, info: Info) -> List[TenantType]:
+    def tenants(
+        self,
+        info: Info,
+        first: int = 20,
+        after: Optional[str] = None,
+    ) -> TenantConnection:
+        _check_page_size(first)
         db = get_db_from_context(info)
-        return db.query(models.Tenant).all()
+        columns = columns_for(models.Tenant, selected_fields(info, "edges", "node"), _TENANT_KEYS)
+
+        page = services.list_tenants(db, cursor=after, limit=first, columns=columns)
+        return _connection(TenantConnection, TenantEdge, page)
 
     @strawberry.field
     def invoices(
@@ -52,14 +184,21 @@ class Query:
         info: Info,
         tenant_id: str,
         status: Optional[str] = None,
-    ) -> List[InvoiceType]:
+        first: int = 20,
+        after: Optional[str] = None,
+    ) -> InvoiceConnection:
+        _check_page_size(first)
         db = get_db_from_context(info)
+        columns = columns_for(models.Invoice, selected_fields(info, "edges", "node"), _INVOICE_KEYS)
 
         filters = {}
         if status:
             filters["status"] = status
 
-        return services.list_invoices(db, tenant_id, filters)
+        page = services.list_invoices(
+            db, tenant_id, filters, cursor=after, limit=first, columns=columns
+        )
+        return _connection(InvoiceConnection, InvoiceEdge, page)
 
 
 
@@ -93,4 +232,12 @@ class Mutation:
 
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    extensions=[
+        PersistedQueries,
+        QueryDepthLimiter(max_depth=settings.GRAPHQL_MAX_DEPTH),
+        QueryCostLimiter,
+    ],
+)
@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from fastapi import HTTPException
+from sqlalchemy import inspect, or_
+from sqlalchemy.orm import Session
+
+from app import admission, models, services
+from app.config import settings
+from app.database import SessionLocal
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RECONCILE_JOB_WORKERS,
+    thread_name_prefix="reconcile-job",
+)
+
+# Live (pairs_scored, pairs_total) for running jobs; persisted when the job ends.
+_progress = {}
+_progress_lock = threading.Lock()
+
+_MATCH_ID_CHUNK = 500
+
+# Recorded on the jobs this process claims.
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+logger = logging.getLogger(__name__)
+
+# Jobs waiting for a worker: tenant_id -> deque of (finish tag, job_id), and
+# the jobs running per tenant. Workers take the waiting job with the lowest
+# tag whose tenant is under its admission concurrency, like the admission
+# queue does for requests.
+_waiting = {}
+_running = {}
+_last_tag = {}
+_virtual_time = 0.0
+_schedule_lock = threading.Lock()
+
+
+def _serialize_job(job: models.ReconcileJob):
+    with _progress_lock:
+        scored, total = _progress.get(job.id, (job.pairs_scored, job.pairs_total))
+
+    return {
+        "id": job.id,
+        "tenant_id": job.tenant_id,
+        "full": job.full,
+        "mode": job.mode,
+        "top_k": job.top_k,
+        "min_score": job.min_score,
+        "status": job.status,
+        "pairs_scored": scored,
+        "pairs_total": total,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _heartbeat(job_id: str, stop: threading.Event):
+    """Refresh the heartbeat of a job this process runs until ``stop`` is set."""
+    while not stop.wait(settings.RECONCILE_JOB_HEARTBEAT_SECONDS):
+        try:
+            with SessionLocal() as db:
+                db.query(models.ReconcileJob).filter_by(
+                    id=job_id, owner=_OWNER, status="running"
+                ).update({"heartbeat_at": datetime.now(timezone.utc)}, synchronize_session=False)
+                db.commit()
+        except Exception:
+            logger.exception("Could not refresh the heartbeat of reconcile job %s", job_id)
+
+
+def _run_reconcile_job(job_id: str):
+    db = SessionLocal()
+    try:
+        claimed = db.query(models.ReconcileJob).filter_by(id=job_id, status="queued").update(
+            {"status": "running", "owner": _OWNER, "heartbeat_at": datetime.now(timezone.utc)},
+            synchronize_session=False,
+        )
+        db.commit()
+        if not claimed:
+            # Recovered by more than one process after a restart; another one runs it.
+            return
+        job = db.get(models.ReconcileJob, job_id)
+
+        def progress(scored, total):
+            with _progress_lock:
+                _progress[job_id] = (scored, total)
+
+        stop = threading.Event()
+        threading.Thread(
+            target=_heartbeat, args=(job_id, stop), name="reconcile-heartbeat", daemon=True
+        ).start()
+        try:
+            matches = services.reconcile(
+                db,
+                job.tenant_id,
+                full=job.full,
+                mode=job.mode,
+                top_k=job.top_k,
+                min_score=job.min_score,
+                progress=progress,
+            )
+        except Exception as exc:
+            db.rollback()
+            outcome = {
+                "status": "failed",
+                "error": exc.detail if isinstance(exc, HTTPException) else repr(exc),
+            }
+        else:
+            outcome = {
+                "status": "succeeded",
+                "error": None,
+                "match_ids": json.dumps([match["id"] for match in matches]),
+            }
+        finally:
+            stop.set()
+
+        with _progress_lock:
+            scored, total = _progress.pop(job_id, (0, 0))
+
+        # A job whose heartbeat went stale may have been failed by a starting
+        # process meanwhile; it keeps that status.
+        db.query(models.ReconcileJob).filter_by(id=job_id, owner=_OWNER, status="running").update(
+            {
+                **outcome,
+                "pairs_scored": scored,
+                "pairs_total": total,
+                "finished_at": datetime.now(timezone.utc),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _enqueue(tenant_id: str, job_id: str):
+    weight = admission.limits_for(tenant_id).weight
+    with _schedule_lock:
+        tag = max(_virtual_time, _last_tag.get(tenant_id, 0.0)) + 1 / weight
+        _last_tag[tenant_id] = tag
+        _waiting.setdefault(tenant_id, deque()).append((tag, job_id))
+    _executor.submit(_work)
+
+
+def _next_job():
+    global _virtual_time
+    with _schedule_lock:
+        eligible = [
+            (queue[0][0], tenant_id)
+            for tenant_id, queue in _waiting.items()
+            if not settings.ADMISSION_ENABLED
+            or _running.get(tenant_id, 0) < admission.limits_for(tenant_id).concurrency
+        ]
+        if not eligible:
+            return None
+
+        tag, tenant_id = min(eligible)
+        queue = _waiting[tenant_id]
+        _, job_id = queue.popleft()
+        if not queue:
+            del _waiting[tenant_id]
+        _virtual_time = max(_virtual_time, tag)
+        _running[tenant_id] = _running.get(tenant_id, 0) + 1
+        return tenant_id, job_id
+
+
+def _finish(tenant_id: str):
+    with _schedule_lock:
+        _running[tenant_id] -= 1
+        if not _running[tenant_id]:
+            del _running[tenant_id]
+            if tenant_id not in _waiting:
+                _last_tag.pop(tenant_id, None)
+
+
+def _work():
+    """
+    Run waiting jobs until none is eligible.
+
+    Every submitted job schedules one call, and a worker keeps going after
+    its job ends, so a job held back by its tenant's quota is picked up when
+    that tenant's running job finishes.
+    """
+    while True:
+        picked = _next_job()
+        if picked is None:
+            return
+        tenant_id, job_id = picked
+        try:
+            _run_reconcile_job(job_id)
+        finally:
+            _finish(tenant_id)
+
+
+def submit_reconcile_job(
+    db: Session,
+    tenant_id: str,
+    full: bool = False,
+    mode: str = "all",
+    top_k: int = 3,
+    min_score: float = 0,
+):
+    services._get_tenant_or_404(db, tenant_id)
+
+    if mode not in services.RECONCILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown reconcile mode: {mode}")
+
+    job = models.ReconcileJob(
+        tenant_id=tenant_id,
+        full=full,
+        mode=mode,
+        top_k=top_k,
+        min_score=min_score,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _enqueue(tenant_id, job.id)
+
+    return _serialize_job(job)
+
+
+def _fail_stale_jobs(db: Session):
+    """Mark ``failed`` the running jobs whose heartbeat is older than ``RECONCILE_JOB_STALE_SECONDS``."""
+    stale = datetime.now(timezone.utc) - timedelta(seconds=settings.RECONCILE_JOB_STALE_SECONDS)
+    db.query(models.ReconcileJob).filter(
+        models.ReconcileJob.status == "running",
+        or_(
+            models.ReconcileJob.heartbeat_at.is_(None),
+            models.ReconcileJob.heartbeat_at < stale,
+        ),
+    ).update(
+        {
+            "status": "failed",
+            "error": "Interrupted by a restart; submit the reconcile again",
+            "finished_at": datetime.now(timezone.utc),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def recover_reconcile_jobs():
+    """
+    Pick up the jobs a previous process left behind; called on startup.
+
+    Jobs only live in the executor of the process that accepted them. Jobs
+    still ``queued`` are enqueued again; claiming a job is atomic, so several
+    processes recovering the same job run it once. Jobs left ``running``
+    whose heartbeat is older than ``RECONCILE_JOB_STALE_SECONDS`` are marked
+    ``failed``: their process is gone, and a reconcile that was cut off
+    committed nothing, so the client can submit it again. Jobs with a recent
+    heartbeat may still be run by another live process; ``start_job_sweeper``
+    fails them later if their heartbeat stops.
+    """
+    with SessionLocal() as db:
+        if not inspect(db.get_bind()).has_table(models.ReconcileJob.__tablename__):
+            return
+
+        _fail_stale_jobs(db)
+
+        queued = db.query(models.ReconcileJob.tenant_id, models.ReconcileJob.id).filter_by(
+            status="queued"
+        ).order_by(models.ReconcileJob.created_at).all()
+
+    for tenant_id, job_id in queued:
+        _enqueue(tenant_id, job_id)
+
+
+def start_job_sweeper() -> threading.Event:
+    """
+    Fail stale running jobs every ``RECONCILE_JOB_HEARTBEAT_SECONDS`` until
+    the returned event is set.
+
+    A process that crashed and restarted before its jobs' heartbeats went
+    stale skips them on startup; the sweep catches them once they do.
+    """
+    stop = threading.Event()
+
+    def sweep():
+        while not stop.wait(settings.RECONCILE_JOB_HEARTBEAT_SECONDS):
+            try:
+                with SessionLocal() as db:
+                    _fail_stale_jobs(db)
+            except Exception:
+                logger.exception("Could not fail stale reconcile jobs")
+
+    threading.Thread(target=sweep, name="reconcile-sweeper", daemon=True).start()
+    return stop
+
+
+def _get_job_or_404(db: Session, tenant_id: str, job_id: str):
+    services._get_tenant_or_404(db, tenant_id)
+
+    job = db.query(models.ReconcileJob).filter_by(
+        id=job_id,
+        tenant_id=tenant_id
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconcile job not found for tenant")
+    return job
+
+
+def get_reconcile_job(db: Session, tenant_id: str, job_id: str):
+    return _serialize_job(_get_job_or_404(db, tenant_id, job_id))
+
+
+def get_reconcile_job_matches(db: Session, tenant_id: str, job_id: str):
+    job = _get_job_or_404(db, tenant_id, job_id)
+
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Reconcile job is {job.status}")
+
+    match_ids = json.loads(job.match_ids)
+    by_id = {}
+    for start in range(0, len(match_ids), _MATCH_ID_CHUNK):
+        chunk = match_ids[start:start + _MATCH_ID_CHUNK]
+        rows = db.query(models.Match).filter(
+            models.Match.tenant_id == tenant_id,
+            models.Match.id.in_(chunk),
+        ).all()
+        by_id.update((match.id, match) for match in rows)
+
+    return [by_id[match_id] for match_id in match_ids if match_id in by_id]
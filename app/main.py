@@ -1,14 +1,27 @@
-from fastapi import FastAPI, Depends, Header, Body, HTTPException, Query
+from fastapi import APIRouter, FastAPI, BackgroundTasks, Depends, Header, Body, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Literal, Optional, Union
 
 from app.database import SessionLocal
 
-from app.database import Base, engine, get_db
-from app import models
-from app.ai import explain
+from app.database import Base, async_engine, engine, get_async_db, get_db
+from app.admission import AdmissionMiddleware
+from app.metrics import MetricsMiddleware
+from app.pool import pool_stats
+from app.profiling import QueryProfilerMiddleware
+from app import async_services, models, parallel
+from app.config import settings
+from app.ai import explain_async, explain_batch
 from app.reconciliation import score_match
 import app.graphql_schema as graphql_schema
+from app.graphql_loaders import Loaders
+from app.streaming import iter_lines, iter_rows, iterate_from_thread
 
 from strawberry.fastapi import GraphQLRouter
 
@@ -18,10 +31,14 @@ from app.schemas import (
     InvoiceCreate,
     InvoiceResponse,
     InvoiceFilters,
+    PaginatedInvoices,
     BankTransactionImport,
     BankTransactionResponse,
+    BankTransactionStreamImportResponse,
     MatchResponse,
+    ReconcileJobResponse,
     AIExplanationResponse,
+    ExplainPair,
 )
 
 from app.services import (
@@ -30,25 +47,54 @@ from app.services import (
     list_invoices,
     delete_invoice,
     import_transactions,
+    import_transactions_stream,
+    idempotency_purge_due,
+    purge_expired_idempotency_keys,
     reconcile,
     confirm_match,
+    load_explain_rows,
+)
+from app.jobs import (
+    recover_reconcile_jobs,
+    start_job_sweeper,
+    submit_reconcile_job,
+    get_reconcile_job,
+    get_reconcile_job_matches,
 )
 
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Multi-Tenant Invoice Reconciliation API")
-
-# graphql_app = GraphQLRouter(
-#     graphql_schema.schema,
-#     context_getter=lambda request: {"db": next(get_db())},
-# )
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.CREATE_SCHEMA_ON_STARTUP:
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    await run_in_threadpool(recover_reconcile_jobs)
+    sweeper = start_job_sweeper()
+    yield
+    sweeper.set()
+    parallel.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Multi-Tenant Invoice Reconciliation API", lifespan=lifespan)
+
+# Expensive routes are admitted per tenant; see app/admission.py.
+app.add_middleware(
+    AdmissionMiddleware,
+    routes=[
+        ("POST", "/tenants/{tenant_id}/bank-transactions/import"),
+        ("POST", "/tenants/{tenant_id}/bank-transactions/import/stream"),
+        ("POST", "/tenants/{tenant_id}/reconcile"),
+        ("GET", "/tenants/{tenant_id}/reconcile/explain"),
+        ("POST", "/tenants/{tenant_id}/reconcile/explain/batch"),
+    ],
+)
+app.add_middleware(QueryProfilerMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
-def get_context():
-    db = SessionLocal()
-    try:
-        yield {"db": db}
-    finally:
-        db.close()
+def get_context(db: Session = Depends(get_db)):
+    # Same session-per-request dependency as the REST routes.
+    return {"db": db, "loaders": Loaders(db)}
 
 
 graphql_app = GraphQLRouter(
@@ -61,7 +107,41 @@ app.include_router(graphql_app, prefix="/graphql")
 
 
 
-@app.post("/tenants", response_model=TenantResponse)
+# Tenant and invoice CRUD is served by one of two routers: sync handlers on
+# the threadpool, or async handlers on the AsyncEngine when ASYNC_DB is set.
+sync_router = APIRouter()
+async_router = APIRouter()
+
+
+def _invoice_filters(
+    status: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+):
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(
+            status_code=400,
+            detail="min_amount cannot be greater than max_amount",
+        )
+
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(
+            status_code=400,
+            detail="start_date cannot be later than end_date",
+        )
+
+    return {
+        "status": status,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+@sync_router.post("/tenants", response_model=TenantResponse)
 def create_tenant_endpoint(
     payload: TenantCreate,
     db: Session = Depends(get_db),
@@ -70,7 +150,7 @@ def create_tenant_endpoint(
 
 
 
-@app.post(
+@sync_router.post(
     "/tenants/{tenant_id}/invoices",
     response_model=InvoiceResponse,
 )
@@ -82,32 +162,22 @@ def create_invoice_endpoint(
     return create_invoice(db, tenant_id, payload.model_dump())
 
 
-@app.get(
+@sync_router.get(
     "/tenants/{tenant_id}/invoices",
-    response_model=List[InvoiceResponse],
+    response_model=PaginatedInvoices,
 )
 def list_invoices_endpoint(
     tenant_id: str,
-    status: Optional[str] = Query(None),
-    min_amount: Optional[float] = Query(None),
-    max_amount: Optional[float] = Query(None),
+    filters: dict = Depends(_invoice_filters),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    count: Literal["none", "exact", "estimated"] = Query("none"),
     db: Session = Depends(get_db),
 ):
-    if min_amount is not None and max_amount is not None and min_amount > max_amount:
-        raise HTTPException(
-            status_code=400,
-            detail="min_amount cannot be greater than max_amount",
-        )
-
-    filters = {
-        "status": status,
-        "min_amount": min_amount,
-        "max_amount": max_amount,
-    }
-    return list_invoices(db, tenant_id, filters)
+    return list_invoices(db, tenant_id, filters, cursor=cursor, limit=limit, count=count)
 
 
-@app.delete("/tenants/{tenant_id}/invoices/{invoice_id}")
+@sync_router.delete("/tenants/{tenant_id}/invoices/{invoice_id}")
 def delete_invoice_endpoint(
     tenant_id: str,
     invoice_id: str,
@@ -117,6 +187,101 @@ def delete_invoice_endpoint(
     return {"deleted": True}
 
 
+@sync_router.post(
+    "/tenants/{tenant_id}/matches/{match_id}/confirm",
+    response_model=MatchResponse,
+)
+def confirm_match_endpoint(
+    tenant_id: str,
+    match_id: str,
+    db: Session = Depends(get_db),
+):
+    return confirm_match(db, tenant_id, match_id)
+
+
+@async_router.post("/tenants", response_model=TenantResponse)
+async def create_tenant_async_endpoint(
+    payload: TenantCreate,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await async_services.create_tenant(db, payload.name)
+
+
+@async_router.post(
+    "/tenants/{tenant_id}/invoices",
+    response_model=InvoiceResponse,
+)
+async def create_invoice_async_endpoint(
+    tenant_id: str,
+    payload: InvoiceCreate,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await async_services.create_invoice(db, tenant_id, payload.model_dump())
+
+
+@async_router.get(
+    "/tenants/{tenant_id}/invoices",
+    response_model=PaginatedInvoices,
+)
+async def list_invoices_async_endpoint(
+    tenant_id: str,
+    filters: dict = Depends(_invoice_filters),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    count: Literal["none", "exact", "estimated"] = Query("none"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await async_services.list_invoices(
+        db, tenant_id, filters, cursor=cursor, limit=limit, count=count
+    )
+
+
+@async_router.delete("/tenants/{tenant_id}/invoices/{invoice_id}")
+async def delete_invoice_async_endpoint(
+    tenant_id: str,
+    invoice_id: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    await async_services.delete_invoice(db, tenant_id, invoice_id)
+    return {"deleted": True}
+
+
+@async_router.post(
+    "/tenants/{tenant_id}/matches/{match_id}/confirm",
+    response_model=MatchResponse,
+)
+async def confirm_match_async_endpoint(
+    tenant_id: str,
+    match_id: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await async_services.confirm_match(db, tenant_id, match_id)
+
+
+app.include_router(async_router if settings.ASYNC_DB else sync_router)
+
+
+@app.get("/metrics/db-pool")
+def db_pool_metrics_endpoint():
+    return {
+        "sync": pool_stats(engine),
+        "async": pool_stats(async_engine),
+    }
+
+
+
+def _purge_idempotency_keys():
+    db = SessionLocal()
+    try:
+        purge_expired_idempotency_keys(db)
+    finally:
+        db.close()
+
+
+def _schedule_idempotency_purge(background_tasks: BackgroundTasks):
+    if idempotency_purge_due():
+        background_tasks.add_task(_purge_idempotency_keys)
+
 
 @app.post(
     "/tenants/{tenant_id}/bank-transactions/import",
@@ -124,10 +289,12 @@ def delete_invoice_endpoint(
 )
 def import_bank_endpoint(
     tenant_id: str,
+    background_tasks: BackgroundTasks,
     payload: List[BankTransactionImport] = Body(...),
     idempotency_key: str = Header(...),
     db: Session = Depends(get_db),
 ):
+    _schedule_idempotency_purge(background_tasks)
     return import_transactions(
         db,
         tenant_id,
@@ -136,50 +303,104 @@ def import_bank_endpoint(
     )
 
 
+@app.post(
+    "/tenants/{tenant_id}/bank-transactions/import/stream",
+    response_model=BankTransactionStreamImportResponse,
+)
+async def import_bank_stream_endpoint(
+    tenant_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    idempotency_key: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    _schedule_idempotency_purge(background_tasks)
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if content_type.startswith("text/csv") else "ndjson"
+
+    # The generators only run once the service iterates them in the worker thread.
+    rows = iter_rows(iter_lines(iterate_from_thread(request.stream())), fmt)
+
+    return await run_in_threadpool(
+        import_transactions_stream,
+        db,
+        tenant_id,
+        rows,
+        idempotency_key,
+    )
+
+
 
 @app.post(
     "/tenants/{tenant_id}/reconcile",
-    response_model=List[MatchResponse],
+    response_model=Union[List[MatchResponse], ReconcileJobResponse],
 )
 def reconcile_endpoint(
     tenant_id: str,
+    response: Response,
+    full: bool = Query(False),
+    run_async: bool = Query(False, alias="async"),
+    mode: Literal["all", "top_k", "assignment"] = Query("all"),
+    top_k: int = Query(3, ge=1),
+    min_score: float = Query(0, ge=0),
     db: Session = Depends(get_db),
 ):
-    return reconcile(db, tenant_id)
+    options = {"full": full, "mode": mode, "top_k": top_k, "min_score": min_score}
 
+    if run_async:
+        response.status_code = 202
+        return submit_reconcile_job(db, tenant_id, **options)
 
-@app.post(
-    "/tenants/{tenant_id}/matches/{match_id}/confirm",
-    response_model=MatchResponse,
+    return reconcile(db, tenant_id, **options)
+
+
+@app.get(
+    "/tenants/{tenant_id}/reconcile/jobs/{job_id}",
+    response_model=ReconcileJobResponse,
 )
-def confirm_match_endpoint(
+def reconcile_job_endpoint(
     tenant_id: str,
-    match_id: str,
+    job_id: str,
     db: Session = Depends(get_db),
 ):
-    return confirm_match(db, tenant_id, match_id)
+    return get_reconcile_job(db, tenant_id, job_id)
+
 
+@app.get(
+    "/tenants/{tenant_id}/reconcile/jobs/{job_id}/matches",
+    response_model=List[MatchResponse],
+)
+def reconcile_job_matches_endpoint(
+    tenant_id: str,
+    job_id: str,
+    db: Session = Depends(get_db),
+):
+    return get_reconcile_job_matches(db, tenant_id, job_id)
 
 
 @app.get(
     "/tenants/{tenant_id}/reconcile/explain",
     response_model=AIExplanationResponse,
 )
-def explain_endpoint(
+async def explain_endpoint(
     tenant_id: str,
     invoice_id: str,
     transaction_id: str,
     db: Session = Depends(get_db),
 ):
-    invoice = db.query(models.Invoice).filter_by(
-        id=invoice_id,
-        tenant_id=tenant_id
-    ).first()
+    def load():
+        invoice = db.query(models.Invoice).filter_by(
+            id=invoice_id,
+            tenant_id=tenant_id
+        ).first()
+
+        transaction = db.query(models.BankTransaction).filter_by(
+            id=transaction_id,
+            tenant_id=tenant_id
+        ).first()
+        return invoice, transaction
 
-    transaction = db.query(models.BankTransaction).filter_by(
-        id=transaction_id,
-        tenant_id=tenant_id
-    ).first()
+    invoice, transaction = await run_in_threadpool(load)
 
     if not invoice or not transaction:
         raise HTTPException(status_code=404, detail="Invoice or transaction not found")
@@ -187,10 +408,32 @@ def explain_endpoint(
     score = score_match(invoice, transaction)
 
     return {
-        "explanation": explain(invoice, transaction, score)
+        "explanation": await explain_async(invoice, transaction, score, db=db)
     }
 
 
+@app.post("/tenants/{tenant_id}/reconcile/explain/batch")
+async def explain_batch_endpoint(
+    tenant_id: str,
+    payload: List[ExplainPair] = Body(...),
+    db: Session = Depends(get_db),
+):
+    if len(payload) > settings.EXPLAIN_BATCH_MAX_PAIRS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.EXPLAIN_BATCH_MAX_PAIRS} pairs per batch",
+        )
+
+    pairs = [(pair.invoice_id, pair.transaction_id) for pair in payload]
+    invoices, transactions = await run_in_threadpool(load_explain_rows, db, tenant_id, pairs)
+
+    async def lines():
+        async for result in explain_batch(pairs, invoices, transactions):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.get("/")
 def health_check():
     return {"health status": "ok"}
@@ -0,0 +1,280 @@
+"""
+Prometheus metrics for requests, reconciliation, imports and explanations.
+
+A deliberately small registry: counters and histograms keyed by label values,
+rendered in the Prometheus text format by ``MetricsMiddleware`` at
+``/metrics``. Observations take one lock and a bisect, so collection stays
+cheap enough to leave on.
+
+Tenant ids are used as label values for the first ``METRICS_MAX_TENANTS``
+tenants seen by the process; later tenants share the ``other`` label so the
+number of series stays bounded.
+"""
+import bisect
+import threading
+import time
+
+from app.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+OTHER_TENANT = "other"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                yield from self._render_series(key, value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, key, value):
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def _render_series(self, key, series):
+        counts, total, count = series
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, key)
+        yield f"{self.name}_sum{labels} {_format_value(total)}"
+        yield f"{self.name}_count{labels} {count}"
+
+
+_tenants = set()
+_tenants_lock = threading.Lock()
+
+
+def tenant_label(tenant_id, admit: bool = True) -> str:
+    """
+    Label value for ``tenant_id``: the id itself for the first
+    ``METRICS_MAX_TENANTS`` tenants, ``other`` after that. With
+    ``admit=False`` an unseen tenant is never given its own label.
+    """
+    if tenant_id is None:
+        return ""
+    if tenant_id in _tenants:
+        return tenant_id
+    if not admit:
+        return OTHER_TENANT
+    with _tenants_lock:
+        if tenant_id in _tenants or len(_tenants) < settings.METRICS_MAX_TENANTS:
+            _tenants.add(tenant_id)
+            return tenant_id
+    return OTHER_TENANT
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clear every series and tenant label (for tests)."""
+    for metric in REGISTRY:
+        metric.clear()
+    with _tenants_lock:
+        _tenants.clear()
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code.",
+    ("method", "route", "status", "tenant"),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, until the response body is sent.",
+    ("method", "route", "tenant"),
+)
+
+RECONCILE_PAIRS_SCORED = Counter(
+    "reconcile_pairs_scored_total",
+    "Invoice x transaction pairs scored by reconcile runs.",
+    ("tenant",),
+)
+RECONCILE_MATCHES_PROPOSED = Counter(
+    "reconcile_matches_proposed_total",
+    "Matches proposed by reconcile runs.",
+    ("tenant",),
+)
+RECONCILE_PHASE = Histogram(
+    "reconcile_phase_duration_seconds",
+    "Reconcile time spent scoring (load, score, select) and committing (insert, commit).",
+    ("phase", "tenant"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+IMPORT_ROWS = Counter(
+    "import_rows_total",
+    "Bank transactions inserted by imports.",
+    ("source", "tenant"),
+)
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Latency of LLM calls made for explanations, by outcome.",
+    ("outcome", "tenant"),
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+EXPLANATIONS = Counter(
+    "explanations_total",
+    "Explanations served, by source: cache, llm or fallback.",
+    ("source", "tenant"),
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Heavy requests rejected with 429, by reason: rate_limited, queue_full or queue_timeout.",
+    ("reason", "tenant"),
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time heavy requests waited in the fair queue before starting.",
+    ("tenant",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request and serves ``GET /metrics``.
+
+    Requests are labelled by route template (``/tenants/{tenant_id}/...``)
+    rather than path, and by the ``tenant_id`` path parameter. Failed
+    requests never claim a new tenant label, so probing random ids cannot
+    use up the cap.
+    """
+
+    def __init__(self, app, path: str = "/metrics"):
+        self.app = app
+        self.path = path
+        self._templates = None
+
+    def _template(self, scope) -> str:
+        if self._templates is None:
+            router = scope["app"].router
+            self._templates = {
+                route.endpoint: route.path
+                for route in router.routes if hasattr(route, "endpoint")
+            }
+        return self._templates.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == self.path and scope["method"] == "GET":
+            body = render().encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", CONTENT_TYPE.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = self._template(scope)
+            tenant = tenant_label(
+                scope.get("path_params", {}).get("tenant_id"),
+                admit=status < 400,
+            )
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status), tenant=tenant)
+            HTTP_LATENCY.observe(elapsed, method=scope["method"], route=route, tenant=tenant)
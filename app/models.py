@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, UniqueConstraint, Index
+from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, ForeignKey, Text, UniqueConstraint, Index
 from datetime import datetime, timezone
 from uuid import uuid4
 from app.database import Base
@@ -23,7 +23,11 @@ class Invoice(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     __table_args__ = (
-        Index("idx_invoice_tenant_status", "tenant_id", "status"),
+        # Keyset pagination on (created_at, id), optionally within a status.
+        Index("idx_invoice_tenant_created", "tenant_id", "created_at", "id"),
+        Index("idx_invoice_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+        Index("idx_invoice_tenant_amount", "tenant_id", "amount"),
+        Index("idx_invoice_tenant_invoice_date", "tenant_id", "invoice_date"),
     )
 
 
@@ -46,13 +50,23 @@ class BankTransaction(Base):
 class Match(Base):
     __tablename__ = "matches"
     id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
-    tenant_id = Column(String(36), nullable=False, index=True)
-    invoice_id = Column(String(36), nullable=False)
-    bank_transaction_id = Column(String(36), nullable=False)
+    tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False)
+    invoice_id = Column(String(36), ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+    bank_transaction_id = Column(
+        String(36), ForeignKey("bank_transactions.id", ondelete="CASCADE"), nullable=False
+    )
     score = Column(Float)
     status = Column(String, default="proposed")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # One match per pair; reconcile upserts into it. Also serves
+        # lookups by (tenant_id, invoice_id).
+        Index("uq_match_pair", "tenant_id", "invoice_id", "bank_transaction_id", unique=True),
+        Index("idx_match_tenant_status", "tenant_id", "status"),
+        Index("idx_match_tenant_transaction", "tenant_id", "bank_transaction_id"),
+    )
+
 
 class IdempotencyKey(Base):
     __tablename__ = "idempotency_keys"
@@ -61,7 +75,48 @@ class IdempotencyKey(Base):
     key = Column(String, nullable=False)
     payload_hash = Column(String, nullable=False)
     response = Column(Text, nullable=False)
+    # Streaming imports hold a "pending" key while they commit batches;
+    # payload_hash then covers the first rows_committed rows only.
+    status = Column(String, default="complete", nullable=False)
+    rows_committed = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime, nullable=False, index=True)
 
     __table_args__ = (
         UniqueConstraint("tenant_id", "key", name="uq_tenant_key"),
     )
+
+
+class Explanation(Base):
+    __tablename__ = "explanations"
+    key = Column(String(64), primary_key=True)
+    explanation = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ReconcileWatermark(Base):
+    __tablename__ = "reconcile_watermarks"
+    tenant_id = Column(String(36), ForeignKey("tenants.id"), primary_key=True)
+    invoices_created_at = Column(DateTime)
+    transactions_created_at = Column(DateTime)
+
+
+class ReconcileJob(Base):
+    __tablename__ = "reconcile_jobs"
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid4()))
+    tenant_id = Column(String(36), ForeignKey("tenants.id"), nullable=False, index=True)
+    full = Column(Boolean, default=False, nullable=False)
+    mode = Column(String, default="all", nullable=False)
+    top_k = Column(Integer, default=3, nullable=False)
+    min_score = Column(Float, default=0, nullable=False)
+    status = Column(String, default="queued", nullable=False)
+    pairs_scored = Column(Integer, default=0, nullable=False)
+    pairs_total = Column(Integer, default=0, nullable=False)
+    match_ids = Column(Text)
+    error = Column(Text)
+    # Process running the job and when it last reported being alive.
+    owner = Column(String)
+    heartbeat_at = Column(DateTime)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime)
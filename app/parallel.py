@@ -0,0 +1,40 @@
+"""
+Process pool for scoring very large reconciles on several cores.
+
+Workers are started with ``spawn`` rather than ``fork``: the API process
+holds threads and open database connections that must not be duplicated.
+Each worker only imports ``app.reconciliation`` and NumPy.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def process_count() -> int:
+    """Worker processes to use: ``RECONCILE_PROCESSES``, at most one per CPU."""
+    return max(1, min(settings.RECONCILE_PROCESSES, os.cpu_count() or 1))
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=process_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,74 @@
+"""
+Connection pools that record how long checkouts wait.
+
+``QueuePool.status()`` only reports current occupancy. Under bursts the
+useful signal is how long requests queue for a connection and how often they
+give up with ``QueuePool limit ... timed out``, so these pools keep running
+totals that ``pool_stats`` exposes next to the occupancy counters.
+"""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class _TimedCheckout:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(engine):
+    """Occupancy and checkout-wait counters for ``engine``'s pool, or ``None``."""
+    if engine is None:
+        return None
+
+    pool = engine.pool
+    if not isinstance(pool, _TimedCheckout):
+        return {"pool": type(pool).__name__}
+
+    with pool._stats_lock:
+        waits = {
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_seconds_total": pool.wait_seconds_total,
+            "wait_seconds_max": pool.wait_seconds_max,
+        }
+
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        **waits,
+    }
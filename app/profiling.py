@@ -0,0 +1,177 @@
+"""
+Per-request SQL statement counts and timings, and a slow-query log.
+
+Listeners on every ``Engine`` time each statement. While a request is being
+handled, ``QueryProfilerMiddleware`` keeps a ``QueryStats`` in a context
+variable, so statements run by the request (including in the threadpool)
+add to it. With ``DEBUG_SQL`` the totals are returned as ``X-DB-Query-Count``
+and ``X-DB-Time-Ms`` headers and logged. Statements slower than
+``SLOW_QUERY_MS`` go to the ``app.sql.slow`` logger with the shape of their
+bound parameters, never the values.
+
+Tests can bound the statements a block issues with ``assert_max_queries``.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger("app.sql")
+slow_logger = logging.getLogger("app.sql.slow")
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    statements: Optional[list] = None
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _type_shape(params):
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params]
+    return type(params).__name__
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Type names of bound parameters; ``executemany`` batches report their size."""
+    if executemany and parameters:
+        return f"{len(parameters)} x {_type_shape(parameters[0])}"
+    return _type_shape(parameters)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish(conn, statement, parameters, executemany)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute; without this their
+    # start time would stay on the pooled connection for good.
+    conn = context.connection
+    if conn is None or context.statement is None or not conn.info.get("query_started"):
+        return
+    execution = context.execution_context
+    _finish(conn, context.statement, context.parameters, bool(execution and execution.executemany))
+
+
+def _finish(conn, statement, parameters, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        slow_logger.warning(
+            "slow query %.1fms: %s params=%s",
+            elapsed * 1000,
+            " ".join(statement.split()),
+            parameter_shape(parameters, executemany),
+        )
+
+
+@contextmanager
+def profile_queries(keep_statements: bool = False):
+    """Collect the statements run in this context (and threads it spawns) into a ``QueryStats``."""
+    stats = QueryStats(statements=[] if keep_statements else None)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def capture_queries(bind=Engine):
+    """
+    Record every statement sent through ``bind`` (all engines by default),
+    from any thread, while the block runs.
+
+    Unlike ``profile_queries`` this does not depend on context propagation,
+    so it also sees requests made through ``TestClient``.
+    """
+    stats = QueryStats(statements=[])
+
+    def listener(conn, cursor, statement, *args):
+        stats.record(statement, 0.0)
+
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        yield stats
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+
+@contextmanager
+def assert_max_queries(limit: int, bind=Engine):
+    """Fail if the block issues more than ``limit`` statements, listing them."""
+    with capture_queries(bind) as stats:
+        yield stats
+
+    if stats.count > limit:
+        listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(stats.statements, 1))
+        raise AssertionError(f"expected at most {limit} queries, got {stats.count}:\n{listing}")
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware giving each HTTP request its own ``QueryStats``.
+
+    Headers are written when the response starts, so statements run while a
+    streaming body is produced are logged but not counted in the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries() as stats:
+
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start" and settings.DEBUG_SQL:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_headers)
+
+        if settings.DEBUG_SQL:
+            logger.debug(
+                "%s %s: %d queries in %.2fms",
+                scope["method"],
+                scope["path"],
+                stats.count,
+                stats.seconds * 1000,
+            )
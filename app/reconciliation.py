@@ -1,17 +1,476 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import timedelta, timezone
+
+import numpy as np
+
+AMOUNT_TOLERANCE = 5
+DATE_WINDOW_DAYS = 3
+
+# Slack added to the amount window so float rounding in ``amount +/- 5`` can
+# only widen the candidate set; ``score_match`` still makes the final call.
+_AMOUNT_SLACK = 1e-6
+_TRIGRAM = 3
+_MICROS_PER_DAY = 86_400_000_000
+# Upper bound on the dense (invoices x transactions) block scored at once.
+_BATCH_CELLS = 4_000_000
+# Largest rows * rows * cols component solved exactly by the Hungarian method;
+# bigger components fall back to greedy assignment.
+_HUNGARIAN_MAX_WORK = 20_000_000
+
+
 def score_match(invoice, tx):
     score = 0
 
     if invoice.amount == tx.amount:
         score += 50
-    elif abs(invoice.amount - tx.amount) <= 5:
+    elif abs(invoice.amount - tx.amount) <= AMOUNT_TOLERANCE:
         score += 20
 
     if invoice.invoice_date and tx.posted_at:
-        if abs((invoice.invoice_date - tx.posted_at).days) <= 3:
+        if abs((invoice.invoice_date - tx.posted_at).days) <= DATE_WINDOW_DAYS:
             score += 20
 
     if invoice.description and tx.description:
         if invoice.description.lower() in tx.description.lower():
             score += 10
 
-    return score
\ No newline at end of file
+    return score
+
+
+def _trigrams(text):
+    return {text[i:i + _TRIGRAM] for i in range(len(text) - _TRIGRAM + 1)}
+
+
+class DescriptionIndex:
+    """
+    Character trigram postings over lowercased descriptions.
+
+    A needle can only be contained in descriptions holding every one of its
+    trigrams, so the rarest trigram's postings are a complete candidate list.
+    Needles shorter than a trigram fall back to every non-empty description.
+    """
+
+    def __init__(self, descriptions):
+        self.described = []
+        self._postings = {}
+        for idx, text in enumerate(descriptions):
+            if not text:
+                continue
+            self.described.append(idx)
+            for gram in _trigrams(text):
+                self._postings.setdefault(gram, []).append(idx)
+
+    def lookup(self, needle):
+        if len(needle) < _TRIGRAM:
+            return self.described
+
+        postings = []
+        for gram in _trigrams(needle):
+            hits = self._postings.get(gram)
+            if not hits:
+                return []
+            postings.append(hits)
+        return min(postings, key=len)
+
+
+class CandidateIndex:
+    """
+    Blocking index over a tenant's bank transactions.
+
+    Only transactions that can earn at least one scoring rule for an invoice
+    are returned by ``candidates``, so callers never have to score the full
+    invoice x transaction cross product. Recall is exact for every rule in
+    ``score_match``:
+
+    - amount: transactions sorted by amount, bisected on ``amount +/- 5``
+    - date: transactions sorted by ``posted_at``, bisected on the window in
+      which ``abs(delta.days) <= 3`` holds (``timedelta.days`` floors, so the
+      window is ``(invoice_date - 4 days, invoice_date + 3 days]``)
+    - description: ``DescriptionIndex`` trigram postings
+    """
+
+    def __init__(self, transactions):
+        self.transactions = list(transactions)
+
+        by_amount = sorted(
+            range(len(self.transactions)),
+            key=lambda idx: self.transactions[idx].amount,
+        )
+        self._amount_keys = [self.transactions[idx].amount for idx in by_amount]
+        self._amount_idx = by_amount
+
+        dated = [
+            idx for idx, tx in enumerate(self.transactions) if tx.posted_at
+        ]
+        dated.sort(key=lambda idx: self.transactions[idx].posted_at)
+        self._date_keys = [self.transactions[idx].posted_at for idx in dated]
+        self._date_idx = dated
+
+        self._descriptions = DescriptionIndex(
+            tx.description.lower() if tx.description else None
+            for tx in self.transactions
+        )
+
+    def _by_amount(self, amount):
+        slack = _AMOUNT_SLACK * max(1.0, abs(amount))
+        lo = bisect_left(self._amount_keys, amount - AMOUNT_TOLERANCE - slack)
+        hi = bisect_right(self._amount_keys, amount + AMOUNT_TOLERANCE + slack)
+        return self._amount_idx[lo:hi]
+
+    def _by_date(self, invoice_date):
+        lo = bisect_left(
+            self._date_keys, invoice_date - timedelta(days=DATE_WINDOW_DAYS + 1)
+        )
+        hi = bisect_right(
+            self._date_keys, invoice_date + timedelta(days=DATE_WINDOW_DAYS)
+        )
+        return self._date_idx[lo:hi]
+
+    def candidates(self, invoice):
+        """Return transaction indexes that may score against ``invoice``, in input order."""
+        found = set(self._by_amount(invoice.amount))
+
+        if invoice.invoice_date:
+            found.update(self._by_date(invoice.invoice_date))
+
+        if invoice.description:
+            found.update(self._descriptions.lookup(invoice.description.lower()))
+
+        return sorted(found)
+
+
+def score_candidates(invoices, transactions, progress=None):
+    """
+    Yield ``(invoice, tx, score)`` for every pair with ``score > 0``.
+
+    Produces exactly the pairs, scores and ordering of scoring the full cross
+    product with ``score_match`` (invoices outer, transactions inner), but only
+    scores pairs surfaced by ``CandidateIndex``. ``progress`` is called with the
+    number of cross-product pairs covered after each invoice.
+    """
+    index = CandidateIndex(transactions)
+    covered = len(index.transactions)
+
+    for inv in invoices:
+        for idx in index.candidates(inv):
+            tx = index.transactions[idx]
+            s = score_match(inv, tx)
+            if s > 0:
+                yield inv, tx, s
+        if progress:
+            progress(covered)
+
+
+def _datetime64(value):
+    if value is None:
+        return np.datetime64("NaT", "us")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "us")
+
+
+def to_columns(rows, date_field):
+    """
+    Convert invoices or bank transactions into the columnar inputs of ``score_batch``.
+
+    Returns ``(amounts, dates, descriptions)``: float64 amounts, datetime64[us]
+    dates (``NaT`` when missing) and lowercased descriptions (``None`` when
+    missing or empty).
+    """
+    rows = list(rows)
+    amounts = np.fromiter((row.amount for row in rows), dtype=np.float64, count=len(rows))
+    dates = np.array(
+        [_datetime64(getattr(row, date_field)) for row in rows],
+        dtype="datetime64[us]",
+    )
+    descriptions = [
+        row.description.lower() if row.description else None for row in rows
+    ]
+    return amounts, dates, descriptions
+
+
+def score_batch(
+    inv_amounts,
+    inv_dates,
+    tx_amounts,
+    tx_dates,
+    inv_descriptions=None,
+    tx_descriptions=None,
+    progress=None,
+):
+    """
+    Score every invoice against every transaction with broadcast NumPy rules.
+
+    Returns a sparse list of ``(invoice_idx, tx_idx, score)`` for pairs with
+    ``score > 0``, ordered by invoice then transaction index. Scores are equal
+    to ``score_match`` on the same rows: amounts are compared as float64 just
+    like Python floats, and date deltas are floored to whole days in integer
+    microseconds the way ``timedelta.days`` is. Description containment is
+    checked on precomputed lowercase strings, only for pairs surfaced by a
+    ``DescriptionIndex``. ``progress`` is called with the number of pairs
+    covered after each block.
+    """
+    rows, cols, scores = _score_batch_arrays(
+        inv_amounts, inv_dates, tx_amounts, tx_dates, inv_descriptions, tx_descriptions, progress
+    )
+    return list(zip(rows.tolist(), cols.tolist(), scores.tolist()))
+
+
+def _score_batch_arrays(
+    inv_amounts,
+    inv_dates,
+    tx_amounts,
+    tx_dates,
+    inv_descriptions=None,
+    tx_descriptions=None,
+    progress=None,
+):
+    """``score_batch`` as ``(invoice_idx, tx_idx, score)`` int64 arrays."""
+    inv_amounts = np.asarray(inv_amounts, dtype=np.float64)
+    tx_amounts = np.asarray(tx_amounts, dtype=np.float64)
+    inv_dates = np.asarray(inv_dates, dtype="datetime64[us]")
+    tx_dates = np.asarray(tx_dates, dtype="datetime64[us]")
+
+    n_inv, n_tx = len(inv_amounts), len(tx_amounts)
+    if not n_inv or not n_tx:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    tx_has_date = ~np.isnat(tx_dates)
+    tx_date_us = tx_dates.astype(np.int64)
+    inv_has_date = ~np.isnat(inv_dates)
+    inv_date_us = inv_dates.astype(np.int64)
+
+    descriptions = None
+    if inv_descriptions is not None and tx_descriptions is not None:
+        descriptions = DescriptionIndex(tx_descriptions)
+
+    blocks = []
+    rows_per_block = max(1, _BATCH_CELLS // n_tx)
+
+    for start in range(0, n_inv, rows_per_block):
+        stop = min(start + rows_per_block, n_inv)
+        amounts = inv_amounts[start:stop, None]
+
+        exact = amounts == tx_amounts
+        near = np.abs(amounts - tx_amounts) <= AMOUNT_TOLERANCE
+        scores = np.where(exact, 50, np.where(near, 20, 0)).astype(np.int64)
+
+        delta_days = np.floor_divide(
+            inv_date_us[start:stop, None] - tx_date_us, _MICROS_PER_DAY
+        )
+        dated = inv_has_date[start:stop, None] & tx_has_date
+        scores += np.where(dated & (np.abs(delta_days) <= DATE_WINDOW_DAYS), 20, 0)
+
+        if descriptions is not None:
+            for row in range(start, stop):
+                needle = inv_descriptions[row]
+                if not needle:
+                    continue
+                for col in descriptions.lookup(needle):
+                    if needle in tx_descriptions[col]:
+                        scores[row - start, col] += 10
+
+        rows, cols = np.nonzero(scores > 0)
+        blocks.append((rows + start, cols, scores[rows, cols]))
+        if progress:
+            progress((stop - start) * n_tx)
+
+    if not blocks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    return tuple(np.concatenate(parts).astype(np.int64) for parts in zip(*blocks))
+
+
+def _score_shard(offset, inv_columns, tx_columns):
+    # Arrays pickle far smaller and faster than a list of tuples.
+    rows, cols, scores = _score_batch_arrays(
+        *inv_columns[:2], *tx_columns[:2], inv_columns[2], tx_columns[2]
+    )
+    return rows + offset, cols, scores
+
+
+def score_batch_sharded(executor, shards, inv_columns, tx_columns, progress=None):
+    """
+    ``score_batch`` split into ``shards`` contiguous invoice ranges run on ``executor``.
+
+    ``inv_columns`` and ``tx_columns`` are ``to_columns`` outputs. Every shard
+    scores its invoices against all transactions, because the description
+    rule can pair an invoice with a transaction of any amount or date. Shard
+    results are concatenated in invoice order, so the output equals
+    ``score_batch`` on the same inputs. ``progress`` is called with the pairs
+    covered as each shard finishes, in order.
+    """
+    n_inv, n_tx = len(inv_columns[0]), len(tx_columns[0])
+    if not n_inv or not n_tx:
+        return []
+
+    bounds = np.linspace(0, n_inv, min(shards, n_inv) + 1).astype(int).tolist()
+    futures = [
+        (
+            executor.submit(
+                _score_shard,
+                lo,
+                (inv_columns[0][lo:hi], inv_columns[1][lo:hi], inv_columns[2][lo:hi]),
+                tx_columns,
+            ),
+            hi - lo,
+        )
+        for lo, hi in zip(bounds, bounds[1:])
+    ]
+
+    results = []
+    for future, rows in futures:
+        shard_rows, shard_cols, shard_scores = future.result()
+        results.extend(zip(shard_rows.tolist(), shard_cols.tolist(), shard_scores.tolist()))
+        if progress:
+            progress(rows * n_tx)
+    return results
+
+
+def select_top_k(scored, k, min_score=0):
+    """
+    Keep the ``k`` best ``(invoice, tx, score)`` proposals per invoice.
+
+    Proposals below ``min_score`` are dropped. Each invoice keeps a bounded
+    min-heap of size ``k``; ties go to the proposal seen first. The kept
+    proposals are returned in their input order.
+    """
+    heaps = {}
+    for order, (inv, tx, s) in enumerate(scored):
+        if s < min_score:
+            continue
+        heap = heaps.setdefault(id(inv), [])
+        entry = (s, -order, inv, tx)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    kept = [entry for heap in heaps.values() for entry in heap]
+    kept.sort(key=lambda entry: -entry[1])
+    return [(inv, tx, s) for s, _, inv, tx in kept]
+
+
+def _hungarian(weights):
+    """Maximum-weight assignment of rows to columns for a dense ``len(rows) <= len(cols)`` matrix."""
+    n, m = len(weights), len(weights[0])
+    inf = float("inf")
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    owner = [0] * (m + 1)
+    way = [0] * (m + 1)
+
+    for row in range(1, n + 1):
+        owner[0] = row
+        col0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            row0 = owner[col0]
+            weights_row = weights[row0 - 1]
+            delta = inf
+            col1 = 0
+            for col in range(1, m + 1):
+                if used[col]:
+                    continue
+                cur = -weights_row[col - 1] - u[row0] - v[col]
+                if cur < minv[col]:
+                    minv[col] = cur
+                    way[col] = col0
+                if minv[col] < delta:
+                    delta = minv[col]
+                    col1 = col
+            for col in range(m + 1):
+                if used[col]:
+                    u[owner[col]] += delta
+                    v[col] -= delta
+                else:
+                    minv[col] -= delta
+            col0 = col1
+            if owner[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            owner[col0] = owner[col1]
+            col0 = col1
+
+    return [(owner[col] - 1, col - 1) for col in range(1, m + 1) if owner[col]]
+
+
+def _greedy(edges):
+    taken_rows, taken_cols, chosen = set(), set(), []
+    for order, row, col, s in sorted(edges, key=lambda edge: (-edge[3], edge[0])):
+        if row in taken_rows or col in taken_cols:
+            continue
+        taken_rows.add(row)
+        taken_cols.add(col)
+        chosen.append(order)
+    return chosen
+
+
+def _solve_component(edges):
+    rows = sorted({edge[1] for edge in edges})
+    cols = sorted({edge[2] for edge in edges})
+    if len(rows) > len(cols):
+        edges = [(order, col, row, s) for order, row, col, s in edges]
+        rows, cols = cols, rows
+
+    if len(rows) * len(rows) * len(cols) > _HUNGARIAN_MAX_WORK:
+        return _greedy(edges)
+
+    row_pos = {row: i for i, row in enumerate(rows)}
+    col_pos = {col: j for j, col in enumerate(cols)}
+    weights = [[0] * len(cols) for _ in rows]
+    order_at = {}
+    for order, row, col, s in edges:
+        i, j = row_pos[row], col_pos[col]
+        weights[i][j] = s
+        order_at[(i, j)] = order
+
+    return [
+        order_at[(i, j)]
+        for i, j in _hungarian(weights)
+        if (i, j) in order_at
+    ]
+
+
+def assign_one_to_one(scored, min_score=0):
+    """
+    Pick at most one transaction per invoice and one invoice per transaction,
+    maximising the total score over the sparse proposal graph.
+
+    The graph is split into connected components. Each component is solved
+    exactly with the Hungarian method. A component too large for it falls back
+    to greedy highest-score-first assignment, which still reaches at least half
+    of the optimal total. The chosen proposals are returned in their input
+    order.
+    """
+    proposals = [item for item in scored if item[2] >= min_score]
+
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    edges = []
+    for order, (inv, tx, s) in enumerate(proposals):
+        row, col = ("inv", id(inv)), ("tx", id(tx))
+        parent[find(row)] = find(col)
+        edges.append((order, row, col, s))
+
+    components = {}
+    for edge in edges:
+        components.setdefault(find(edge[1]), []).append(edge)
+
+    chosen = sorted(
+        order
+        for component in components.values()
+        for order in _solve_component(component)
+    )
+    return [proposals[order] for order in chosen]
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import ConfigDict
 
 
@@ -67,6 +67,14 @@ class BankTransactionImport(BaseModel):
     description: Optional[str] = None
     posted_at: Optional[datetime] = None
 
+    @field_validator("posted_at")
+    @classmethod
+    def _posted_at_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored without an offset, so keep naive UTC to read back the same instant.
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 
 class BankTransactionResponse(ORMModel):
     id: str
@@ -79,6 +87,10 @@ class BankTransactionResponse(ORMModel):
     created_at: datetime
 
 
+class BankTransactionStreamImportResponse(BaseModel):
+    imported: int
+
+
 # =====================================================
 # Match Schemas
 # =====================================================
@@ -103,6 +115,21 @@ class ReconcileResponse(BaseModel):
     score: float
 
 
+class ReconcileJobResponse(ORMModel):
+    id: str
+    tenant_id: str
+    full: bool
+    mode: str
+    top_k: int
+    min_score: float
+    status: str
+    pairs_scored: int
+    pairs_total: int
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+
 # =====================================================
 # AI Explanation Schema
 # =====================================================
@@ -111,10 +138,16 @@ class AIExplanationResponse(BaseModel):
     explanation: str
 
 
+class ExplainPair(BaseModel):
+    invoice_id: str
+    transaction_id: str
+
+
 # =====================================================
 # Pagination Schema
 # =====================================================
 
 class PaginatedInvoices(BaseModel):
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
     items: List[InvoiceResponse]
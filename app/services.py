@@ -1,10 +1,57 @@
+import base64
 import hashlib
 import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
 from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import and_, delete, func, insert, or_, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-from app import models
-from app.reconciliation import score_match
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.orm import Session, load_only
+from app import metrics, models, parallel
+from app.cache import TTLCache
+from app.schemas import BankTransactionImport
+from app.config import settings
+from app.sql_reconciliation import UPSERT_INSERTS, on_conflict_rescore, propose_matches_sql
+from app.reconciliation import (
+    assign_one_to_one,
+    score_batch,
+    score_candidates,
+    score_batch_sharded,
+    select_top_k,
+    to_columns,
+)
+
+RECONCILE_MODES = ("all", "top_k", "assignment")
+
+_IN_CHUNK = 500
+
+_tenant_cache = TTLCache(
+    maxsize=settings.TENANT_CACHE_SIZE,
+    ttl=settings.TENANT_CACHE_TTL_SECONDS,
+)
+
+# (tenant_id, key) -> (payload_hash, response payload) for recently used keys.
+_idempotency_cache = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_CACHE_TTL_SECONDS,
+)
+_idempotency_purge_lock = threading.Lock()
+_idempotency_last_purge = 0.0
+
+# (tenant_id, key) -> Future of the import currently claiming that key.
+_inflight_imports = {}
+_inflight_lock = threading.Lock()
+
+
+def _as_utc(value: datetime):
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
 
 def _serialize_bank_tx(tx: models.BankTransaction):
@@ -15,16 +62,67 @@ def _serialize_bank_tx(tx: models.BankTransaction):
         "amount": tx.amount,
         "currency": tx.currency,
         "description": tx.description,
-        "posted_at": tx.posted_at.isoformat() if tx.posted_at else None,
-        "created_at": tx.created_at.isoformat() if tx.created_at else None,
+        # Stored timestamps come back naive; they are UTC like the defaults.
+        "posted_at": _as_utc(tx.posted_at).isoformat() if tx.posted_at else None,
+        "created_at": _as_utc(tx.created_at).isoformat() if tx.created_at else None,
     }
 
 
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
 def _get_tenant_or_404(db: Session, tenant_id: str):
-    tenant = db.query(models.Tenant).filter_by(id=tenant_id).first()
-    if not tenant:
+    """
+    Raise 404 unless the tenant exists.
+
+    Known tenant ids are kept in a bounded, process-local TTL cache, so the
+    check usually costs no query. Only existing tenants are cached.
+    """
+    if _tenant_cache.get(tenant_id):
+        return
+
+    exists = db.query(models.Tenant.id).filter_by(id=tenant_id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Tenant not found")
-    return tenant
+    _tenant_cache.set(tenant_id, True)
+
+
+def invalidate_tenant(tenant_id: str):
+    """Drop a tenant from the existence cache, e.g. after deleting it."""
+    _tenant_cache.pop(tenant_id)
+
+
+def _score_pairs(invoices, transactions, progress=None):
+    pairs = len(invoices) * len(transactions)
+    if pairs < settings.RECONCILE_BATCH_MIN_PAIRS:
+        return score_candidates(invoices, transactions, progress=progress)
+
+    inv_amounts, inv_dates, inv_descriptions = to_columns(invoices, "invoice_date")
+    tx_amounts, tx_dates, tx_descriptions = to_columns(transactions, "posted_at")
+
+    processes = parallel.process_count()
+    if processes > 1 and pairs >= settings.RECONCILE_PARALLEL_MIN_PAIRS:
+        scored = score_batch_sharded(
+            parallel.get_executor(),
+            processes,
+            (inv_amounts, inv_dates, inv_descriptions),
+            (tx_amounts, tx_dates, tx_descriptions),
+            progress=progress,
+        )
+    else:
+        scored = score_batch(
+            inv_amounts,
+            inv_dates,
+            tx_amounts,
+            tx_dates,
+            inv_descriptions,
+            tx_descriptions,
+            progress=progress,
+        )
+    return (
+        (invoices[i], transactions[j], s) for i, j, s in scored
+    )
 
 
 def create_tenant(db: Session, name: str):
@@ -32,9 +130,29 @@ def create_tenant(db: Session, name: str):
     db.add(tenant)
     db.commit()
     db.refresh(tenant)
+    _tenant_cache.set(tenant.id, True)
     return tenant
 
 
+def list_tenants(db: Session, cursor=None, limit=20, columns=None):
+    """Return one keyset page of tenants in ``(created_at, id)`` order, like ``list_invoices``."""
+    query = db.query(models.Tenant)
+    if columns:
+        query = query.options(load_only(*columns, raiseload=True))
+
+    if cursor:
+        query = query.filter(_after_cursor(models.Tenant, cursor))
+
+    rows = query.order_by(
+        models.Tenant.created_at,
+        models.Tenant.id,
+    ).limit(limit + 1).all()
+
+    for tenant in rows:
+        _tenant_cache.set(tenant.id, True)
+    return _page(rows, limit, None)
+
+
 def create_invoice(db: Session, tenant_id: str, data):
     _get_tenant_or_404(db, tenant_id)
 
@@ -46,20 +164,113 @@ def create_invoice(db: Session, tenant_id: str, data):
     return invoice
 
 
-def list_invoices(db: Session, tenant_id: str, filters, skip=0, limit=20):
+def encode_cursor(created_at: datetime, row_id: str):
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _after_cursor(model, cursor: str):
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        model.created_at > created_at,
+        and_(model.created_at == created_at, model.id > row_id),
+    )
+
+
+class _Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a select, bound like any other statement."""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    # Compiling through the statement's compiler keeps the driver's own
+    # parameter style (``%(name)s`` for psycopg2, ``$n`` for asyncpg).
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _count(db: Session, query, mode: str):
+    """Exact ``count(*)`` or, on PostgreSQL, the planner's row estimate for ``query``."""
+    bind = db.get_bind()
+    if mode == "estimated" and bind.dialect.name == "postgresql":
+        plan = db.execute(_Explain(query.statement)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    return query.order_by(None).count()
+
+
+def list_invoices(db: Session, tenant_id: str, filters, cursor=None, limit=20, count="none", columns=None):
+    """
+    Return one page of a tenant's invoices in ``(created_at, id)`` order.
+
+    Pages are keyset-paginated: ``cursor`` is the opaque ``next_cursor`` of the
+    previous page, so deep pages cost the same as the first one. ``count`` is
+    ``none``, ``exact`` or ``estimated`` (planner estimate on PostgreSQL, exact
+    elsewhere) and fills ``total`` for the filtered set. ``columns`` restricts
+    the loaded attributes; the others raise instead of lazy loading.
+    """
     _get_tenant_or_404(db, tenant_id)
-    query = db.query(models.Invoice).filter_by(tenant_id=tenant_id)
+    query = db.query(models.Invoice).filter(*_invoice_conditions(tenant_id, filters))
+    if columns:
+        query = query.options(load_only(*columns, raiseload=True))
+
+    total = _count(db, query, count) if count != "none" else None
+
+    if cursor:
+        query = query.filter(_after_cursor(models.Invoice, cursor))
+
+    rows = query.order_by(
+        models.Invoice.created_at,
+        models.Invoice.id,
+    ).limit(limit + 1).all()
+
+    return _page(rows, limit, total)
+
+
+def _invoice_conditions(tenant_id: str, filters):
+    conditions = [models.Invoice.tenant_id == tenant_id]
 
     if filters.get("status"):
-        query = query.filter(models.Invoice.status == filters["status"])
+        conditions.append(models.Invoice.status == filters["status"])
+
+    if filters.get("min_amount") is not None:
+        conditions.append(models.Invoice.amount >= filters["min_amount"])
 
-    if filters.get("min_amount"):
-        query = query.filter(models.Invoice.amount >= filters["min_amount"])
+    if filters.get("max_amount") is not None:
+        conditions.append(models.Invoice.amount <= filters["max_amount"])
 
-    if filters.get("max_amount"):
-        query = query.filter(models.Invoice.amount <= filters["max_amount"])
+    if filters.get("start_date") is not None:
+        conditions.append(models.Invoice.invoice_date >= filters["start_date"])
 
-    return query.offset(skip).limit(limit).all()
+    if filters.get("end_date") is not None:
+        conditions.append(models.Invoice.invoice_date <= filters["end_date"])
+
+    return conditions
+
+
+def _page(rows, limit: int, total):
+    """Trim the ``limit + 1`` rows fetched for a page and derive ``next_cursor``."""
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return {"items": items, "next_cursor": next_cursor, "total": total}
 
 
 def delete_invoice(db: Session, tenant_id: str, invoice_id: str):
@@ -73,13 +284,164 @@ def delete_invoice(db: Session, tenant_id: str, invoice_id: str):
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found for tenant")
 
+    # Matches cascade on PostgreSQL; SQLite does not enforce foreign keys.
+    db.query(models.Match).filter_by(
+        tenant_id=tenant_id,
+        invoice_id=invoice_id,
+    ).delete(synchronize_session=False)
     db.delete(invoice)
     db.commit()
 
 
-def import_transactions(db: Session, tenant_id: str, txs, key: str):
+def load_explain_rows(db: Session, tenant_id: str, pairs):
+    """Load the tenant's invoices and transactions referenced by ``pairs``, keyed by id."""
     _get_tenant_or_404(db, tenant_id)
 
+    invoice_ids = list({invoice_id for invoice_id, _ in pairs})
+    tx_ids = list({tx_id for _, tx_id in pairs})
+
+    invoices = db.query(models.Invoice).filter(
+        models.Invoice.tenant_id == tenant_id,
+        models.Invoice.id.in_(invoice_ids),
+    ).all()
+    transactions = db.query(models.BankTransaction).filter(
+        models.BankTransaction.tenant_id == tenant_id,
+        models.BankTransaction.id.in_(tx_ids),
+    ).all()
+
+    return (
+        {invoice.id: invoice for invoice in invoices},
+        {tx.id: tx for tx in transactions},
+    )
+
+
+def _load_transactions_in_order(db: Session, tenant_id: str, ids):
+    by_id = {}
+    for start in range(0, len(ids), _IN_CHUNK):
+        rows = db.query(models.BankTransaction).filter(
+            models.BankTransaction.tenant_id == tenant_id,
+            models.BankTransaction.id.in_(ids[start:start + _IN_CHUNK]),
+        ).all()
+        by_id.update((tx.id, tx) for tx in rows)
+    return [by_id[tx_id] for tx_id in ids if tx_id in by_id]
+
+
+def _lookup_idempotency_key(db: Session, tenant_id: str, key: str):
+    """
+    Return ``(payload_hash, response_payload)`` for a live idempotency key, or ``None``.
+
+    Hot keys are served from the in-process cache. Records past ``expires_at``
+    are deleted so the key can be claimed again. Stored responses either hold
+    the created transaction ids, which are re-serialized from the table, or a
+    small summary that is returned as is.
+    """
+    cached = _idempotency_cache.get((tenant_id, key))
+    if cached is not None:
+        return cached
+
+    record = db.query(models.IdempotencyKey).filter_by(
+        tenant_id=tenant_id,
+        key=key
+    ).first()
+
+    if not record:
+        return None
+
+    if record.status == "pending":
+        # A streaming import is committing under this key, or was cut off and
+        # can be resumed; it does not expire until it completes.
+        return None
+
+    remaining = (_as_utc(record.expires_at) - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        db.delete(record)
+        db.flush()
+        return None
+
+    stored = json.loads(record.response)
+    if "transaction_ids" in stored:
+        stored = [
+            _serialize_bank_tx(tx)
+            for tx in _load_transactions_in_order(db, tenant_id, stored["transaction_ids"])
+        ]
+
+    entry = (record.payload_hash, stored)
+    _idempotency_cache.set((tenant_id, key), entry, ttl=remaining)
+    return entry
+
+
+def _record_idempotency_key(db: Session, tenant_id: str, key: str, payload_hash: str, stored, response_payload):
+    """Commit the key record; returns False if another process recorded the key first."""
+    created_at = datetime.now(timezone.utc)
+    db.add(models.IdempotencyKey(
+        tenant_id=tenant_id,
+        key=key,
+        payload_hash=payload_hash,
+        response=json.dumps(stored),
+        created_at=created_at,
+        expires_at=created_at + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+
+    _idempotency_cache.set(
+        (tenant_id, key),
+        (payload_hash, response_payload),
+        ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    )
+    return True
+
+
+def _claim_import(tenant_id: str, key: str):
+    """Return ``(future, is_leader)`` for the in-process import of ``(tenant_id, key)``."""
+    with _inflight_lock:
+        future = _inflight_imports.get((tenant_id, key))
+        if future is not None:
+            return future, False
+        future = Future()
+        _inflight_imports[(tenant_id, key)] = future
+        return future, True
+
+
+def _release_import(tenant_id: str, key: str):
+    with _inflight_lock:
+        _inflight_imports.pop((tenant_id, key), None)
+
+
+def idempotency_purge_due():
+    """Return True at most once per ``IDEMPOTENCY_PURGE_INTERVAL_SECONDS`` per process."""
+    global _idempotency_last_purge
+    with _idempotency_purge_lock:
+        now = time.monotonic()
+        if now - _idempotency_last_purge < settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+            return False
+        _idempotency_last_purge = now
+        return True
+
+
+def purge_expired_idempotency_keys(db: Session):
+    # Pending stream keys are kept, so the rows committed under them can be resumed.
+    deleted = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.status != "pending",
+        models.IdempotencyKey.expires_at <= datetime.now(timezone.utc),
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def import_transactions(db: Session, tenant_id: str, txs, key: str):
+    """
+    Import a batch of transactions once per ``Idempotency-Key``.
+
+    Concurrent requests for the same ``(tenant_id, key)`` in this process are
+    coalesced. The first one claims the key and runs the import. The others
+    wait for its outcome and return the same response, or ``409`` if their
+    payload differs. If the claiming request fails, a waiter retries and
+    claims the key itself.
+    """
     if not key or not key.strip():
         raise HTTPException(status_code=400, detail="Idempotency key is required")
 
@@ -87,22 +449,58 @@ def import_transactions(db: Session, tenant_id: str, txs, key: str):
         raise HTTPException(status_code=400, detail="At least one transaction is required")
 
     payload_hash = hashlib.sha256(
-        json.dumps(
-            txs,
-            sort_keys=True,
-            default=lambda value: value.isoformat() if hasattr(value, "isoformat") else str(value),
-        ).encode()
+        json.dumps(txs, sort_keys=True, default=_json_default).encode()
     ).hexdigest()
 
-    existing = db.query(models.IdempotencyKey).filter_by(
-        tenant_id=tenant_id,
-        key=key
-    ).first()
+    while True:
+        # A cached key proves the tenant exists, so hot replays skip the database.
+        existing = _idempotency_cache.get((tenant_id, key))
+        if existing:
+            if existing[0] != payload_hash:
+                raise HTTPException(status_code=409, detail="Idempotency conflict")
+            return existing[1]
 
-    if existing:
-        if existing.payload_hash != payload_hash:
+        future, is_leader = _claim_import(tenant_id, key)
+        if is_leader:
+            break
+
+        try:
+            leader_hash, leader_response = future.result(
+                timeout=settings.IDEMPOTENCY_WAIT_SECONDS
+            )
+        except FutureTimeoutError:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        except Exception:
+            continue
+
+        if leader_hash != payload_hash:
+            raise HTTPException(status_code=409, detail="Idempotency conflict")
+        return leader_response
+
+    try:
+        outcome = _import_transactions_once(db, tenant_id, txs, key, payload_hash)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(outcome)
+        if outcome[0] != payload_hash:
             raise HTTPException(status_code=409, detail="Idempotency conflict")
-        return json.loads(existing.response)
+        return outcome[1]
+    finally:
+        _release_import(tenant_id, key)
+
+
+def _import_transactions_once(db: Session, tenant_id: str, txs, key: str, payload_hash: str):
+    """Run one import pass; returns ``(payload_hash, response)`` of the recorded key."""
+    _get_tenant_or_404(db, tenant_id)
+
+    existing = _lookup_idempotency_key(db, tenant_id, key)
+    if existing:
+        return existing
 
     created = []
     for tx in txs:
@@ -121,48 +519,743 @@ def import_transactions(db: Session, tenant_id: str, txs, key: str):
 
     response_payload = [_serialize_bank_tx(tx) for tx in created]
 
-    record = models.IdempotencyKey(
+    recorded = _record_idempotency_key(
+        db,
+        tenant_id,
+        key,
+        payload_hash,
+        {"transaction_ids": [tx.id for tx in created]},
+        response_payload,
+    )
+    if not recorded:
+        # Another process recorded the key first and our inserts were rolled back.
+        existing = _lookup_idempotency_key(db, tenant_id, key)
+        if not existing:
+            raise HTTPException(status_code=409, detail="Idempotency conflict")
+        return existing
+
+    metrics.IMPORT_ROWS.inc(len(created), source="batch", tenant=metrics.tenant_label(tenant_id))
+    return payload_hash, response_payload
+
+
+def _validate_stream_batch(batch):
+    rows = []
+    for line_number, raw in batch:
+        try:
+            rows.append(BankTransactionImport.model_validate(raw).model_dump())
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid transaction on line {line_number}: {field}: {error['msg']}",
+            )
+    return rows
+
+
+def import_transactions_stream(db: Session, tenant_id: str, rows, key: str):
+    """
+    Import an arbitrarily large statement from an iterator of ``(line_number, dict)`` rows.
+
+    Rows are validated, bulk-inserted and committed in batches of
+    ``IMPORT_STREAM_BATCH_SIZE``, so memory and transaction size stay flat
+    regardless of statement size. The key is recorded as ``pending`` before
+    the first batch, and each commit advances it to the rows committed so far
+    and the hash of those rows; the last commit marks it complete, and its
+    TTL starts then. Pending keys never expire. A failing
+    row rolls back its own batch only. A retry with the same key re-reads the
+    stream, checks that it starts with the committed rows and inserts the
+    rest; a different prefix is rejected with ``409``. The idempotency hash
+    is built incrementally over the validated rows, which makes NDJSON and
+    CSV uploads of the same transactions equivalent. A replay with a
+    completed key is hashed without inserting anything.
+
+    Concurrent requests sharing a key run one at a time, because each one has
+    to hash its own stream; the later ones then replay the recorded key.
+    """
+    _get_tenant_or_404(db, tenant_id)
+
+    if not key or not key.strip():
+        raise HTTPException(status_code=400, detail="Idempotency key is required")
+
+    while True:
+        future, is_leader = _claim_import(tenant_id, key)
+        if is_leader:
+            break
+        try:
+            future.result(timeout=settings.IDEMPOTENCY_WAIT_SECONDS)
+        except FutureTimeoutError:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        except Exception:
+            pass
+
+    try:
+        outcome = _import_transactions_stream_once(db, tenant_id, rows, key)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(outcome)
+        return outcome[1]
+    finally:
+        _release_import(tenant_id, key)
+
+
+def _claim_stream_key(db: Session, tenant_id: str, key: str):
+    """
+    Return ``(completed, pending)`` for a streaming import of ``key``.
+
+    ``completed`` is the lookup entry of a finished import to replay. Otherwise
+    ``pending`` is the key record to commit batches under: the one left by an
+    interrupted import, or a new one.
+    """
+    existing = _lookup_idempotency_key(db, tenant_id, key)
+    if existing:
+        return existing, None
+
+    pending = db.query(models.IdempotencyKey).filter_by(
         tenant_id=tenant_id,
         key=key,
-        payload_hash=payload_hash,
-        response=json.dumps(response_payload),
+        status="pending",
+    ).first()
+    if pending:
+        return None, pending
+
+    created_at = datetime.now(timezone.utc)
+    pending = models.IdempotencyKey(
+        tenant_id=tenant_id,
+        key=key,
+        payload_hash=hashlib.sha256(b"stream\n").hexdigest(),
+        response=json.dumps({}),
+        status="pending",
+        rows_committed=0,
+        created_at=created_at,
+        expires_at=created_at + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
     )
+    db.add(pending)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # Claimed by another process meanwhile.
+        return _claim_stream_key(db, tenant_id, key)
+    return None, pending
 
-    db.add(record)
-    db.commit()
 
-    return response_payload
+def _advance_stream_key(db: Session, pending_id: str, committed: int, values):
+    """Move the pending key on from ``committed`` rows; False if someone else moved it."""
+    advanced = db.query(models.IdempotencyKey).filter_by(
+        id=pending_id,
+        status="pending",
+        rows_committed=committed,
+    ).update(values, synchronize_session=False)
+    return bool(advanced)
+
+
+def _import_transactions_stream_once(db: Session, tenant_id: str, rows, key: str):
+    existing, pending = _claim_stream_key(db, tenant_id, key)
+    pending_id, resume_at, prefix_hash = (
+        (pending.id, pending.rows_committed, pending.payload_hash) if pending else (None, 0, None)
+    )
+
+    digest = hashlib.sha256(b"stream\n")
+    seen = 0
+    committed = resume_at
+    imported = 0
+    batch = []
+
+    def flush(last=False):
+        nonlocal seen, committed, imported
+        validated = _validate_stream_batch(batch)
+        batch.clear()
+
+        fresh = []
+        for row in validated:
+            digest.update(json.dumps(row, sort_keys=True, default=_json_default).encode())
+            digest.update(b"\n")
+            seen += 1
+            if existing:
+                continue
+            if seen == resume_at and digest.hexdigest() != prefix_hash:
+                raise HTTPException(status_code=409, detail="Idempotency conflict")
+            if seen > resume_at:
+                fresh.append(row)
+
+        if existing or not fresh:
+            return
+
+        created_at = datetime.now(timezone.utc)
+        for row in fresh:
+            row.update(id=str(uuid4()), tenant_id=tenant_id, created_at=created_at)
+
+        try:
+            db.execute(insert(models.BankTransaction), fresh)
+        except IntegrityError:
+            raise HTTPException(
+                status_code=409,
+                detail="Duplicate bank transaction for tenant/external_id",
+            )
+        imported += len(fresh)
+
+        if last:
+            # Committed together with the completed key.
+            return
+        values = {"rows_committed": committed + len(fresh), "payload_hash": digest.hexdigest()}
+        if not _advance_stream_key(db, pending_id, committed, values):
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        db.commit()
+        committed += len(fresh)
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= settings.IMPORT_STREAM_BATCH_SIZE:
+                flush()
+        if batch:
+            flush(last=True)
+
+        payload_hash = digest.hexdigest()
+
+        if existing:
+            if existing[0] != payload_hash:
+                raise HTTPException(status_code=409, detail="Idempotency conflict")
+            return existing
+
+        if seen < resume_at:
+            # Shorter than the rows already committed under this key.
+            raise HTTPException(status_code=409, detail="Idempotency conflict")
+
+        if not seen:
+            raise HTTPException(status_code=400, detail="At least one transaction is required")
+
+        response_payload = {"imported": seen}
+        completed = _advance_stream_key(db, pending_id, committed, {
+            "status": "complete",
+            "payload_hash": payload_hash,
+            "response": json.dumps(response_payload),
+            "rows_committed": seen,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        })
+        if not completed:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        db.commit()
+    except BaseException:
+        # Only the batch in flight is lost; committed batches stay recorded
+        # on the pending key, and a retry resumes after them.
+        db.rollback()
+        raise
+
+    _idempotency_cache.set(
+        (tenant_id, key),
+        (payload_hash, response_payload),
+        ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    )
+    metrics.IMPORT_ROWS.inc(imported, source="stream", tenant=metrics.tenant_label(tenant_id))
+    return payload_hash, response_payload
+
+
+def _open_invoices(db: Session, tenant_id: str):
+    return db.query(models.Invoice).filter_by(tenant_id=tenant_id, status="open")
+
+
+def _open_transactions(db: Session, tenant_id: str):
+    confirmed = db.query(models.Match.bank_transaction_id).filter_by(
+        tenant_id=tenant_id,
+        status="confirmed",
+    )
+    return db.query(models.BankTransaction).filter(
+        models.BankTransaction.tenant_id == tenant_id,
+        models.BankTransaction.id.not_in(confirmed),
+    )
+
+
+def _bulk_insert_matches(db: Session, rows):
+    """Insert match rows with executemany in fixed-size chunks, bypassing the unit of work."""
+    chunk_size = settings.MATCH_INSERT_CHUNK_SIZE
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(models.Match), rows[start:start + chunk_size])
+
+
+def _upsert_matches(db: Session, rows):
+    """
+    Re-score stored proposals from match rows, in fixed-size executemany chunks.
+
+    Each row updates the score of the proposed match for its pair
+    (``uq_match_pair``), or is inserted if that match has gone; confirmed
+    matches are never touched. Returns the rows as stored, so re-scored
+    matches keep their original ``id`` and ``created_at``. Dialects without
+    ``ON CONFLICT`` update the scores by ``id`` instead.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in UPSERT_INSERTS:
+        db.execute(update(models.Match), [{"id": row["id"], "score": row["score"]} for row in rows])
+        return rows
+
+    stmt = on_conflict_rescore(UPSERT_INSERTS[dialect](models.Match)).returning(
+        models.Match.id,
+        models.Match.invoice_id,
+        models.Match.bank_transaction_id,
+        models.Match.created_at,
+    )
+
+    by_pair = {(row["invoice_id"], row["bank_transaction_id"]): row for row in rows}
+    stored = {}
+    chunk_size = settings.MATCH_INSERT_CHUNK_SIZE
+    for start in range(0, len(rows), chunk_size):
+        for match_id, invoice_id, tx_id, created_at in db.execute(stmt, rows[start:start + chunk_size]):
+            stored[(invoice_id, tx_id)] = {
+                **by_pair[(invoice_id, tx_id)],
+                "id": match_id,
+                "created_at": created_at,
+            }
+
+    # Keep the proposal order; pairs that hit a confirmed match are dropped.
+    return [stored[pair] for pair in by_pair if pair in stored]
+
+
+def _store_proposals(db: Session, rows, rescored):
+    """
+    Write proposal rows: plain bulk inserts for new pairs, and ``_upsert_matches``
+    only for the pairs in ``rescored``, which the upsert and its ``RETURNING``
+    would otherwise slow down. Returns the rows as stored, in proposal order.
+
+    A new pair proposed meanwhile by a concurrent reconcile is answered with ``409``.
+    """
+    def pair(row):
+        return row["invoice_id"], row["bank_transaction_id"]
+
+    try:
+        _bulk_insert_matches(db, [row for row in rows if pair(row) not in rescored])
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Matches were proposed by a concurrent reconcile; retry",
+        )
+
+    stored = {
+        pair(row): row
+        for row in _upsert_matches(db, [row for row in rows if pair(row) in rescored])
+    }
+    return [
+        stored.get(pair(row), row)
+        for row in rows
+        if pair(row) not in rescored or pair(row) in stored
+    ]
+
+
+def _is_new_or_rescored(existing, inv, tx, score):
+    stored = existing.get((inv.id, tx.id))
+    return stored is None or (stored[0] == "proposed" and stored[1] != score)
+
+
+def _with_standing_proposals(scored, existing, mode):
+    """
+    Candidates for a capped selection: the scored pairs that are not
+    confirmed, preceded by the stored proposals competing with them.
+
+    A stored proposal competes when it shares an invoice with a scored pair
+    (or, for ``assignment``, an invoice or a transaction). Proposals on an
+    invoice or transaction that is already confirmed elsewhere are left out.
+    Pairs that were not scored on this run keep their stored score.
+    """
+    confirmed = [pair for pair, (status, *_) in existing.items() if status == "confirmed"]
+    confirmed_invoices = {invoice_id for invoice_id, _ in confirmed}
+    confirmed_transactions = {tx_id for _, tx_id in confirmed}
+
+    invoices = {inv.id: inv for inv, _, _ in scored}
+    transactions = {tx.id: tx for _, tx, _ in scored}
+    scored_pairs = {(inv.id, tx.id) for inv, tx, _ in scored}
+
+    standing = []
+    for (invoice_id, tx_id), (status, score, _) in existing.items():
+        if (
+            status != "proposed"
+            or (invoice_id, tx_id) in scored_pairs
+            or invoice_id in confirmed_invoices
+            or tx_id in confirmed_transactions
+        ):
+            continue
+        if invoice_id not in invoices and (mode != "assignment" or tx_id not in transactions):
+            continue
+        standing.append((
+            invoices.setdefault(invoice_id, SimpleNamespace(id=invoice_id)),
+            transactions.setdefault(tx_id, SimpleNamespace(id=tx_id)),
+            score,
+        ))
+
+    return standing + [
+        item for item in scored
+        if existing.get((item[0].id, item[1].id), ("proposed",))[0] != "confirmed"
+    ]
+
+
+def _select_proposals(scored, existing, mode, top_k, min_score):
+    """
+    Pick the proposals to store from ``scored`` and return them with the ids
+    of stored proposals that lost their place.
+
+    ``all`` keeps every new or re-scored pair at or above ``min_score`` and
+    withdraws the stored proposals whose new score is below it. The capped
+    modes select over the stored proposals too, so a rerun never grows an
+    invoice past ``top_k`` proposals (or one per invoice and transaction):
+    a stored proposal that no longer makes the cut is withdrawn.
+    """
+    if mode == "all":
+        below = [(inv.id, tx.id) for inv, tx, score in scored if score < min_score]
+        return [
+            item for item in scored
+            if item[2] >= min_score and _is_new_or_rescored(existing, *item)
+        ], [
+            existing[pair][2]
+            for pair in below
+            if pair in existing and existing[pair][0] == "proposed"
+        ]
+
+    candidates = _with_standing_proposals(scored, existing, mode)
+    if mode == "top_k":
+        selected = select_top_k(candidates, top_k, min_score)
+    else:
+        selected = assign_one_to_one(candidates, min_score)
 
+    kept = {(inv.id, tx.id) for inv, tx, _ in selected}
+    withdrawn = [
+        existing[(inv.id, tx.id)][2]
+        for inv, tx, _ in candidates
+        if (inv.id, tx.id) in existing and (inv.id, tx.id) not in kept
+    ]
+    return [item for item in selected if _is_new_or_rescored(existing, *item)], withdrawn
 
-def reconcile(db: Session, tenant_id: str):
+
+def _unscored_proposals(db: Session, tenant_id: str, batches, scored):
+    """
+    Stored proposals on pairs covered by ``batches`` that no longer score at
+    all, as ``(invoice_id, bank_transaction_id) -> id``.
+
+    Each batch is looked up by its smaller side in chunked ``IN`` queries.
+    """
+    scored_pairs = {(inv.id, tx.id) for inv, tx, _ in scored}
+    unscored = {}
+    for invs, txs in batches:
+        invoice_ids = {inv.id for inv in invs}
+        tx_ids = {tx.id for tx in txs}
+        column, ids = (
+            (models.Match.invoice_id, list(invoice_ids)) if len(invoice_ids) <= len(tx_ids)
+            else (models.Match.bank_transaction_id, list(tx_ids))
+        )
+        for start in range(0, len(ids), _IN_CHUNK):
+            unscored.update(
+                ((invoice_id, tx_id), match_id)
+                for match_id, invoice_id, tx_id in db.query(
+                    models.Match.id,
+                    models.Match.invoice_id,
+                    models.Match.bank_transaction_id,
+                ).filter(
+                    models.Match.tenant_id == tenant_id,
+                    models.Match.status == "proposed",
+                    column.in_(ids[start:start + _IN_CHUNK]),
+                )
+                if invoice_id in invoice_ids and tx_id in tx_ids
+                and (invoice_id, tx_id) not in scored_pairs
+            )
+    return unscored
+
+
+def _withdraw_proposals(db: Session, tenant_id: str, match_ids):
+    for start in range(0, len(match_ids), _IN_CHUNK):
+        db.execute(
+            delete(models.Match).where(
+                models.Match.tenant_id == tenant_id,
+                models.Match.status == "proposed",
+                models.Match.id.in_(match_ids[start:start + _IN_CHUNK]),
+            )
+        )
+
+
+def _held_back(newest, horizon):
+    """``newest``, or ``horizon`` if that is earlier (naive values are UTC)."""
+    if newest is None or _as_utc(newest) <= horizon:
+        return newest
+    return horizon if newest.tzinfo else horizon.replace(tzinfo=None)
+
+
+def _newest_created_at(query, model, mark):
+    if mark is not None:
+        query = query.filter(model.created_at >= mark)
+    return query.with_entities(func.max(model.created_at)).scalar()
+
+
+def _get_watermark(db: Session, tenant_id: str):
+    """
+    The tenant's ``ReconcileWatermark``, created on its first reconcile.
+
+    Concurrent first reconciles both insert it: with ``ON CONFLICT DO
+    NOTHING`` the loser keeps the winner's row; other dialects answer the
+    loser with ``409``.
+    """
+    watermark = db.get(models.ReconcileWatermark, tenant_id)
+    if watermark is not None:
+        return watermark
+
+    upsert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        db.execute(
+            upsert(models.ReconcileWatermark)
+            .values(tenant_id=tenant_id)
+            .on_conflict_do_nothing(index_elements=[models.ReconcileWatermark.tenant_id])
+        )
+        return db.get(models.ReconcileWatermark, tenant_id)
+
+    watermark = models.ReconcileWatermark(tenant_id=tenant_id)
+    db.add(watermark)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Tenant is being reconciled by a concurrent request; retry",
+        )
+    return watermark
+
+
+def _existing_matches(db: Session, tenant_id: str, scored, mode: str):
+    """
+    Stored matches touching the scored pairs, as
+    ``(invoice_id, bank_transaction_id) -> (status, score, id)``.
+
+    Only matches on a scored invoice or transaction are loaded, in chunked
+    ``IN`` queries, so an incremental run reads the neighbourhood of its
+    window instead of every match of the tenant. The capped modes also load
+    the confirmed matches on the other side of those, which rule out the
+    standing proposals they share an invoice or transaction with.
+    """
+    existing = {}
+
+    def load(column, ids, *criteria):
+        ids = list(ids)
+        for start in range(0, len(ids), _IN_CHUNK):
+            existing.update(
+                ((invoice_id, tx_id), (status, score, match_id))
+                for invoice_id, tx_id, status, score, match_id in db.query(
+                    models.Match.invoice_id,
+                    models.Match.bank_transaction_id,
+                    models.Match.status,
+                    models.Match.score,
+                    models.Match.id,
+                ).filter(
+                    models.Match.tenant_id == tenant_id,
+                    column.in_(ids[start:start + _IN_CHUNK]),
+                    *criteria,
+                )
+            )
+
+    invoice_ids = {inv.id for inv, _, _ in scored}
+    tx_ids = {tx.id for _, tx, _ in scored}
+    load(models.Match.invoice_id, invoice_ids)
+    load(models.Match.bank_transaction_id, tx_ids)
+
+    if mode != "all":
+        confirmed = models.Match.status == "confirmed"
+        load(models.Match.invoice_id, {invoice_id for invoice_id, _ in existing} - invoice_ids, confirmed)
+        load(models.Match.bank_transaction_id, {tx_id for _, tx_id in existing} - tx_ids, confirmed)
+
+    return existing
+
+
+def _reconcile_in_python(
+    db: Session,
+    tenant_id: str,
+    invoice_mark,
+    tx_mark,
+    mode: str,
+    top_k: int,
+    min_score: float,
+    progress,
+):
+    new_invoices = _open_invoices(db, tenant_id)
+    if invoice_mark is not None:
+        new_invoices = new_invoices.filter(models.Invoice.created_at >= invoice_mark)
+    new_invoices = new_invoices.all()
+
+    new_transactions = _open_transactions(db, tenant_id)
+    if tx_mark is not None:
+        new_transactions = new_transactions.filter(
+            models.BankTransaction.created_at >= tx_mark
+        )
+    new_transactions = new_transactions.all()
+
+    batches = []
+
+    if new_invoices:
+        open_transactions = (
+            new_transactions if tx_mark is None
+            else _open_transactions(db, tenant_id).all()
+        )
+        batches.append((new_invoices, open_transactions))
+
+    if new_transactions and invoice_mark is not None:
+        old_invoices = _open_invoices(db, tenant_id).filter(
+            models.Invoice.created_at < invoice_mark
+        ).all()
+        batches.append((old_invoices, new_transactions))
+
+    pairs_total = sum(len(invs) * len(txs) for invs, txs in batches)
+    pairs_scored = 0
+
+    def _advance(covered):
+        nonlocal pairs_scored
+        pairs_scored += covered
+        progress(pairs_scored, pairs_total)
+
+    if progress:
+        progress(0, pairs_total)
+
+    scored = []
+    for invs, txs in batches:
+        scored.extend(_score_pairs(invs, txs, progress=_advance if progress else None))
+
+    # Pairs already matched are only re-proposed when a proposal's score changed.
+    existing = _existing_matches(db, tenant_id, scored, mode) if scored else {}
+    # A proposal on a rescanned pair that stopped scoring is withdrawn, and
+    # does not stand against the new pairs.
+    unscored = _unscored_proposals(db, tenant_id, batches, scored)
+    for pair in unscored:
+        existing.pop(pair, None)
+
+    proposals, withdrawn = _select_proposals(scored, existing, mode, top_k, min_score)
+    withdrawn.extend(unscored.values())
+
+    rescored = {(inv.id, tx.id) for inv, tx, _ in proposals if (inv.id, tx.id) in existing}
+    # Naive UTC, as stored: matches read back from the table or from
+    # RETURNING look the same on every path.
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    results = [
+        {
+            "id": existing[(inv.id, tx.id)][2] if (inv.id, tx.id) in rescored else str(uuid4()),
+            "tenant_id": tenant_id,
+            "invoice_id": inv.id,
+            "bank_transaction_id": tx.id,
+            "score": s,
+            "status": "proposed",
+            "created_at": created_at,
+        }
+        for inv, tx, s in proposals
+    ]
+
+    newest_invoice = max((inv.created_at for inv in new_invoices), default=None)
+    newest_tx = max((tx.created_at for tx in new_transactions), default=None)
+
+    return results, rescored, withdrawn, newest_invoice, newest_tx, pairs_total
+
+
+def reconcile(
+    db: Session,
+    tenant_id: str,
+    full: bool = False,
+    mode: str = "all",
+    top_k: int = 3,
+    min_score: float = 0,
+    progress=None,
+):
+    """
+    Propose matches for invoice/transaction pairs not scored on earlier runs.
+
+    The tenant's ``ReconcileWatermark`` records the newest invoice and
+    transaction ``created_at`` already reconciled. Only invoices created at or
+    after it are scored against every open transaction, and only transactions
+    created at or after it are scored against the remaining open invoices.
+    ``created_at`` is stamped before the row is committed, so the watermark is
+    kept ``RECONCILE_WATERMARK_LAG_SECONDS`` behind the start of the run: rows
+    committed late are scanned again by the next run. Pairs that already have
+    a ``Match`` are skipped, so re-scanning them is safe; a stored proposal on
+    a rescanned pair whose score fell below ``min_score``, or to nothing, is
+    withdrawn. ``full=True`` ignores the watermark and rescans every open pair.
+
+    ``mode`` picks which new proposals at or above ``min_score`` are kept:
+    ``all`` of them, the ``top_k`` best per invoice, or a one-to-one
+    ``assignment`` between invoices and transactions with maximal total score.
+    The capped modes select over the stored proposals as well, replacing
+    those that are outscored instead of adding to them.
+    With ``RECONCILE_ENGINE=sql``, ``all`` mode is scored and inserted by a
+    single ``INSERT ... SELECT`` in the database; other modes always run in
+    Python.
+
+    ``progress`` is called as ``progress(pairs_scored, pairs_total)`` while
+    scoring, where pairs count the invoice x transaction combinations covered.
+    Pairs scored, matches proposed and the time spent scoring and committing
+    are recorded in ``app.metrics``.
+    """
     _get_tenant_or_404(db, tenant_id)
 
-    invoices = db.query(models.Invoice).filter_by(tenant_id=tenant_id).all()
-    transactions = db.query(models.BankTransaction).filter_by(tenant_id=tenant_id).all()
+    if mode not in RECONCILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown reconcile mode: {mode}")
+
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
 
-    if not invoices:
+    if not db.query(models.Invoice.id).filter_by(tenant_id=tenant_id).first():
         raise HTTPException(status_code=404, detail="No invoices found for tenant")
 
-    if not transactions:
+    if not db.query(models.BankTransaction.id).filter_by(tenant_id=tenant_id).first():
         raise HTTPException(status_code=404, detail="No bank transactions found for tenant")
 
-    results = []
-
-    for inv in invoices:
-        for tx in transactions:
-            s = score_match(inv, tx)
-            if s > 0:
-                match = models.Match(
-                    tenant_id=tenant_id,
-                    invoice_id=inv.id,
-                    bank_transaction_id=tx.id,
-                    score=s,
-                )
-                db.add(match)
-                results.append(match)
+    watermark = _get_watermark(db, tenant_id)
+
+    invoice_mark = None if full else watermark.invoices_created_at
+    tx_mark = None if full else watermark.transactions_created_at
+
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=settings.RECONCILE_WATERMARK_LAG_SECONDS)
+
+    in_database = settings.RECONCILE_ENGINE == "sql" and mode == "all"
+    started = time.perf_counter()
+    if in_database:
+        # Scoring and inserting are one statement here, so both count as scoring.
+        results = propose_matches_sql(db, tenant_id, invoice_mark, tx_mark, min_score)
+        withdrawn = []
+        pairs_total = 0
+        newest_invoice = _newest_created_at(
+            _open_invoices(db, tenant_id), models.Invoice, invoice_mark
+        )
+        newest_tx = _newest_created_at(
+            _open_transactions(db, tenant_id), models.BankTransaction, tx_mark
+        )
+    else:
+        results, rescored, withdrawn, newest_invoice, newest_tx, pairs_total = _reconcile_in_python(
+            db, tenant_id, invoice_mark, tx_mark, mode, top_k, min_score, progress
+        )
+    scored = time.perf_counter()
+
+    if not in_database:
+        _withdraw_proposals(db, tenant_id, withdrawn)
+        results = _store_proposals(db, results, rescored)
+
+    newest_invoice = _held_back(newest_invoice, horizon)
+    newest_tx = _held_back(newest_tx, horizon)
+
+    if newest_invoice is not None and (invoice_mark is None or newest_invoice > invoice_mark):
+        watermark.invoices_created_at = newest_invoice
+
+    if newest_tx is not None and (tx_mark is None or newest_tx > tx_mark):
+        watermark.transactions_created_at = newest_tx
 
     db.commit()
 
+    tenant = metrics.tenant_label(tenant_id)
+    metrics.RECONCILE_PAIRS_SCORED.inc(pairs_total, tenant=tenant)
+    metrics.RECONCILE_MATCHES_PROPOSED.inc(len(results), tenant=tenant)
+    metrics.RECONCILE_PHASE.observe(scored - started, phase="score", tenant=tenant)
+    metrics.RECONCILE_PHASE.observe(time.perf_counter() - scored, phase="commit", tenant=tenant)
+
     return results
 
 
@@ -0,0 +1,200 @@
+"""
+Set-based reconciliation: score and insert proposals in one ``INSERT ... SELECT``.
+
+Mirrors ``reconciliation.score_match`` with CASE expressions over a join of a
+tenant's open invoices and open bank transactions, so no invoice or
+transaction rows are loaded into Python. Works on SQLite and PostgreSQL.
+
+SQLite's ``lower()`` only folds ASCII letters, so descriptions with other
+cased characters can differ from the Python scorer on that dialect.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import String, and_, case, cast, delete, exists, func, insert, literal, or_, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+from app.reconciliation import AMOUNT_TOLERANCE, DATE_WINDOW_DAYS
+
+_MATCH_COLUMNS = (
+    "id",
+    "tenant_id",
+    "invoice_id",
+    "bank_transaction_id",
+    "score",
+    "status",
+    "created_at",
+)
+
+
+# Dialects whose INSERT supports ON CONFLICT (on ``uq_match_pair`` for matches).
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def on_conflict_rescore(stmt):
+    """
+    Make a dialect ``INSERT`` into ``matches`` an upsert on ``uq_match_pair``.
+
+    A pair that already has a proposed match gets the new score; confirmed
+    matches and unchanged scores are left alone (and not returned).
+    """
+    match = models.Match
+    return stmt.on_conflict_do_update(
+        index_elements=[match.tenant_id, match.invoice_id, match.bank_transaction_id],
+        set_={"score": stmt.excluded.score},
+        where=and_(match.status == "proposed", match.score != stmt.excluded.score),
+    )
+
+
+def _new_uuid(dialect: str):
+    if dialect == "postgresql":
+        return cast(func.gen_random_uuid(), String)
+
+    def hex_bytes(count, start=1):
+        return func.substr(func.lower(func.hex(func.randomblob(count))), start, type_=String)
+
+    variant = func.substr("89ab", 1 + func.abs(func.random()) % 4, 1, type_=String)
+    return (
+        hex_bytes(4) + "-" + hex_bytes(2) + "-4" + hex_bytes(2, 2)
+        + "-" + variant + hex_bytes(2, 2) + "-" + hex_bytes(6)
+    )
+
+
+def _shift_days(dialect: str, column, days: int):
+    if dialect == "sqlite":
+        # SQLite stores DateTime as "YYYY-MM-DD HH:MM:SS.ffffff"; shift the
+        # whole-second prefix and keep the microseconds so text comparison
+        # stays exact.
+        shifted = func.datetime(func.substr(column, 1, 19), f"{days:+d} days", type_=String)
+        return shifted + func.substr(column, 20, type_=String)
+    return column + timedelta(days=days)
+
+
+def _contains(dialect: str, haystack, needle):
+    position = func.strpos if dialect == "postgresql" else func.instr
+    return position(func.lower(haystack), func.lower(needle)) > 0
+
+
+def _score_expression(dialect: str):
+    inv, tx = models.Invoice, models.BankTransaction
+
+    amount = case(
+        (inv.amount == tx.amount, 50),
+        (func.abs(inv.amount - tx.amount) <= AMOUNT_TOLERANCE, 20),
+        else_=0,
+    )
+
+    # abs(delta.days) <= 3 with floored days means
+    # posted_at - 3 days <= invoice_date < posted_at + 4 days.
+    dated = and_(
+        inv.invoice_date.is_not(None),
+        tx.posted_at.is_not(None),
+        inv.invoice_date >= _shift_days(dialect, tx.posted_at, -DATE_WINDOW_DAYS),
+        inv.invoice_date < _shift_days(dialect, tx.posted_at, DATE_WINDOW_DAYS + 1),
+    )
+
+    described = and_(
+        inv.description.is_not(None),
+        inv.description != "",
+        tx.description.is_not(None),
+        tx.description != "",
+        _contains(dialect, tx.description, inv.description),
+    )
+
+    score = amount + case((dated, 20), else_=0) + case((described, 10), else_=0)
+    candidate = or_(
+        func.abs(inv.amount - tx.amount) <= AMOUNT_TOLERANCE,
+        dated,
+        described,
+    )
+    return score, candidate
+
+
+def propose_matches_sql(
+    db: Session,
+    tenant_id: str,
+    invoice_mark,
+    tx_mark,
+    min_score: float = 0,
+):
+    """
+    Insert proposals for open pairs with a positive score of at least ``min_score``.
+
+    Only pairs where the invoice was created at or after ``invoice_mark``, or
+    the transaction at or after ``tx_mark``, are scored. A side without a
+    watermark has never been scanned, so all of its rows count as new, like
+    in the Python engine. Pairs that already have
+    a proposed ``Match`` get its score updated if it changed (see
+    ``on_conflict_rescore``); other existing pairs are skipped. Proposals on
+    scanned pairs that score below ``min_score``, or no longer score at all,
+    are deleted first. Returns the inserted and re-scored rows as dicts.
+    """
+    dialect = db.get_bind().dialect.name
+    inv, tx, match = models.Invoice, models.BankTransaction, models.Match
+    score, candidate = _score_expression(dialect)
+
+    # Aliased so it is not correlated with the DELETE below.
+    other = aliased(models.Match)
+    confirmed = select(other.bank_transaction_id).where(
+        other.tenant_id == tenant_id,
+        other.status == "confirmed",
+    )
+    already_proposed = exists().where(
+        match.tenant_id == tenant_id,
+        match.invoice_id == inv.id,
+        match.bank_transaction_id == tx.id,
+    )
+
+    upsert = UPSERT_INSERTS.get(dialect)
+
+    scanned = [
+        inv.tenant_id == tenant_id,
+        inv.status == "open",
+        tx.tenant_id == tenant_id,
+        tx.id.not_in(confirmed),
+        or_(
+            inv.created_at >= invoice_mark if invoice_mark is not None else true(),
+            tx.created_at >= tx_mark if tx_mark is not None else true(),
+        ),
+    ]
+
+    db.execute(
+        delete(match).where(
+            match.tenant_id == tenant_id,
+            match.status == "proposed",
+            exists().where(
+                inv.id == match.invoice_id,
+                tx.id == match.bank_transaction_id,
+                *scanned,
+                or_(~candidate, score < min_score),
+            ),
+        )
+    )
+
+    conditions = [*scanned, candidate, score >= min_score]
+    if upsert is None:
+        conditions.append(~already_proposed)
+
+    created_at = datetime.now(timezone.utc)
+    pairs = (
+        select(
+            _new_uuid(dialect),
+            literal(tenant_id),
+            inv.id,
+            tx.id,
+            score,
+            literal("proposed"),
+            literal(created_at, models.Match.created_at.type),
+        )
+        .select_from(inv)
+        .join(tx, tx.tenant_id == inv.tenant_id)
+        .where(*conditions)
+    )
+
+    if upsert is None:
+        stmt = insert(match).from_select(_MATCH_COLUMNS, pairs)
+    else:
+        stmt = on_conflict_rescore(upsert(match).from_select(_MATCH_COLUMNS, pairs))
+    stmt = stmt.returning(*(getattr(match, column) for column in _MATCH_COLUMNS))
+    return [dict(row) for row in db.execute(stmt).mappings()]
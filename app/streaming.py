@@ -0,0 +1,59 @@
+import codecs
+import csv
+import json
+
+import anyio
+from fastapi import HTTPException
+
+
+def iterate_from_thread(async_iterable):
+    """
+    Consume an async iterable from a worker thread started by anyio.
+
+    Lets synchronous service code pull request body chunks one at a time
+    instead of buffering the whole body first.
+    """
+    iterator = async_iterable.__aiter__()
+    while True:
+        try:
+            yield anyio.from_thread.run(iterator.__anext__)
+        except StopAsyncIteration:
+            return
+
+
+def iter_lines(chunks):
+    """Split an iterable of UTF-8 byte chunks into text lines without their line endings."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def iter_rows(lines, fmt: str):
+    """Yield ``(line_number, row_dict)`` from NDJSON or CSV lines, skipping blank lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, {
+                key: value if value != "" else None
+                for key, value in row.items()
+            }
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_number}")
+        if not isinstance(row, dict):
+            raise HTTPException(status_code=400, detail=f"Expected an object on line {line_number}")
+        yield line_number, row
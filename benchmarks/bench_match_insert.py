@@ -0,0 +1,121 @@
+"""
+Rows/sec for writing proposed matches: ORM unit of work, bulk insert, bulk upsert.
+
+New proposals are written with the chunked bulk insert; the upsert is only
+used to re-score proposals that are already stored.
+
+Usage:
+    python -m benchmarks.bench_match_insert --rows 100000
+    python -m benchmarks.bench_match_insert --database-url postgresql+psycopg2://...
+
+The target database gets its tables created and its `matches` rows for the
+benchmark tenant deleted between runs; point it at a scratch database.
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+
+def _seed(db, count):
+    """Create a tenant with one invoice and ``count`` transactions for the matches to reference."""
+    from sqlalchemy import insert
+
+    from app import models
+
+    tenant_id, invoice_id = str(uuid4()), str(uuid4())
+    tx_ids = [str(uuid4()) for _ in range(count)]
+    db.execute(insert(models.Tenant), [{"id": tenant_id, "name": "match insert benchmark"}])
+    db.execute(insert(models.Invoice), [{"id": invoice_id, "tenant_id": tenant_id, "amount": 100}])
+    db.execute(
+        insert(models.BankTransaction),
+        [{"id": tx_id, "tenant_id": tenant_id, "amount": 100} for tx_id in tx_ids],
+    )
+    db.commit()
+    return tenant_id, invoice_id, tx_ids
+
+
+def _rows(tenant_id, invoice_id, tx_ids):
+    created_at = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid4()),
+            "tenant_id": tenant_id,
+            "invoice_id": invoice_id,
+            "bank_transaction_id": tx_id,
+            "score": 70,
+            "status": "proposed",
+            "created_at": created_at,
+        }
+        for tx_id in tx_ids
+    ]
+
+
+def _orm_insert(db, rows):
+    from app import models
+
+    for row in rows:
+        db.add(models.Match(**row))
+    db.commit()
+
+
+def _bulk_insert(db, rows):
+    from app.services import _bulk_insert_matches
+
+    _bulk_insert_matches(db, rows)
+    db.commit()
+
+
+def _bulk_upsert(db, rows):
+    from app.services import _upsert_matches
+
+    _upsert_matches(db, rows)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=os.environ["DATABASE_URL"])
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        tenant_id, invoice_id, tx_ids = _seed(db, args.rows)
+
+    def timed(write, rows):
+        with Session() as db:
+            started = time.perf_counter()
+            write(db, rows)
+            elapsed = time.perf_counter() - started
+            db.query(models.Match).filter_by(tenant_id=tenant_id).delete()
+            db.commit()
+        return elapsed
+
+    print(f"{engine.dialect.name}: {args.rows} rows")
+    for label, write in (
+        ("orm unit of work", _orm_insert),
+        ("bulk insert", _bulk_insert),
+        ("bulk upsert", _bulk_upsert),
+    ):
+        # Untimed warm-up, so the first writer does not pay for compiling statements and growing the file.
+        timed(write, _rows(tenant_id, invoice_id, tx_ids[:1_000]))
+        elapsed = timed(write, _rows(tenant_id, invoice_id, tx_ids))
+        print(f"  {label:<18} {elapsed:8.2f}s  {args.rows / elapsed:>12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
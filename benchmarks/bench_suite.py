@@ -0,0 +1,305 @@
+"""
+Throughput and p50/p99 latency of the hot paths on synthetic tenants.
+
+Usage:
+    python -m benchmarks.bench_suite --scales 1k,10k
+    python -m benchmarks.bench_suite --check            # compare with benchmarks/baseline.json
+    python -m benchmarks.bench_suite --write-baseline   # refresh the baseline
+
+A scale is the number of rows in the benchmark tenant, split evenly between
+invoices and bank transactions (`10k` = 5k of each), generated by
+`benchmarks.dataset` at a constant density per day. The baseline covers 1k
+and 10k: a full reconcile holds every scored pair in memory, and at 100k rows
+it runs out of memory on a 6 GB machine. Cases:
+
+    score_match     reconciliation.score_match; one op = 1,000 calls
+    reconcile       services.reconcile(full=True, mode=--reconcile-mode); one op = a full rescan
+    import          services.import_transactions; one op = a 500-row batch
+    list_invoices   services.list_invoices pages of 50 with filters
+    explain_miss    ai.explain with an empty cache and a fake LLM
+    explain_hit     ai.explain served from the explanation cache
+
+The target database has its tables dropped and recreated; point
+`--database-url` at a scratch database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+BASELINE = Path(__file__).with_name("baseline.json")
+CASES = ("score_match", "reconcile", "import", "list_invoices", "explain_miss", "explain_hit")
+
+# Generated rows per day and side, so date-window candidates stay realistic at every scale.
+ROWS_PER_DAY = 50
+_IMPORT_BATCH = 500
+_MAX_OPS = 2_000
+
+
+@dataclass
+class Result:
+    rows: int = 0
+    latencies: list = field(default_factory=list)
+
+    def time(self, fn, *args, rows=1, **kwargs):
+        started = time.perf_counter()
+        value = fn(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        self.rows += rows
+        return value
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        total = sum(ordered)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        return {
+            "ops": len(ordered),
+            "rows_per_sec": round(self.rows / total, 1) if total else None,
+            "p50_ms": round(percentile(0.50), 4),
+            "p99_ms": round(percentile(0.99), 4),
+        }
+
+
+def parse_scale(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def _spec(scale: int, seed: int):
+    from benchmarks.dataset import DatasetSpec
+
+    half = max(scale // 2, 1)
+    return DatasetSpec(
+        invoices_per_tenant=half,
+        transactions_per_tenant=half,
+        days=max(half // ROWS_PER_DAY, 30),
+        seed=seed,
+    )
+
+
+def bench_score_match(data, rng):
+    from app.reconciliation import score_match
+
+    invoices = [SimpleNamespace(**row) for row in data.invoices]
+    transactions = [SimpleNamespace(**row) for row in data.transactions]
+    pairs = [(rng.choice(invoices), rng.choice(transactions)) for _ in range(1_000)]
+
+    def batch():
+        for invoice, tx in pairs:
+            score_match(invoice, tx)
+
+    result = Result()
+    for _ in range(min(max(len(invoices) // 1_000, 20), _MAX_OPS)):
+        result.time(batch, rows=len(pairs))
+    return result
+
+
+def bench_reconcile(db, tenant_id, data, repeat, mode):
+    from app import models, services
+
+    result = Result()
+    rows = len(data.invoices) + len(data.transactions)
+    for _ in range(repeat):
+        db.query(models.Match).filter_by(tenant_id=tenant_id).delete()
+        db.query(models.ReconcileWatermark).filter_by(tenant_id=tenant_id).delete()
+        db.commit()
+        result.time(services.reconcile, db, tenant_id, full=True, mode=mode, rows=rows)
+    db.query(models.Match).filter_by(tenant_id=tenant_id).delete()
+    db.commit()
+    return result
+
+
+def bench_import(db, data):
+    from app import services
+
+    tenant = services.create_tenant(db, "import benchmark")
+    rows = [
+        {
+            "external_id": f"import-{tx['external_id']}",
+            "amount": tx["amount"],
+            "currency": tx["currency"],
+            "description": tx["description"],
+            "posted_at": tx["posted_at"],
+        }
+        for tx in data.transactions
+    ]
+
+    result = Result()
+    for start in range(0, len(rows), _IMPORT_BATCH)[:_MAX_OPS]:
+        batch = rows[start:start + _IMPORT_BATCH]
+        result.time(services.import_transactions, db, tenant.id, batch, str(uuid4()), rows=len(batch))
+    return result
+
+
+def bench_list_invoices(db, tenant_id, data, rng):
+    from app import services
+
+    amounts = sorted(row["amount"] for row in data.invoices)
+    filters = [
+        {},
+        {"status": "open"},
+        {"min_amount": amounts[len(amounts) // 4], "max_amount": amounts[3 * len(amounts) // 4]},
+        {"start_date": data.invoices[0]["invoice_date"]},
+    ]
+
+    result = Result()
+    cursor, current = None, {}
+    for _ in range(min(max(len(amounts) // 50, 20), _MAX_OPS)):
+        if cursor is None:
+            current = rng.choice(filters)
+        page = result.time(services.list_invoices, db, tenant_id, current, cursor=cursor, limit=50, rows=0)
+        result.rows += len(page["items"])
+        cursor = page["next_cursor"]
+    return result
+
+
+def bench_explain(data, rng, hit: bool):
+    from langchain_core.language_models import FakeListChatModel
+
+    from app import ai
+    from app.config import settings
+    from app.reconciliation import score_match
+
+    ai.build_llm = lambda: FakeListChatModel(responses=["Amounts and dates line up."])
+    ai.get_chain.cache_clear()
+    ai._explanation_cache.clear()
+
+    invoices = [SimpleNamespace(**row) for row in data.invoices]
+    transactions = [SimpleNamespace(**row) for row in data.transactions]
+    pairs = [
+        (invoice, tx, score_match(invoice, tx))
+        for invoice, tx in (
+            (rng.choice(invoices), rng.choice(transactions))
+            # Stay within the cache so the hit case measures hits, not evictions.
+            for _ in range(min(len(invoices), settings.EXPLANATION_CACHE_SIZE))
+        )
+    ]
+
+    if hit:
+        for pair in pairs:
+            ai.explain(*pair)
+
+    result = Result()
+    for pair in pairs:
+        if not hit:
+            ai._explanation_cache.clear()
+        result.time(ai.explain, *pair)
+    return result
+
+
+def run(scales, cases, repeat, seed, reconcile_mode):
+    from app import models  # noqa: F401  (registers the tables on Base)
+    from app.database import Base, SessionLocal, engine
+    from benchmarks.dataset import generate_tenant, load
+
+    results = {}
+    for scale in scales:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+        spec = _spec(scale, seed)
+        data = generate_tenant(spec, 0)
+        rng = random.Random(seed)
+        with SessionLocal() as db:
+            tenant_id = load(db, spec)[0]
+
+            for case in cases:
+                if case == "score_match":
+                    result = bench_score_match(data, rng)
+                elif case == "reconcile":
+                    result = bench_reconcile(db, tenant_id, data, repeat, reconcile_mode)
+                elif case == "import":
+                    result = bench_import(db, data)
+                elif case == "list_invoices":
+                    result = bench_list_invoices(db, tenant_id, data, rng)
+                else:
+                    result = bench_explain(data, rng, hit=case == "explain_hit")
+
+                key = f"{case}@{scale}"
+                results[key] = result.summary()
+                print(_row(key, results[key]), flush=True)
+    return results
+
+
+def _row(key, summary, baseline=None):
+    line = (
+        f"  {key:<24} {summary['ops']:>6} ops "
+        f"{summary['rows_per_sec'] or 0:>14,.0f} rows/s "
+        f"p50 {summary['p50_ms']:>10.3f}ms  p99 {summary['p99_ms']:>10.3f}ms"
+    )
+    if baseline:
+        line += f"  (p50 {_change(summary['p50_ms'], baseline['p50_ms'])}, " \
+                f"rows/s {_change(summary['rows_per_sec'], baseline['rows_per_sec'])})"
+    return line
+
+
+def _change(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous:+.0%}"
+
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline; return the keys that regressed."""
+    regressions = []
+    print(f"vs {BASELINE.name}:")
+    for key, summary in results.items():
+        previous = baseline.get(key)
+        print(_row(key, summary, previous))
+        if previous and summary["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=os.environ["DATABASE_URL"])
+    parser.add_argument("--scales", default="1k,10k")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="reconcile runs per scale")
+    parser.add_argument(
+        "--reconcile-mode",
+        default="top_k",
+        choices=("all", "top_k", "assignment"),
+        help="`all` inserts every candidate pair and is dominated by insert volume",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--write-baseline", action="store_true")
+    args = parser.parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+
+    cases = [case for case in args.cases.split(",") if case]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    scales = [parse_scale(scale) for scale in args.scales.split(",")]
+    print(f"{args.database_url}: scales {scales}")
+    results = run(scales, cases, args.repeat, args.seed, args.reconcile_mode)
+
+    if args.write_baseline:
+        BASELINE.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    if args.check:
+        regressions = compare(results, json.loads(BASELINE.read_text()), args.tolerance)
+        if regressions:
+            sys.exit(f"p50 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Deterministic synthetic tenants for benchmarks.
+
+Each tenant gets invoices with log-normally distributed amounts spread over a
+date range, and bank transactions of which a configurable share pays one of
+those invoices (same or slightly different amount, posted a few days later,
+description quoting the invoice) while the rest are unrelated noise. The same
+``DatasetSpec`` always produces the same rows, ids included.
+"""
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+
+VENDORS = (
+    "Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Wonka",
+    "Soylent", "Hooli", "Vandelay", "Tyrell", "Cyberdyne", "Oscorp", "Gringotts",
+)
+ITEMS = (
+    "Office Supplies", "Cloud Hosting", "Consulting Services", "Software License",
+    "Freight", "Catering", "Maintenance", "Marketing Retainer", "Legal Fees",
+    "Equipment Rental", "Travel", "Training", "Insurance Premium", "Utilities",
+)
+PAYMENT_PREFIXES = ("ACH PAYMENT", "WIRE", "TRANSFER", "CHECK DEPOSIT", "SEPA CREDIT")
+NOISE_DESCRIPTIONS = (
+    "Card purchase coffee", "Bank fee", "Interest", "ATM withdrawal",
+    "Payroll", "Refund", "Tax payment", "Subscription", "Fuel",
+)
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    tenants: int = 1
+    invoices_per_tenant: int = 1_000
+    transactions_per_tenant: int = 1_000
+    # Share of transactions that pay an invoice; of those, the share paying
+    # the exact amount (the rest differ by up to `amount_jitter`).
+    paid_ratio: float = 0.6
+    exact_amount_ratio: float = 0.8
+    amount_jitter: float = 8.0
+    # Invoice amounts are log-normal around `amount_median`.
+    amount_median: float = 500.0
+    amount_sigma: float = 1.0
+    start: datetime = datetime(2025, 1, 1)
+    days: int = 365
+    max_payment_lag_days: int = 6
+    vendors: tuple = VENDORS
+    items: tuple = ITEMS
+    payment_prefixes: tuple = PAYMENT_PREFIXES
+    noise_descriptions: tuple = NOISE_DESCRIPTIONS
+    currency: str = "USD"
+    seed: int = 0
+
+
+@dataclass
+class TenantData:
+    tenant: dict
+    invoices: list
+    transactions: list
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
+
+
+def _amount(rng: random.Random, spec: DatasetSpec) -> float:
+    return round(rng.lognormvariate(math.log(spec.amount_median), spec.amount_sigma), 2)
+
+
+def generate_tenant(spec: DatasetSpec, index: int) -> TenantData:
+    rng = random.Random(f"{spec.seed}:{index}")
+    tenant_id = _uuid(rng)
+    created_at = spec.start + timedelta(days=spec.days)
+    tenant = {"id": tenant_id, "name": f"Tenant {index}", "created_at": created_at}
+
+    invoices = []
+    for i in range(spec.invoices_per_tenant):
+        invoices.append({
+            "id": _uuid(rng),
+            "tenant_id": tenant_id,
+            "amount": _amount(rng, spec),
+            "currency": spec.currency,
+            "invoice_date": spec.start + timedelta(
+                days=rng.randrange(spec.days), seconds=rng.randrange(86_400)
+            ),
+            "description": f"{rng.choice(spec.items)} {rng.choice(spec.vendors)}",
+            "status": "open",
+            # Distinct, increasing creation times keep keyset pages reproducible.
+            "created_at": created_at + timedelta(microseconds=i),
+        })
+
+    transactions = []
+    for i in range(spec.transactions_per_tenant):
+        if invoices and rng.random() < spec.paid_ratio:
+            invoice = rng.choice(invoices)
+            amount = invoice["amount"]
+            if rng.random() >= spec.exact_amount_ratio:
+                amount = round(amount + rng.uniform(-spec.amount_jitter, spec.amount_jitter), 2)
+            posted_at = invoice["invoice_date"] + timedelta(
+                days=rng.randint(0, spec.max_payment_lag_days),
+                seconds=rng.randrange(86_400),
+            )
+            description = (
+                f"{rng.choice(spec.payment_prefixes)} {invoice['description']} "
+                f"REF{rng.randrange(10**6):06d}"
+            )
+        else:
+            amount = _amount(rng, spec)
+            posted_at = spec.start + timedelta(
+                days=rng.randrange(spec.days), seconds=rng.randrange(86_400)
+            )
+            description = rng.choice(spec.noise_descriptions)
+
+        transactions.append({
+            "id": _uuid(rng),
+            "tenant_id": tenant_id,
+            "external_id": f"tx-{index}-{i}",
+            "amount": amount,
+            "currency": spec.currency,
+            "description": description,
+            "posted_at": posted_at,
+            "created_at": created_at + timedelta(microseconds=i),
+        })
+
+    return TenantData(tenant=tenant, invoices=invoices, transactions=transactions)
+
+
+def generate(spec: DatasetSpec):
+    """Yield a ``TenantData`` per tenant; tenants are generated one at a time."""
+    for index in range(spec.tenants):
+        yield generate_tenant(spec, index)
+
+
+def load(db, spec: DatasetSpec, chunk_size: int = 5_000):
+    """Bulk-insert the dataset through ``db`` and return the tenant ids."""
+    from sqlalchemy import insert
+
+    from app import models
+
+    tenant_ids = []
+    for data in generate(spec):
+        db.execute(insert(models.Tenant), [data.tenant])
+        for model, rows in (
+            (models.Invoice, data.invoices),
+            (models.BankTransaction, data.transactions),
+        ):
+            for start in range(0, len(rows), chunk_size):
+                db.execute(insert(model), rows[start:start + chunk_size])
+        db.commit()
+        tenant_ids.append(data.tenant["id"])
+    return tenant_ids
@@ -0,0 +1,115 @@
+"""
+Cold-start import cost of `app.main`, from `python -X importtime`.
+
+Usage:
+    python -m benchmarks.importtime             # print the report
+    python -m benchmarks.importtime --write     # refresh benchmarks/importtime.txt
+    python -m benchmarks.importtime --check     # compare against the checked-in report
+
+Each run imports `app.main` in a fresh interpreter. The report gives the
+median total over `--runs` runs and the self time attributed to each
+top-level package. `--check` fails when the total exceeds the checked-in
+total by more than `--tolerance`, or when a package listed in LAZY is
+imported at startup.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+REPORT = Path(__file__).with_name("importtime.txt")
+ROOT = Path(__file__).resolve().parents[1]
+
+# Packages that must only be imported on first use.
+LAZY = ("langchain", "langchain_core", "langchain_google_genai")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+_TOTAL = re.compile(r"^total_ms: ([\d.]+)$", re.MULTILINE)
+
+
+def _run_once():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_us = 0
+    by_package = defaultdict(int)
+    for match in _LINE.finditer(result.stderr):
+        self_us, cumulative_us, _, module = match.groups()
+        by_package[module.split(".")[0]] += int(self_us)
+        if module == "app.main":
+            total_us = int(cumulative_us)
+    return total_us, by_package
+
+
+def measure(runs: int):
+    totals = []
+    packages = defaultdict(list)
+    for _ in range(runs):
+        total_us, by_package = _run_once()
+        totals.append(total_us)
+        for package, self_us in by_package.items():
+            packages[package].append(self_us)
+
+    total_ms = statistics.median(totals) / 1000
+    by_package = {
+        package: statistics.median(values) / 1000
+        for package, values in packages.items()
+    }
+    return total_ms, by_package
+
+
+def render(total_ms, by_package, top: int):
+    lines = [
+        "# python -m benchmarks.importtime --write",
+        f"total_ms: {total_ms:.1f}",
+        "",
+        f"{'package':<32} {'self ms':>9}",
+    ]
+    ranked = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    lines += [f"{package:<32} {ms:>9.1f}" for package, ms in ranked[:top]]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--write", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    total_ms, by_package = measure(args.runs)
+    report = render(total_ms, by_package, args.top)
+    print(report, end="")
+
+    if args.write:
+        REPORT.write_text(report)
+
+    if args.check:
+        eager = [package for package in LAZY if package in by_package]
+        if eager:
+            sys.exit(f"imported at startup but should be lazy: {', '.join(eager)}")
+
+        baseline_ms = float(_TOTAL.search(REPORT.read_text()).group(1))
+        budget_ms = baseline_ms * (1 + args.tolerance)
+        if total_ms > budget_ms:
+            sys.exit(f"import time {total_ms:.1f}ms exceeds {budget_ms:.1f}ms "
+                     f"(baseline {baseline_ms:.1f}ms + {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ os.environ["DATABASE_URL"] = "sqlite:///./test.db"
 os.environ["GOOGLE_API_KEY"] = "test-key"
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+from app import ai
 from app.database import Base, engine
 from app.main import app
 
@@ -23,6 +24,18 @@ def reset_db():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def fake_llm(monkeypatch):
+    """Stand-in chat model so no test reaches the real LLM API."""
+    from langchain_core.language_models import FakeListChatModel
+
+    llm = FakeListChatModel(responses=["first explanation", "second explanation"])
+    monkeypatch.setattr(ai, "build_llm", lambda: llm)
+    ai.get_chain.cache_clear()
+    ai._explanation_cache.clear()
+    return llm
+
+
 @pytest.fixture
 def client():
     with TestClient(app) as test_client:
@@ -30,4 +43,4 @@ def client():
 
 
 def assert_is_uuid(value: str):
-    UUID(value)
+    UUID(value)
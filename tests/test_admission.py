@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from app import admission
+from app.admission import InMemoryBackend, Rejected, TenantLimits
+from app.config import settings
+
+LIMITS = TenantLimits(rate=1_000, burst=1_000, concurrency=10)
+
+
+@pytest.fixture(autouse=True)
+def fresh_backend():
+    previous = admission.get_backend()
+    admission.set_backend(InMemoryBackend())
+    yield
+    admission.set_backend(previous)
+
+
+def _seed(client, name):
+    tenant_id = client.post("/tenants", json={"name": name}).json()["id"]
+    client.post(f"/tenants/{tenant_id}/invoices", json={"amount": 100})
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "admission"},
+        json=[{"external_id": "tx-1", "amount": 100, "posted_at": "2026-02-21T00:00:00"}],
+    )
+    return tenant_id
+
+
+def test_rate_limited_tenant_gets_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_BURST", 3)
+    monkeypatch.setattr(settings, "ADMISSION_RATE", 0.1)
+    noisy, quiet = _seed(client, "noisy"), _seed(client, "quiet")
+
+    # The seeding import took one token.
+    assert client.post(f"/tenants/{noisy}/reconcile").status_code == 200
+    assert client.post(f"/tenants/{noisy}/reconcile").status_code == 200
+    resp = client.post(f"/tenants/{noisy}/reconcile")
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers["retry-after"]) <= 10
+    assert "rate_limited" in resp.json()["detail"]
+
+    assert client.post(f"/tenants/{quiet}/reconcile").status_code == 200
+    # Cheap routes are not admitted.
+    assert client.get(f"/tenants/{noisy}/invoices").status_code == 200
+
+    monkeypatch.setattr(settings, "ADMISSION_TENANT_LIMITS", {noisy: {"rate": 1_000}})
+    assert client.post(f"/tenants/{noisy}/reconcile").status_code == 200
+
+
+def test_fair_queue_interleaves_tenants(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_SLOTS", 1)
+    backend = InMemoryBackend()
+    started = []
+
+    async def request(tenant_id, limits=LIMITS):
+        await backend.acquire(tenant_id, limits)
+        started.append(tenant_id)
+        await asyncio.sleep(0.01)
+        backend.release(tenant_id)
+
+    async def main():
+        heavy = [asyncio.create_task(request("a")) for _ in range(4)]
+        await asyncio.sleep(0)
+        light = asyncio.create_task(request("b", TenantLimits(1_000, 1_000, 10, weight=2)))
+        await asyncio.gather(*heavy, light)
+
+    asyncio.run(main())
+    # "b" queued behind three of "a"'s requests but starts after only one of them.
+    assert started.index("b") <= 2
+    assert backend.stats() == {"running": 0, "queued": 0}
+    assert not backend._last_tag and not backend._queued
+
+
+def test_concurrency_quota_and_queue_limits(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_SLOTS", 4)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE_PER_TENANT", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.05)
+    backend = InMemoryBackend()
+    single = TenantLimits(rate=1_000, burst=1_000, concurrency=1)
+
+    async def main():
+        await backend.acquire("a", single)
+
+        # Over its quota, "a" queues while another tenant starts right away.
+        waiting = asyncio.create_task(backend.acquire("a", single))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(backend.acquire("b", LIMITS), timeout=1)
+
+        with pytest.raises(Rejected) as full:
+            await backend.acquire("a", single)
+        assert full.value.reason == "queue_full"
+
+        with pytest.raises(Rejected) as timed_out:
+            await waiting
+        assert timed_out.value.reason == "queue_timeout"
+
+        backend.release("a")
+        backend.release("b")
+        await asyncio.wait_for(backend.acquire("a", single), timeout=1)
+        backend.release("a")
+
+    asyncio.run(main())
+    assert backend.stats() == {"running": 0, "queued": 0}
+
+
+def test_idle_tenant_state_is_dropped(monkeypatch):
+    monkeypatch.setattr(InMemoryBackend, "_SWEEP_MIN", 8)
+    backend = InMemoryBackend()
+    # Refills within nanoseconds, so every released tenant's bucket is full again.
+    limits = TenantLimits(rate=1e12, burst=1, concurrency=1)
+
+    async def main():
+        for n in range(100):
+            await backend.acquire(f"random-{n}", limits)
+            backend.release(f"random-{n}")
+
+    asyncio.run(main())
+    assert len(backend._buckets) <= 8
+    assert not backend._running and not backend._queued and not backend._last_tag
+
+
+def test_tenant_limit_overrides_are_validated_at_startup():
+    from pydantic import ValidationError
+
+    from app.config import Settings
+
+    loaded = Settings(ADMISSION_TENANT_LIMITS={"t1": {"burst": 40, "concurrency": 4.0, "rate": 2.5}})
+    assert loaded.ADMISSION_TENANT_LIMITS["t1"] == {"burst": 40, "concurrency": 4, "rate": 2.5}
+    assert isinstance(loaded.ADMISSION_TENANT_LIMITS["t1"]["concurrency"], int)
+
+    for overrides in (
+        {"burts": 40},
+        {"concurrency": 1.5},
+        {"concurrency": 0},
+        {"rate": -1},
+        {"burst": -1},
+        {"weight": 0},
+        {"rate": "fast"},
+    ):
+        with pytest.raises(ValidationError):
+            Settings(ADMISSION_TENANT_LIMITS={"t1": overrides})
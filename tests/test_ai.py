@@ -1,4 +1,11 @@
-def test_ai_explain_endpoint_returns_text(client):
+import asyncio
+import json
+
+from app import ai, models
+from app.database import SessionLocal
+
+
+def _seed_pair(client):
     tenant_resp = client.post("/tenants", json={"name": "Tags"})
     tenant_id = tenant_resp.json()["id"]
 
@@ -27,6 +34,11 @@ def test_ai_explain_endpoint_returns_text(client):
         ],
     )
     tx_id = tx_resp.json()[0]["id"]
+    return tenant_id, invoice_id, tx_id
+
+
+def test_ai_explain_endpoint_returns_text(client):
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
 
     explain_resp = client.get(
         f"/tenants/{tenant_id}/reconcile/explain",
@@ -37,3 +49,139 @@ def test_ai_explain_endpoint_returns_text(client):
     body = explain_resp.json()
     assert isinstance(body.get("explanation"), str)
     assert body["explanation"].strip()
+
+
+def test_explanations_are_memoized_and_chain_built_once(client, fake_llm, monkeypatch):
+    builds = []
+    monkeypatch.setattr(ai, "build_llm", lambda: builds.append(1) or fake_llm)
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
+    url = f"/tenants/{tenant_id}/reconcile/explain"
+    params = {"invoice_id": invoice_id, "transaction_id": tx_id}
+
+    first = client.get(url, params=params).json()["explanation"]
+    second = client.get(url, params=params).json()["explanation"]
+
+    # The fake model answers differently per call, so equal text means one call.
+    assert first == second == "first explanation"
+    assert len(builds) == 1
+
+    ai._explanation_cache.clear()
+    assert client.get(url, params=params).json()["explanation"] == "second explanation"
+    assert len(builds) == 1
+
+
+def test_persistent_explanation_cache(client, monkeypatch):
+    monkeypatch.setattr(ai.settings, "EXPLANATION_CACHE_PERSIST", True)
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
+    url = f"/tenants/{tenant_id}/reconcile/explain"
+    params = {"invoice_id": invoice_id, "transaction_id": tx_id}
+
+    assert client.get(url, params=params).json()["explanation"] == "first explanation"
+
+    # A fresh worker has an empty in-process cache but shares the table.
+    ai._explanation_cache.clear()
+    assert client.get(url, params=params).json()["explanation"] == "first explanation"
+
+    with SessionLocal() as db:
+        assert db.query(models.Explanation).count() == 1
+
+
+def test_failed_llm_call_falls_back_without_caching(client, monkeypatch):
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
+    url = f"/tenants/{tenant_id}/reconcile/explain"
+    params = {"invoice_id": invoice_id, "transaction_id": tx_id}
+
+    class Broken:
+        def invoke(self, inputs):
+            raise RuntimeError("quota exceeded")
+
+    real_get_chain = ai.get_chain
+    monkeypatch.setattr(ai, "get_chain", lambda: Broken())
+    assert "Deterministic score" in client.get(url, params=params).json()["explanation"]
+
+    monkeypatch.setattr(ai, "get_chain", real_get_chain)
+    assert client.get(url, params=params).json()["explanation"] == "first explanation"
+
+
+def _batch_lines(resp):
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+
+def test_explain_batch_streams_results(client):
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
+    url = f"/tenants/{tenant_id}/reconcile/explain/batch"
+    pair = {"invoice_id": invoice_id, "transaction_id": tx_id}
+
+    results = _batch_lines(client.post(url, json=[pair, pair, {**pair, "invoice_id": "missing"}]))
+
+    assert len(results) == 3
+    assert results[0]["error"] == "Invoice or transaction not found"
+    # Duplicate pairs share one LLM call.
+    assert [r["explanation"] for r in results[1:]] == ["first explanation"] * 2
+    assert {r["source"] for r in results[1:]} == {"llm"}
+    assert results[1]["score"] == 80
+
+    again = _batch_lines(client.post(url, json=[pair]))
+    assert again[0]["source"] == "cache"
+    assert again[0]["explanation"] == "first explanation"
+
+    assert client.post("/tenants/missing/reconcile/explain/batch", json=[pair]).status_code == 404
+
+
+def test_explain_batch_bounds_concurrency_and_times_out(client, monkeypatch):
+    monkeypatch.setattr(ai.settings, "EXPLAIN_BATCH_CONCURRENCY", 2)
+    monkeypatch.setattr(ai.settings, "EXPLAIN_TIMEOUT_SECONDS", 0.2)
+    tenant_id, _, tx_id = _seed_pair(client)
+    invoice_ids = [
+        client.post(
+            f"/tenants/{tenant_id}/invoices",
+            json={"amount": amount, "description": f"Invoice {amount}"},
+        ).json()["id"]
+        for amount in range(1, 7)
+    ]
+
+    running = []
+    peak = []
+
+    class SlowChain:
+        async def ainvoke(self, inputs):
+            running.append(1)
+            peak.append(len(running))
+            try:
+                # One prompt hangs past the timeout; the rest answer quickly.
+                await asyncio.sleep(1 if inputs["invoice_amount"] == 3 else 0.01)
+                return f"explained {inputs['invoice_amount']}"
+            finally:
+                running.pop()
+
+    monkeypatch.setattr(ai, "get_chain", lambda: SlowChain())
+    pairs = [{"invoice_id": inv, "transaction_id": tx_id} for inv in invoice_ids]
+    results = _batch_lines(
+        client.post(f"/tenants/{tenant_id}/reconcile/explain/batch", json=pairs)
+    )
+
+    assert max(peak) == 2
+    by_invoice = {r["invoice_id"]: r for r in results}
+    assert by_invoice[invoice_ids[2]]["source"] == "fallback"
+    assert "Deterministic score" in by_invoice[invoice_ids[2]]["explanation"]
+    assert by_invoice[invoice_ids[0]]["explanation"] == "explained 1.0"
+    # The slow call finishes last even though it was submitted third.
+    assert results[-1]["invoice_id"] == invoice_ids[2]
+
+
+def test_unbuildable_chain_falls_back_in_batches(client, monkeypatch):
+    tenant_id, invoice_id, tx_id = _seed_pair(client)
+
+    def broken_llm():
+        raise RuntimeError("missing credentials")
+
+    monkeypatch.setattr(ai, "build_llm", broken_llm)
+    pair = {"invoice_id": invoice_id, "transaction_id": tx_id}
+    results = _batch_lines(
+        client.post(f"/tenants/{tenant_id}/reconcile/explain/batch", json=[pair, pair])
+    )
+
+    assert [r["source"] for r in results] == ["fallback", "fallback"]
+    assert all("Deterministic score" in r["explanation"] for r in results)
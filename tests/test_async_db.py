@@ -0,0 +1,94 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import models
+from app.database import SessionLocal, async_database_url, get_async_db
+from app.main import async_router
+
+
+@pytest.fixture
+def async_client():
+    async_engine = create_async_engine(
+        async_database_url("sqlite:///./test.db"),
+        poolclass=NullPool,
+    )
+    sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(async_router)
+    app.dependency_overrides[get_async_db] = override
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_async_database_url_swaps_driver():
+    assert async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+    assert (
+        async_database_url("postgresql+psycopg2://u:p@db:5432/app")
+        == "postgresql+asyncpg://u:p@db:5432/app"
+    )
+
+
+def test_async_routes_crud_and_pagination(async_client):
+    tenant_id = async_client.post("/tenants", json={"name": "A"}).json()["id"]
+    assert async_client.get("/tenants/missing/invoices").status_code == 404
+
+    for day in range(1, 6):
+        resp = async_client.post(
+            f"/tenants/{tenant_id}/invoices",
+            json={"amount": 10 * day, "invoice_date": f"2026-02-0{day}T00:00:00"},
+        )
+        assert resp.status_code == 200
+
+    url = f"/tenants/{tenant_id}/invoices"
+    first = async_client.get(url, params={"limit": 2, "count": "exact"}).json()
+    assert first["total"] == 5
+
+    seen = [inv["id"] for inv in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = async_client.get(url, params={"limit": 2, "cursor": cursor}).json()
+        seen += [inv["id"] for inv in page["items"]]
+        cursor = page["next_cursor"]
+    assert len(set(seen)) == 5
+
+    filtered = async_client.get(url, params={"min_amount": 25, "max_amount": 45}).json()
+    assert sorted(inv["amount"] for inv in filtered["items"]) == [30, 40]
+    assert async_client.get(url, params={"min_amount": 5, "max_amount": 1}).status_code == 400
+
+    assert async_client.delete(f"{url}/{seen[0]}").json() == {"deleted": True}
+    assert async_client.delete(f"{url}/{seen[0]}").status_code == 404
+
+
+def test_async_confirm_match(async_client):
+    tenant_id = async_client.post("/tenants", json={"name": "A"}).json()["id"]
+    invoice_id = async_client.post(
+        f"/tenants/{tenant_id}/invoices", json={"amount": 10}
+    ).json()["id"]
+
+    with SessionLocal() as db:
+        tx = models.BankTransaction(tenant_id=tenant_id, amount=10)
+        db.add(tx)
+        db.flush()
+        match = models.Match(
+            tenant_id=tenant_id, invoice_id=invoice_id, bank_transaction_id=tx.id, score=50
+        )
+        db.add(match)
+        db.commit()
+        match_id = match.id
+
+    url = f"/tenants/{tenant_id}/matches/{match_id}/confirm"
+    resp = async_client.post(url)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "confirmed"
+    assert async_client.post(url).status_code == 409
+
+    with SessionLocal() as db:
+        assert db.get(models.Invoice, invoice_id).status == "matched"
@@ -1,3 +1,16 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import models, services
+from app.config import settings
+from app.database import SessionLocal, engine
+
+
 def test_import_transactions_and_idempotency_replay(client):
     tenant_resp = client.post("/tenants", json={"name": "Tags"})
     tenant_id = tenant_resp.json()["id"]
@@ -68,4 +81,232 @@ def test_import_transactions_idempotency_conflict(client):
         headers={"Idempotency-Key": "idem-2"},
         json=second_payload,
     )
-    assert conflict.status_code == 409
+    assert conflict.status_code == 409
+
+
+def test_stream_import_ndjson_csv_and_replay(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_STREAM_BATCH_SIZE", 2)
+    tenant_resp = client.post("/tenants", json={"name": "Tags"})
+    tenant_id = tenant_resp.json()["id"]
+    url = f"/tenants/{tenant_id}/bank-transactions/import/stream"
+
+    ndjson = "\n".join(
+        json.dumps({"external_id": f"tx-5{i}", "amount": 10 + i, "posted_at": "2026-02-21T00:00:00"})
+        for i in range(5)
+    )
+    first = client.post(
+        url,
+        headers={"Idempotency-Key": "stream-1", "Content-Type": "application/x-ndjson"},
+        content=ndjson.encode(),
+    )
+    assert first.status_code == 200
+    assert first.json() == {"imported": 5}
+
+    csv_body = "external_id,amount,currency,description,posted_at\r\n" + "".join(
+        f"tx-5{i},{10 + i},USD,,2026-02-21T00:00:00\r\n" for i in range(5)
+    )
+    replay = client.post(
+        url,
+        headers={"Idempotency-Key": "stream-1", "Content-Type": "text/csv"},
+        content=csv_body.encode(),
+    )
+    assert replay.status_code == 200
+    assert replay.json() == {"imported": 5}
+
+    conflict = client.post(
+        url,
+        headers={"Idempotency-Key": "stream-1", "Content-Type": "application/x-ndjson"},
+        content=b'{"external_id": "tx-99", "amount": 1}',
+    )
+    assert conflict.status_code == 409
+
+    invalid = client.post(
+        url,
+        headers={"Idempotency-Key": "stream-2", "Content-Type": "application/x-ndjson"},
+        content=b'{"external_id": "tx-60", "amount": 1}\n{"amount": -5}\n',
+    )
+    assert invalid.status_code == 400
+    assert invalid.json()["detail"].startswith("Invalid transaction on line 2")
+
+    # Batches before the failing row stay committed, and the retry resumes
+    # after them, so rows without an external_id are imported once.
+    retry_rows = [
+        {"amount": 1, "posted_at": "2026-02-21T00:00:00"},
+        {"amount": 2, "posted_at": "2026-02-21T00:00:00"},
+        {"external_id": "tx-70", "amount": 3, "posted_at": "2026-02-21T00:00:00"},
+    ]
+    failing = "\n".join(json.dumps(row) for row in retry_rows) + '\n{"amount": -5}\n'
+    valid = "\n".join(json.dumps(row) for row in [*retry_rows, {"amount": 4}])
+    for body, status in ((failing, 400), (valid, 200)):
+        resp = client.post(
+            url,
+            headers={"Idempotency-Key": "stream-3", "Content-Type": "application/x-ndjson"},
+            content=body.encode(),
+        )
+        assert resp.status_code == status
+    assert resp.json() == {"imported": 4}
+    with SessionLocal() as db:
+        amounts = sorted(
+            tx.amount for tx in db.query(models.BankTransaction).filter_by(tenant_id=tenant_id)
+        )
+    assert amounts == [1, 2, 3, 4, 10, 11, 12, 13, 14]
+
+
+def test_stream_import_commits_batches_and_resumes_under_a_pending_key(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_STREAM_BATCH_SIZE", 2)
+    tenant_id = client.post("/tenants", json={"name": "Tags"}).json()["id"]
+    url = f"/tenants/{tenant_id}/bank-transactions/import/stream"
+    headers = {"Idempotency-Key": "stream-resume", "Content-Type": "application/x-ndjson"}
+
+    def body(amounts, tail=""):
+        return ("\n".join(json.dumps({"amount": amount}) for amount in amounts) + tail).encode()
+
+    def stored():
+        with SessionLocal() as db:
+            record = db.query(models.IdempotencyKey).filter_by(key="stream-resume").one()
+            amounts = sorted(
+                tx.amount for tx in db.query(models.BankTransaction).filter_by(tenant_id=tenant_id)
+            )
+            return record.status, record.rows_committed, amounts
+
+    resp = client.post(url, headers=headers, content=body([1, 2, 3, 4, 5], '\n{"amount": -5}'))
+    assert resp.status_code == 400
+    assert stored() == ("pending", 4, [1, 2, 3, 4])
+
+    # A pending key cannot be replayed by a batch import or resumed with other rows.
+    batch = client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "stream-resume"},
+        json=[{"amount": 1}],
+    )
+    assert batch.status_code == 409
+    assert client.post(url, headers=headers, content=body([1, 2, 9, 4, 5])).status_code == 409
+    assert client.post(url, headers=headers, content=body([1, 2, 3])).status_code == 409
+    assert stored() == ("pending", 4, [1, 2, 3, 4])
+
+    resp = client.post(url, headers=headers, content=body([1, 2, 3, 4, 5, 6]))
+    assert resp.json() == {"imported": 6}
+    assert stored() == ("complete", 6, [1, 2, 3, 4, 5, 6])
+
+    services._idempotency_cache.clear()
+    replay = client.post(url, headers=headers, content=body([1, 2, 3, 4, 5, 6]))
+    assert replay.json() == {"imported": 6}
+    assert stored() == ("complete", 6, [1, 2, 3, 4, 5, 6])
+
+
+def test_expired_pending_stream_key_still_resumes(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_STREAM_BATCH_SIZE", 2)
+    tenant_id = client.post("/tenants", json={"name": "Tags"}).json()["id"]
+    url = f"/tenants/{tenant_id}/bank-transactions/import/stream"
+    headers = {"Idempotency-Key": "stream-expired", "Content-Type": "application/x-ndjson"}
+    rows = "\n".join(json.dumps({"amount": amount}) for amount in (1, 2, 3))
+
+    assert client.post(url, headers=headers, content=(rows + '\n{"amount": -5}').encode()).status_code == 400
+    with SessionLocal() as db:
+        db.query(models.IdempotencyKey).update({"expires_at": datetime(2000, 1, 1)})
+        db.commit()
+        assert services.purge_expired_idempotency_keys(db) == 0
+
+    resp = client.post(url, headers=headers, content=rows.encode())
+    assert resp.json() == {"imported": 3}
+    with SessionLocal() as db:
+        amounts = sorted(tx.amount for tx in db.query(models.BankTransaction).filter_by(tenant_id=tenant_id))
+        record = db.query(models.IdempotencyKey).one()
+    assert amounts == [1, 2, 3]
+    assert (record.status, record.expires_at > datetime(2000, 1, 2)) == ("complete", True)
+
+
+def _import(client, tenant_id, key, external_id):
+    return client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": key},
+        json=[{"external_id": external_id, "amount": 100, "posted_at": "2026-02-21T00:00:00"}],
+    )
+
+
+def test_idempotent_replay_from_table_and_hot_cache(client):
+    tenant_id = client.post("/tenants", json={"name": "Tags"}).json()["id"]
+    first = _import(client, tenant_id, "idem-cache", "tx-103")
+
+    services._idempotency_cache.clear()
+    from_table = _import(client, tenant_id, "idem-cache", "tx-103")
+    assert from_table.json() == first.json()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        with SessionLocal() as db:
+            replay = services.import_transactions(
+                db,
+                tenant_id,
+                [{"external_id": "tx-103", "amount": 100.0, "currency": "USD",
+                  "description": None, "posted_at": datetime(2026, 2, 21)}],
+                "idem-cache",
+            )
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert [tx["id"] for tx in replay] == [tx["id"] for tx in first.json()]
+    assert statements == []
+
+
+def test_replay_returns_posted_at_with_the_same_offset(client):
+    tenant_id = client.post("/tenants", json={"name": "Offsets"}).json()["id"]
+    body = [{"external_id": "tx-104", "amount": 100, "posted_at": "2026-02-21T02:00:00+02:00"}]
+    path = f"/tenants/{tenant_id}/bank-transactions/import"
+    first = client.post(path, headers={"Idempotency-Key": "idem-tz"}, json=body)
+
+    services._idempotency_cache.clear()
+    replay = client.post(path, headers={"Idempotency-Key": "idem-tz"}, json=body)
+
+    assert replay.content == first.content
+    assert first.json()[0]["posted_at"] == "2026-02-21T00:00:00Z"
+
+
+def test_expired_idempotency_keys_are_reclaimed_and_purged(client, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_TTL_SECONDS", -1)
+    tenant_id = client.post("/tenants", json={"name": "Tags"}).json()["id"]
+
+    assert _import(client, tenant_id, "idem-ttl", "tx-104").status_code == 200
+    services._idempotency_cache.clear()
+
+    reclaimed = _import(client, tenant_id, "idem-ttl", "tx-105")
+    assert reclaimed.status_code == 200
+    assert reclaimed.json()[0]["external_id"] == "tx-105"
+
+    with SessionLocal() as db:
+        assert services.purge_expired_idempotency_keys(db) == 1
+        assert db.query(models.IdempotencyKey).count() == 0
+
+
+def test_concurrent_duplicate_imports_are_coalesced(client, monkeypatch):
+    tenant_id = client.post("/tenants", json={"name": "Tags"}).json()["id"]
+    payload = [{"external_id": "tx-106", "amount": 100.0, "currency": "USD",
+                "description": None, "posted_at": datetime(2026, 2, 21)}]
+
+    passes = []
+    original = services._import_transactions_once
+
+    def slow_import(*args):
+        passes.append(args)
+        time.sleep(0.2)
+        return original(*args)
+
+    monkeypatch.setattr(services, "_import_transactions_once", slow_import)
+
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def run(_):
+        barrier.wait()
+        with SessionLocal() as db:
+            return services.import_transactions(db, tenant_id, payload, "idem-race")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, range(workers)))
+
+    assert len(passes) == 1
+    assert all(result == results[0] for result in results)
+    with SessionLocal() as db:
+        assert db.query(models.BankTransaction).filter_by(tenant_id=tenant_id).count() == 1
@@ -42,7 +42,7 @@ def test_confirm_match_updates_match_and_invoice(client):
 
     invoices_resp = client.get(f"/tenants/{tenant_id}/invoices")
     assert invoices_resp.status_code == 200
-    invoices = invoices_resp.json()
+    invoices = invoices_resp.json()["items"]
 
     target = next(inv for inv in invoices if inv["id"] == invoice_id)
     assert target["status"] == "matched"
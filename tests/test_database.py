@@ -0,0 +1,48 @@
+from app import services
+
+
+def test_db_pool_metrics(client):
+    client.post("/tenants", json={"name": "A"})
+    stats = client.get("/metrics/db-pool").json()
+
+    assert stats["async"] is None
+    sync = stats["sync"]
+    assert sync["pool"] == "InstrumentedQueuePool"
+    assert sync["checkouts"] >= 1
+    assert sync["timeouts"] == 0
+    assert sync["checked_out"] <= sync["size"] + sync["max_overflow"]
+
+
+def test_engine_options_statement_timeout(monkeypatch):
+    from app.config import settings
+    from app.database import engine_options
+
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5_000)
+
+    sync = engine_options("postgresql+psycopg2://u:p@db/app")
+    assert sync["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert sync["pool_size"] == settings.DB_POOL_SIZE
+
+    async_ = engine_options("postgresql+asyncpg://u:p@db/app", is_async=True)
+    assert async_["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+    assert "connect_args" not in engine_options("sqlite:///./x.db")
+    assert engine_options("sqlite://") == {}
+
+
+def test_estimated_count_binds_in_the_driver_paramstyle():
+    from datetime import datetime
+
+    from sqlalchemy.dialects.postgresql import asyncpg, psycopg2
+    from sqlalchemy.orm import Session
+
+    from app import models
+
+    query = Session().query(models.Invoice).filter(
+        *services._invoice_conditions("t1", {"status": "open", "start_date": datetime(2026, 1, 1)})
+    )
+    for dialect, placeholder in ((asyncpg.dialect(), "$2"), (psycopg2.dialect(), "%(status_1)s")):
+        compiled = services._Explain(query.statement).compile(dialect=dialect)
+        assert str(compiled).startswith("EXPLAIN (FORMAT JSON) SELECT")
+        assert placeholder in str(compiled)
+        assert compiled.params["status_1"] == "open"
@@ -0,0 +1,24 @@
+from benchmarks.dataset import DatasetSpec, generate, generate_tenant, load
+
+
+def test_generate_is_deterministic():
+    spec = DatasetSpec(tenants=2, invoices_per_tenant=50, transactions_per_tenant=80, seed=7)
+
+    first, second = list(generate(spec)), list(generate(spec))
+    assert first == second
+    assert first[0].tenant["id"] != first[1].tenant["id"]
+    assert len(first[0].invoices) == 50
+    assert len(first[0].transactions) == 80
+
+    assert generate_tenant(DatasetSpec(seed=8), 0) != generate_tenant(DatasetSpec(seed=7), 0)
+
+
+def test_load_and_reconcile(client):
+    from app import models, services
+    from app.database import SessionLocal
+
+    spec = DatasetSpec(invoices_per_tenant=40, transactions_per_tenant=40, days=30)
+    with SessionLocal() as db:
+        tenant_id = load(db, spec)[0]
+        assert db.query(models.Invoice).filter_by(tenant_id=tenant_id).count() == 40
+        assert services.reconcile(db, tenant_id, full=True, mode="top_k")
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, insert
+
+from app import models
+from app.database import SessionLocal, engine
+from app.dedupe_matches import create_match_indexes, dedupe_matches
+
+
+def test_dedupe_keeps_confirmed_then_best_match_and_creates_indexes():
+    for index in models.Match.__table__.indexes:
+        index.drop(engine)
+
+    created = datetime(2026, 2, 1)
+    rows = [
+        ("keep-confirmed", "t1", "i1", "x1", 20, "confirmed", 0),
+        ("drop-1", "t1", "i1", "x1", 80, "proposed", 1),
+        ("keep-best", "t1", "i2", "x1", 80, "proposed", 2),
+        ("drop-2", "t1", "i2", "x1", 20, "proposed", 0),
+        ("keep-oldest", "t1", "i3", "x1", 50, "proposed", 0),
+        ("drop-3", "t1", "i3", "x1", 50, "proposed", 1),
+        ("keep-unique", "t2", "i1", "x1", 10, "proposed", 0),
+    ]
+    with SessionLocal() as db:
+        db.execute(insert(models.Match), [
+            {
+                "id": match_id,
+                "tenant_id": tenant_id,
+                "invoice_id": invoice_id,
+                "bank_transaction_id": tx_id,
+                "score": score,
+                "status": status,
+                "created_at": created + timedelta(minutes=offset),
+            }
+            for match_id, tenant_id, invoice_id, tx_id, score, status, offset in rows
+        ])
+        db.commit()
+
+        assert dedupe_matches(db) == 3
+        assert sorted(m.id for m in db.query(models.Match)) == [
+            "keep-best", "keep-confirmed", "keep-oldest", "keep-unique",
+        ]
+        assert dedupe_matches(db) == 0
+
+    create_match_indexes(engine)
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("matches")}
+    assert indexes["uq_match_pair"]["unique"]
+    assert {"idx_match_tenant_status", "idx_match_tenant_transaction"} <= set(indexes)
@@ -0,0 +1,310 @@
+from sqlalchemy import event
+
+from app import models
+from app.database import SessionLocal, engine
+
+NESTED_QUERY = """
+query ($tenantId: String!, $after: String) {
+  invoices(tenantId: $tenantId, first: 2, after: $after) {
+    edges {
+      cursor
+      node {
+        amount
+        tenant { name }
+        matches {
+          edges { node { score transaction { externalId } } }
+        }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+
+def _graphql(client, query, **variables):
+    resp = client.post("/graphql", json={"query": query, "variables": variables})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert "errors" not in body, body.get("errors")
+    return body["data"]
+
+
+def _seed(client):
+    tenant_id = client.post("/tenants", json={"name": "Acme"}).json()["id"]
+    invoice_ids = [
+        client.post(f"/tenants/{tenant_id}/invoices", json={"amount": amount}).json()["id"]
+        for amount in (10, 20, 30)
+    ]
+    with SessionLocal() as db:
+        for index, invoice_id in enumerate(invoice_ids):
+            for n in range(2):
+                tx = models.BankTransaction(
+                    tenant_id=tenant_id, external_id=f"tx-{index}-{n}", amount=10
+                )
+                db.add(tx)
+                db.flush()
+                db.add(models.Match(
+                    tenant_id=tenant_id,
+                    invoice_id=invoice_id,
+                    bank_transaction_id=tx.id,
+                    score=50 + n,
+                ))
+        db.commit()
+    return tenant_id
+
+
+def _capture_statements():
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_nested_fields_are_batched_and_paginated(client):
+    tenant_id = _seed(client)
+
+    statements, stop = _capture_statements()
+    try:
+        first = _graphql(client, NESTED_QUERY, tenantId=tenant_id)["invoices"]
+    finally:
+        stop()
+
+    assert [edge["node"]["amount"] for edge in first["edges"]] == [10, 20]
+    node = first["edges"][0]["node"]
+    assert node["tenant"] == {"name": "Acme"}
+    matches = sorted((edge["node"] for edge in node["matches"]["edges"]), key=lambda m: m["score"])
+    assert [m["score"] for m in matches] == [50, 51]
+    assert [m["transaction"]["externalId"] for m in matches] == ["tx-0-0", "tx-0-1"]
+
+    # invoices page, tenants, matches and transactions: one query each,
+    # however many invoices and matches are on the page.
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 4
+    assert sum(" IN (" in s for s in selects) == 3
+
+    assert first["pageInfo"]["hasNextPage"] is True
+    second = _graphql(
+        client, NESTED_QUERY, tenantId=tenant_id, after=first["pageInfo"]["endCursor"]
+    )["invoices"]
+    assert [edge["node"]["amount"] for edge in second["edges"]] == [30]
+    assert second["pageInfo"] == {
+        "hasNextPage": False,
+        "endCursor": second["edges"][0]["cursor"],
+    }
+
+
+def test_only_selected_columns_are_loaded(client):
+    tenant_id = _seed(client)
+
+    statements, stop = _capture_statements()
+    try:
+        data = _graphql(
+            client,
+            """
+            query ($tenantId: String!) {
+              invoices(tenantId: $tenantId) { edges { node { ...F } } }
+            }
+            fragment F on InvoiceType { id amount status }
+            """,
+            tenantId=tenant_id,
+        )
+    finally:
+        stop()
+
+    assert [edge["node"]["amount"] for edge in data["invoices"]["edges"]] == [10, 20, 30]
+    invoice_select = next(s for s in statements if "FROM invoices" in s)
+    assert "invoices.amount" in invoice_select
+    assert "invoices.status" in invoice_select
+    assert "invoices.description" not in invoice_select
+    assert "invoices.currency" not in invoice_select
+
+
+def test_tenants_connection_and_page_size_limit(client):
+    for name in ("A", "B", "C"):
+        client.post("/tenants", json={"name": name})
+
+    query = """
+    query ($after: String) {
+      tenants(first: 2, after: $after) {
+        edges { node { name } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+    """
+    first = _graphql(client, query)["tenants"]
+    second = _graphql(client, query, after=first["pageInfo"]["endCursor"])["tenants"]
+    names = [edge["node"]["name"] for edge in first["edges"] + second["edges"]]
+    assert names == ["A", "B", "C"]
+    assert second["pageInfo"]["hasNextPage"] is False
+
+    resp = client.post("/graphql", json={"query": "{ tenants(first: 1000) { edges { cursor } } }"})
+    assert "first must be between 1 and 100" in resp.json()["errors"][0]["message"]
+
+
+def test_persisted_queries(client, monkeypatch):
+    import strawberry.schema.schema as strawberry_schema
+
+    from app.graphql_extensions import query_hash
+
+    client.post("/tenants", json={"name": "Persisted"})
+    query = "query PersistedTenants { tenants(first: 5) { edges { node { name } } } }"
+    persisted = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+    missing = client.post("/graphql", json={"extensions": persisted}).json()
+    assert missing["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    parses = []
+    real_parse = strawberry_schema.parse
+    monkeypatch.setattr(
+        strawberry_schema, "parse", lambda *a, **kw: parses.append(1) or real_parse(*a, **kw)
+    )
+
+    registered = client.post("/graphql", json={"query": query, "extensions": persisted}).json()
+    assert registered["data"]["tenants"]["edges"] == [{"node": {"name": "Persisted"}}]
+
+    by_hash = client.post("/graphql", json={"extensions": persisted}).json()
+    by_text = client.post("/graphql", json={"query": query}).json()
+    assert by_hash["data"] == by_text["data"] == registered["data"]
+    # Parsed once on registration; later requests reuse the cached document.
+    assert len(parses) == 1
+
+    mismatch = client.post(
+        "/graphql",
+        json={"query": query, "extensions": {"persistedQuery": {"sha256Hash": "0" * 64}}},
+    ).json()
+    assert mismatch["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_HASH_MISMATCH"
+
+
+def test_depth_and_cost_limits(client, monkeypatch):
+    from app.graphql_extensions import settings as extension_settings
+
+    tenant_id = _seed(client)
+
+    deep = """
+    query ($tenantId: String!) {
+      invoices(tenantId: $tenantId) { edges { node { matches { edges { node { invoice {
+        matches { edges { node { invoice { id } } } }
+      } } } } } } }
+    }
+    """
+    resp = client.post("/graphql", json={"query": deep, "variables": {"tenantId": tenant_id}})
+    assert "exceeds maximum operation depth" in resp.json()["errors"][0]["message"]
+
+    monkeypatch.setattr(extension_settings, "GRAPHQL_MAX_COST", 50)
+    query = """
+    query ($tenantId: String!, $first: Int!) {
+      invoices(tenantId: $tenantId, first: $first) { edges { node { id amount } } }
+    }
+    """
+    cheap = _graphql(client, query, tenantId=tenant_id, first=5)
+    assert len(cheap["invoices"]["edges"]) == 3
+
+    resp = client.post(
+        "/graphql",
+        json={"query": query, "variables": {"tenantId": tenant_id, "first": 50}},
+    ).json()
+    assert resp["data"] is None
+    assert resp["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+
+
+def test_cost_counts_variable_defaults_and_unpaginated_lists(client, monkeypatch):
+    from app.graphql_extensions import settings as extension_settings
+
+    tenant_id = _seed(client)
+    monkeypatch.setattr(extension_settings, "GRAPHQL_MAX_COST", 50)
+
+    defaulted = """
+    query ($tenantId: String!, $first: Int = 50) {
+      invoices(tenantId: $tenantId, first: $first) { edges { node { id } } }
+    }
+    """
+    resp = client.post(
+        "/graphql", json={"query": defaulted, "variables": {"tenantId": tenant_id}}
+    ).json()
+    assert resp["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+    assert len(_graphql(client, defaulted, tenantId=tenant_id, first=5)["invoices"]["edges"]) == 3
+
+    # Nested `matches` pages are costed by their own `first` (default 20).
+    nested = """
+    query ($tenantId: String!, $matches: Int) {
+      invoices(tenantId: $tenantId, first: 1) {
+        edges { node { matches(first: $matches) { edges { node { score } } } } }
+      }
+    }
+    """
+    resp = client.post(
+        "/graphql", json={"query": nested, "variables": {"tenantId": tenant_id}}
+    ).json()
+    assert resp["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+    assert _graphql(client, nested, tenantId=tenant_id, matches=2)["invoices"]["edges"]
+
+
+def test_list_fields_without_first_cost_a_full_page(monkeypatch):
+    import strawberry
+    from graphql import parse
+
+    from app.graphql_extensions import query_cost, settings as extension_settings
+
+    @strawberry.type
+    class Item:
+        id: str
+
+    @strawberry.type
+    class Root:
+        items: list[Item]
+
+    monkeypatch.setattr(extension_settings, "GRAPHQL_MAX_PAGE_SIZE", 7)
+    schema = strawberry.Schema(query=Root)._schema
+    assert query_cost(schema, parse("{ items { id } }")) == 1 + 7 * 1
+
+
+def test_nested_matches_are_paginated(client):
+    tenant_id = _seed(client)
+    query = """
+    query ($tenantId: String!, $after: String) {
+      invoices(tenantId: $tenantId, first: 1) { edges { node {
+        matches(first: 1, after: $after) {
+          edges { cursor node { score } }
+          pageInfo { hasNextPage endCursor }
+        }
+      } } }
+    }
+    """
+
+    def page(after=None):
+        return _graphql(client, query, tenantId=tenant_id, after=after)["invoices"]["edges"][0]["node"]["matches"]
+
+    first = page()
+    assert len(first["edges"]) == 1 and first["pageInfo"]["hasNextPage"] is True
+    second = page(first["pageInfo"]["endCursor"])
+    assert len(second["edges"]) == 1 and second["pageInfo"]["hasNextPage"] is False
+    scores = {first["edges"][0]["node"]["score"], second["edges"][0]["node"]["score"]}
+    assert scores == {50, 51}
+
+
+def test_graphql_uses_request_session_dependency(client):
+    from app.database import get_db
+    from app.main import app
+
+    opened = []
+
+    def tracking_get_db():
+        for db in get_db():
+            opened.append(db)
+            yield db
+
+    client.post("/tenants", json={"name": "A"})
+    app.dependency_overrides[get_db] = tracking_get_db
+    try:
+        resp = client.post("/graphql", json={"query": "{ tenants { edges { node { id name } } } }"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert resp.status_code == 200
+    edges = resp.json()["data"]["tenants"]["edges"]
+    assert [edge["node"]["name"] for edge in edges] == ["A"]
+    assert len(opened) == 1
@@ -12,4 +12,42 @@ def test_create_invoice(client):
     invoice = invoice_resp.json()
     assert invoice["tenant_id"] == tenant["id"]
     assert invoice["status"] == "open"
-    assert invoice["id"]
+    assert invoice["id"]
+
+
+def test_list_invoices_keyset_pagination_and_filters(client):
+    tenant_id = client.post("/tenants", json={"name": "A"}).json()["id"]
+    for day in range(1, 6):
+        client.post(
+            f"/tenants/{tenant_id}/invoices",
+            json={"amount": 10 * day, "invoice_date": f"2026-02-0{day}T00:00:00"},
+        )
+
+    url = f"/tenants/{tenant_id}/invoices"
+    first = client.get(url, params={"limit": 2, "count": "exact"}).json()
+    assert first["total"] == 5
+    assert len(first["items"]) == 2
+
+    seen = [inv["id"] for inv in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = client.get(url, params={"limit": 2, "cursor": cursor}).json()
+        assert page["total"] is None
+        seen.extend(inv["id"] for inv in page["items"])
+        cursor = page["next_cursor"]
+
+    assert len(seen) == len(set(seen)) == 5
+
+    ranged = client.get(
+        url,
+        params={
+            "start_date": "2026-02-02T00:00:00",
+            "end_date": "2026-02-04T00:00:00",
+            "min_amount": 0,
+            "count": "estimated",
+        },
+    ).json()
+    assert ranged["total"] == 3
+    assert [inv["amount"] for inv in ranged["items"]] == [20, 30, 40]
+
+    assert client.get(url, params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,84 @@
+import pytest
+
+from app import metrics
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _seed(client, tenant_name="A"):
+    tenant_id = client.post("/tenants", json={"name": tenant_name}).json()["id"]
+    client.post(
+        f"/tenants/{tenant_id}/invoices",
+        json={"amount": 100, "description": "Office Supplies", "invoice_date": "2026-02-20T00:00:00"},
+    )
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": f"seed-{tenant_name}"},
+        json=[
+            {"external_id": "tx-1", "amount": 100, "description": "Office Supplies", "posted_at": "2026-02-21T00:00:00"},
+            {"external_id": "tx-2", "amount": 55, "description": "Fuel", "posted_at": "2026-02-21T00:00:00"},
+        ],
+    )
+    return tenant_id
+
+
+def test_metrics_endpoint_exposes_requests_by_route_template(client):
+    tenant_id = _seed(client)
+    client.get(f"/tenants/{tenant_id}/invoices")
+    client.get("/no-such-route")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    body = resp.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert (
+        'http_requests_total{method="GET",route="/tenants/{tenant_id}/invoices",'
+        f'status="200",tenant="{tenant_id}"}} 1'
+    ) in body
+    assert 'route="/tenants/{tenant_id}/invoices",tenant="' + tenant_id + '",le="+Inf"} 1' in body
+    assert 'http_requests_total{method="GET",route="unmatched",status="404",tenant=""} 1' in body
+    assert f'import_rows_total{{source="batch",tenant="{tenant_id}"}} 2' in body
+
+    # /metrics/db-pool is still a regular route.
+    assert client.get("/metrics/db-pool").status_code == 200
+
+
+def test_reconcile_and_explain_metrics(client):
+    tenant_id = _seed(client)
+    matches = client.post(f"/tenants/{tenant_id}/reconcile").json()
+
+    tenant = {"tenant": tenant_id}
+    assert metrics.RECONCILE_PAIRS_SCORED.value(**tenant) == 2
+    assert metrics.RECONCILE_MATCHES_PROPOSED.value(**tenant) == len(matches)
+    assert metrics.RECONCILE_PHASE.count(phase="score", **tenant) == 1
+    assert metrics.RECONCILE_PHASE.count(phase="commit", **tenant) == 1
+
+    params = {"invoice_id": matches[0]["invoice_id"], "transaction_id": matches[0]["bank_transaction_id"]}
+    client.get(f"/tenants/{tenant_id}/reconcile/explain", params=params)
+    client.get(f"/tenants/{tenant_id}/reconcile/explain", params=params)
+
+    assert metrics.LLM_LATENCY.count(outcome="ok", **tenant) == 1
+    assert metrics.EXPLANATIONS.value(source="llm", **tenant) == 1
+    assert metrics.EXPLANATIONS.value(source="cache", **tenant) == 1
+    assert metrics.EXPLANATIONS.value(source="fallback", **tenant) == 0
+
+
+def test_tenant_labels_are_capped(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MAX_TENANTS", 1)
+    first, second = _seed(client, "A"), _seed(client, "B")
+
+    assert metrics.tenant_label(first) == first
+    assert metrics.tenant_label(second) == metrics.OTHER_TENANT
+
+    client.get("/tenants/unknown/invoices")
+    assert metrics.HTTP_REQUESTS.value(
+        method="GET", route="/tenants/{tenant_id}/invoices", status="404", tenant=metrics.OTHER_TENANT,
+    ) == 1
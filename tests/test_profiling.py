@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from app import services
+from app.config import settings
+from app.database import SessionLocal
+from app.profiling import assert_max_queries, parameter_shape, profile_queries
+
+
+def _seed_match(client):
+    tenant_id = client.post("/tenants", json={"name": "A"}).json()["id"]
+    client.post(
+        f"/tenants/{tenant_id}/invoices",
+        json={"amount": 100, "description": "Office Supplies", "invoice_date": "2026-02-20T00:00:00"},
+    )
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "profile"},
+        json=[{"external_id": "tx-1", "amount": 100, "posted_at": "2026-02-21T00:00:00"}],
+    )
+    match_id = client.post(f"/tenants/{tenant_id}/reconcile").json()[0]["id"]
+    return tenant_id, match_id
+
+
+def test_debug_headers_count_request_queries(client, monkeypatch):
+    tenant_id, match_id = _seed_match(client)
+
+    assert "x-db-query-count" not in client.get(f"/tenants/{tenant_id}/invoices").headers
+
+    monkeypatch.setattr(settings, "DEBUG_SQL", True)
+    # Match and invoice lookups, two updates and the refresh; the tenant is cached.
+    with assert_max_queries(5) as captured:
+        resp = client.post(f"/tenants/{tenant_id}/matches/{match_id}/confirm")
+
+    assert resp.status_code == 200
+    assert int(resp.headers["x-db-query-count"]) == captured.count > 0
+    assert float(resp.headers["x-db-time-ms"]) >= 0
+
+
+def test_assert_max_queries_lists_statements_on_failure(client):
+    tenant_id, _ = _seed_match(client)
+
+    with pytest.raises(AssertionError, match="expected at most 1 queries") as exc:
+        with assert_max_queries(1):
+            client.get(f"/tenants/{tenant_id}/invoices", params={"count": "exact"})
+
+    assert "SELECT" in str(exc.value)
+
+
+def test_profile_queries_and_slow_query_log(client, monkeypatch, caplog):
+    tenant_id, _ = _seed_match(client)
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-6)
+
+    with caplog.at_level(logging.WARNING, logger="app.sql.slow"):
+        with profile_queries(keep_statements=True) as stats, SessionLocal() as db:
+            services.list_invoices(db, tenant_id, {"min_amount": 5}, count="exact")
+
+    assert stats.count == len(stats.statements) >= 2
+    assert stats.seconds > 0
+    slow = [record.getMessage() for record in caplog.records]
+    assert slow and all(message.startswith("slow query") for message in slow)
+    assert "params=" in slow[0] and "100" not in slow[0].split("params=")[1]
+
+
+def test_parameter_shape():
+    assert parameter_shape({"a": 1, "b": "x"}) == {"a": "int", "b": "str"}
+    assert parameter_shape((1, None)) == ["int", "NoneType"]
+    assert parameter_shape([{"a": 1}, {"a": 2}], executemany=True) == "2 x {'a': 'int'}"
+
+
+def test_failed_statements_are_timed_and_cleared():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    with SessionLocal() as db, profile_queries() as stats:
+        connection = db.connection()
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM no_such_table"))
+        assert stats.count == 1
+        assert not connection.info["query_started"]
@@ -1,3 +1,25 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app import models, parallel
+from app.config import settings
+from app.database import SessionLocal
+from app.reconciliation import (
+    assign_one_to_one,
+    score_batch,
+    score_batch_sharded,
+    score_candidates,
+    score_match,
+    select_top_k,
+    to_columns,
+)
+from app.services import reconcile
+
+
 def _setup_invoice_and_transaction(client):
     tenant_resp = client.post("/tenants", json={"name": "Tags"})
     tenant_id = tenant_resp.json()["id"]
@@ -48,6 +70,17 @@ def test_reconcile_returns_proposed_match(client):
     assert match["score"] > 0
 
 
+def test_match_created_at_has_one_format_on_every_path(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    proposed = client.post(f"/tenants/{tenant_id}/reconcile").json()[0]
+    [rescored] = _rescore_after_description_change(client, tenant_id)
+    confirmed = client.post(f"/tenants/{tenant_id}/matches/{proposed['id']}/confirm").json()
+
+    assert rescored["created_at"] == confirmed["created_at"] == proposed["created_at"]
+    assert not proposed["created_at"].endswith("Z")
+
+
 def test_reconcile_requires_transactions(client):
     tenant_resp = client.post("/tenants", json={"name": "Tags"})
     tenant_id = tenant_resp.json()["id"]
@@ -59,4 +92,692 @@ def test_reconcile_requires_transactions(client):
 
     resp = client.post(f"/tenants/{tenant_id}/reconcile")
     assert resp.status_code == 404
-    assert resp.json()["detail"] == "No bank transactions found for tenant"
+    assert resp.json()["detail"] == "No bank transactions found for tenant"
+
+
+def _brute_force(invoices, transactions):
+    return [
+        (inv, tx, score_match(inv, tx))
+        for inv in invoices
+        for tx in transactions
+        if score_match(inv, tx) > 0
+    ]
+
+
+def _random_rows(rng, count, date_field):
+    words = ["office", "supplies", "rent", "payroll", "Cloud", "hosting", "ab", "x"]
+    base = datetime(2026, 1, 1)
+    rows = []
+    for _ in range(count):
+        rows.append(
+            SimpleNamespace(
+                amount=rng.choice([100.0, 105.0, 95.0, 250.5])
+                if rng.random() < 0.3
+                else round(rng.uniform(1, 500), 2),
+                **{
+                    date_field: base + timedelta(hours=rng.randint(0, 24 * 60))
+                    if rng.random() < 0.8
+                    else None
+                },
+                description=" ".join(rng.sample(words, rng.randint(1, 3)))
+                if rng.random() < 0.8
+                else rng.choice([None, ""]),
+            )
+        )
+    return rows
+
+
+def test_candidate_scoring_matches_brute_force():
+    rng = random.Random(1234)
+    invoices = _random_rows(rng, 150, "invoice_date")
+    transactions = _random_rows(rng, 200, "posted_at")
+
+    assert list(score_candidates(invoices, transactions)) == _brute_force(
+        invoices, transactions
+    )
+
+
+def test_batch_scoring_matches_scalar_scorer():
+    rng = random.Random(4321)
+    invoices = _random_rows(rng, 120, "invoice_date")
+    transactions = _random_rows(rng, 90, "posted_at")
+
+    inv_amounts, inv_dates, inv_desc = to_columns(invoices, "invoice_date")
+    tx_amounts, tx_dates, tx_desc = to_columns(transactions, "posted_at")
+    batch = score_batch(inv_amounts, inv_dates, tx_amounts, tx_dates, inv_desc, tx_desc)
+
+    expected = [
+        (i, j, score_match(inv, tx))
+        for i, inv in enumerate(invoices)
+        for j, tx in enumerate(transactions)
+        if score_match(inv, tx) > 0
+    ]
+    assert batch == expected
+
+
+def test_reconcile_uses_batch_scorer_for_large_tenants(client, monkeypatch):
+    monkeypatch.setattr(settings, "RECONCILE_BATCH_MIN_PAIRS", 0)
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    resp = client.post(f"/tenants/{tenant_id}/reconcile")
+    assert resp.status_code == 200
+    assert [m["score"] for m in resp.json()] == [80]
+
+
+def test_reconcile_is_incremental(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    first = client.post(f"/tenants/{tenant_id}/reconcile")
+    assert len(first.json()) == 1
+
+    rerun = client.post(f"/tenants/{tenant_id}/reconcile")
+    assert rerun.status_code == 200
+    assert rerun.json() == []
+
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "reconcile-delta"},
+        json=[
+            {
+                "external_id": "tx-201",
+                "amount": 102,
+                "currency": "USD",
+                "description": "Unrelated",
+                "posted_at": "2026-03-30T00:00:00",
+            }
+        ],
+    )
+
+    delta = client.post(f"/tenants/{tenant_id}/reconcile")
+    assert delta.status_code == 200
+    matches = delta.json()
+    assert len(matches) == 1
+    assert matches[0]["score"] == 20
+
+    full = client.post(f"/tenants/{tenant_id}/reconcile", params={"full": True})
+    assert full.status_code == 200
+    assert full.json() == []
+
+
+def test_rows_committed_after_a_run_are_not_skipped(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+    client.post(f"/tenants/{tenant_id}/reconcile")
+
+    # Move both watermarks past the seeded rows.
+    client.post(f"/tenants/{tenant_id}/invoices", json={"amount": 5, "description": "Other"})
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "reconcile-late"},
+        json=[{"external_id": "tx-newer", "amount": 5, "description": "Unrelated"}],
+    )
+    client.post(f"/tenants/{tenant_id}/reconcile")
+
+    # Stamped before the run above read the table, but committed after it.
+    with SessionLocal() as db:
+        newest = db.query(models.BankTransaction).filter_by(external_id="tx-newer").one()
+        late = models.BankTransaction(
+            tenant_id=tenant_id,
+            external_id="tx-late",
+            amount=100,
+            description="Office Supplies Payment",
+            posted_at=datetime(2026, 2, 21),
+            created_at=newest.created_at - timedelta(milliseconds=1),
+        )
+        db.add(late)
+        db.commit()
+        late_id = late.id
+
+    proposed = client.post(f"/tenants/{tenant_id}/reconcile").json()
+    assert [m["score"] for m in proposed if m["bank_transaction_id"] == late_id] == [80]
+
+
+def _wait_for_job(client, tenant_id, job_id):
+    for _ in range(200):
+        job = client.get(f"/tenants/{tenant_id}/reconcile/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("reconcile job did not finish")
+
+
+def test_async_reconcile_job(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    resp = client.post(f"/tenants/{tenant_id}/reconcile", params={"async": True})
+    assert resp.status_code == 202
+    job_id = resp.json()["id"]
+    assert resp.json()["status"] == "queued"
+
+    job = _wait_for_job(client, tenant_id, job_id)
+    assert job["status"] == "succeeded"
+    assert job["pairs_scored"] == job["pairs_total"] == 1
+    assert job["finished_at"]
+
+    matches = client.get(f"/tenants/{tenant_id}/reconcile/jobs/{job_id}/matches")
+    assert matches.status_code == 200
+    assert [m["score"] for m in matches.json()] == [80]
+
+
+def test_async_reconcile_job_records_failure(client):
+    tenant_resp = client.post("/tenants", json={"name": "Tags"})
+    tenant_id = tenant_resp.json()["id"]
+
+    resp = client.post(f"/tenants/{tenant_id}/reconcile", params={"async": True})
+    job = _wait_for_job(client, tenant_id, resp.json()["id"])
+
+    assert job["status"] == "failed"
+    assert job["error"] == "No invoices found for tenant"
+
+    matches = client.get(f"/tenants/{tenant_id}/reconcile/jobs/{job['id']}/matches")
+    assert matches.status_code == 409
+
+
+def test_jobs_left_by_a_restart_are_recovered(client):
+    from app import jobs
+
+    tenant_id = _setup_invoice_and_transaction(client)
+    with SessionLocal() as db:
+        queued = models.ReconcileJob(tenant_id=tenant_id)
+        running = models.ReconcileJob(
+            tenant_id=tenant_id,
+            status="running",
+            heartbeat_at=datetime.now(timezone.utc) - timedelta(seconds=settings.RECONCILE_JOB_STALE_SECONDS + 1),
+        )
+        # Still run by another live process.
+        alive = models.ReconcileJob(tenant_id=tenant_id, status="running", heartbeat_at=datetime.now(timezone.utc))
+        db.add_all([queued, running, alive])
+        db.commit()
+        queued_id, running_id, alive_id = queued.id, running.id, alive.id
+
+    jobs.recover_reconcile_jobs()
+
+    assert _wait_for_job(client, tenant_id, queued_id)["status"] == "succeeded"
+    interrupted = client.get(f"/tenants/{tenant_id}/reconcile/jobs/{running_id}").json()
+    assert interrupted["status"] == "failed"
+    assert "restart" in interrupted["error"]
+    assert client.get(f"/tenants/{tenant_id}/reconcile/jobs/{alive_id}").json()["status"] == "running"
+
+    # A job recovered twice (e.g. by two processes) is claimed and run once.
+    with SessionLocal() as db:
+        assert db.query(models.Match).filter_by(tenant_id=tenant_id).count() == 1
+    jobs._run_reconcile_job(queued_id)
+    assert _wait_for_job(client, tenant_id, queued_id)["status"] == "succeeded"
+
+
+def test_jobs_whose_heartbeat_goes_stale_after_startup_are_failed(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(settings, "RECONCILE_JOB_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "RECONCILE_JOB_STALE_SECONDS", 0.2)
+
+    with SessionLocal() as db:
+        tenant = models.Tenant(name="Crashed")
+        db.add(tenant)
+        db.flush()
+        # Left by a process that crashed just before this one started.
+        job = models.ReconcileJob(
+            tenant_id=tenant.id, status="running", owner="gone", heartbeat_at=datetime.now(timezone.utc)
+        )
+        db.add(job)
+        db.commit()
+        tenant_id, job_id = tenant.id, job.id
+
+    with TestClient(app) as client:
+        assert client.get(f"/tenants/{tenant_id}/reconcile/jobs/{job_id}").json()["status"] == "running"
+        job = _wait_for_job(client, tenant_id, job_id)
+    assert job["status"] == "failed"
+    assert "restart" in job["error"]
+
+
+def test_running_jobs_refresh_their_heartbeat(client, monkeypatch):
+    import threading
+
+    from app import jobs
+
+    monkeypatch.setattr(settings, "RECONCILE_JOB_HEARTBEAT_SECONDS", 0.01)
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    release = threading.Event()
+    real_reconcile = jobs.services.reconcile
+
+    def blocking_reconcile(db, tenant_id, **options):
+        release.wait(5)
+        return real_reconcile(db, tenant_id, **options)
+
+    monkeypatch.setattr(jobs.services, "reconcile", blocking_reconcile)
+    job_id = client.post(f"/tenants/{tenant_id}/reconcile", params={"async": True}).json()["id"]
+
+    def heartbeat():
+        with SessionLocal() as db:
+            job = db.get(models.ReconcileJob, job_id)
+            return job.owner, job.heartbeat_at
+
+    for _ in range(200):
+        owner, first = heartbeat()
+        if first is not None:
+            break
+        time.sleep(0.01)
+    assert owner == jobs._OWNER
+    time.sleep(0.1)
+    assert heartbeat()[1] > first
+
+    release.set()
+    assert _wait_for_job(client, tenant_id, job_id)["status"] == "succeeded"
+
+
+def test_reconcile_jobs_respect_tenant_concurrency(client, monkeypatch):
+    import threading
+
+    from app import jobs
+
+    monkeypatch.setattr(settings, "ADMISSION_CONCURRENCY", 1)
+    busy = _setup_invoice_and_transaction(client)
+    other = _setup_invoice_and_transaction(client)
+
+    release = threading.Event()
+    started = []
+    real_reconcile = jobs.services.reconcile
+
+    def blocking_reconcile(db, tenant_id, **options):
+        started.append(tenant_id)
+        if tenant_id == busy:
+            release.wait(5)
+        return real_reconcile(db, tenant_id, **options)
+
+    monkeypatch.setattr(jobs.services, "reconcile", blocking_reconcile)
+
+    submit = lambda tenant_id: client.post(
+        f"/tenants/{tenant_id}/reconcile", params={"async": True}
+    ).json()["id"]
+    busy_jobs = [submit(busy) for _ in range(3)]
+    other_job = submit(other)
+
+    # The second worker skips the busy tenant's queued jobs and runs the other tenant's.
+    assert _wait_for_job(client, other, other_job)["status"] == "succeeded"
+    assert started.count(busy) == 1
+
+    release.set()
+    for job_id in busy_jobs:
+        assert _wait_for_job(client, busy, job_id)["status"] == "succeeded"
+    assert started.count(busy) == 3
+    assert not jobs._waiting and not jobs._running
+
+
+def test_select_top_k_keeps_best_per_invoice():
+    inv_a, inv_b = SimpleNamespace(id="a"), SimpleNamespace(id="b")
+    txs = [SimpleNamespace(id=str(i)) for i in range(4)]
+    scored = [
+        (inv_a, txs[0], 20),
+        (inv_a, txs[1], 80),
+        (inv_a, txs[2], 20),
+        (inv_a, txs[3], 50),
+        (inv_b, txs[0], 10),
+    ]
+
+    kept = select_top_k(scored, 2, min_score=20)
+
+    assert [(inv.id, tx.id, s) for inv, tx, s in kept] == [
+        ("a", "1", 80),
+        ("a", "3", 50),
+    ]
+
+
+def test_assign_one_to_one_is_globally_optimal():
+    inv_a, inv_b = SimpleNamespace(id="a"), SimpleNamespace(id="b")
+    tx_1, tx_2 = SimpleNamespace(id="1"), SimpleNamespace(id="2")
+    scored = [(inv_a, tx_1, 80), (inv_a, tx_2, 70), (inv_b, tx_1, 70)]
+
+    assigned = assign_one_to_one(scored)
+
+    assert [(inv.id, tx.id) for inv, tx, _ in assigned] == [("a", "2"), ("b", "1")]
+
+
+def test_reconcile_assignment_mode(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "reconcile-assignment"},
+        json=[
+            {
+                "external_id": "tx-202",
+                "amount": 101,
+                "currency": "USD",
+                "posted_at": "2026-02-21T00:00:00",
+            }
+        ],
+    )
+
+    resp = client.post(
+        f"/tenants/{tenant_id}/reconcile",
+        params={"mode": "assignment", "min_score": 50},
+    )
+    assert resp.status_code == 200
+    assert [m["score"] for m in resp.json()] == [80]
+
+    invalid = client.post(f"/tenants/{tenant_id}/reconcile", params={"mode": "best"})
+    assert invalid.status_code == 422
+
+
+def _seed_random_tenant(db, seed):
+    rng = random.Random(seed)
+    tenant = models.Tenant(name="Random")
+    db.add(tenant)
+    db.flush()
+
+    for row in _random_rows(rng, 60, "invoice_date"):
+        db.add(models.Invoice(tenant_id=tenant.id, **vars(row)))
+    for row in _random_rows(rng, 80, "posted_at"):
+        db.add(models.BankTransaction(tenant_id=tenant.id, **vars(row)))
+    db.commit()
+
+    return tenant.id
+
+
+def test_sql_engine_matches_python_engine(monkeypatch):
+    with SessionLocal() as db:
+        python_tenant = _seed_random_tenant(db, 99)
+        sql_tenant = _seed_random_tenant(db, 99)
+
+        python_matches = reconcile(db, python_tenant)
+        monkeypatch.setattr(settings, "RECONCILE_ENGINE", "sql")
+        sql_matches = reconcile(db, sql_tenant, min_score=20)
+
+        by_id = {}
+        for tenant_id in (python_tenant, sql_tenant):
+            for table in (models.Invoice, models.BankTransaction):
+                ids = db.query(table.id).filter_by(tenant_id=tenant_id).order_by(table.created_at)
+                for position, (row_id,) in enumerate(ids):
+                    by_id[row_id] = position
+
+    def _pairs(matches):
+        return sorted(
+            (by_id[m["invoice_id"]], by_id[m["bank_transaction_id"]], m["score"])
+            for m in matches
+        )
+
+    expected = [pair for pair in _pairs(python_matches) if pair[2] >= 20]
+    assert expected
+    assert _pairs(sql_matches) == expected
+    assert all(m["status"] == "proposed" for m in sql_matches)
+
+
+def test_sql_engine_applies_each_watermark_on_its_own(monkeypatch):
+    import pytest
+    from pydantic import ValidationError
+
+    from app.config import Settings
+
+    with pytest.raises(ValidationError):
+        Settings(RECONCILE_ENGINE="SQL")
+
+    def seed_with_marks(db, invoice_mark, tx_mark):
+        tenant_id = _seed_random_tenant(db, 7)
+        db.add(models.ReconcileWatermark(
+            tenant_id=tenant_id, invoices_created_at=invoice_mark, transactions_created_at=tx_mark
+        ))
+        for table, mark in ((models.Invoice, invoice_mark), (models.BankTransaction, tx_mark)):
+            rows = db.query(table).filter_by(tenant_id=tenant_id).all()
+            rows.sort(key=lambda row: (row.amount, row.description or ""))
+            for position, row in enumerate(rows):
+                # Every other row predates its watermark.
+                row.created_at = (mark or datetime(2026, 1, 1)) + timedelta(seconds=1 - 2 * (position % 2))
+        db.commit()
+        return tenant_id
+
+    def pairs(db, matches):
+        return sorted(
+            (db.get(models.Invoice, m["invoice_id"]).amount,
+             db.get(models.BankTransaction, m["bank_transaction_id"]).amount,
+             m["score"])
+            for m in matches
+        )
+
+    mark = datetime(2026, 1, 1)
+    for invoice_mark, tx_mark in ((mark, None), (None, mark), (mark, mark)):
+        with SessionLocal() as db:
+            python_tenant = seed_with_marks(db, invoice_mark, tx_mark)
+            sql_tenant = seed_with_marks(db, invoice_mark, tx_mark)
+
+            monkeypatch.setattr(settings, "RECONCILE_ENGINE", "python")
+            expected = [p for p in pairs(db, reconcile(db, python_tenant)) if p[2] >= 20]
+            monkeypatch.setattr(settings, "RECONCILE_ENGINE", "sql")
+            assert pairs(db, reconcile(db, sql_tenant, min_score=20)) == expected
+
+
+def test_sharded_batch_scoring_matches_batch_scorer():
+    rng = random.Random(2468)
+    inv_columns = to_columns(_random_rows(rng, 101, "invoice_date"), "invoice_date")
+    tx_columns = to_columns(_random_rows(rng, 77, "posted_at"), "posted_at")
+
+    covered = []
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as executor:
+        sharded = score_batch_sharded(executor, 3, inv_columns, tx_columns, progress=covered.append)
+
+    assert sharded == score_batch(*inv_columns[:2], *tx_columns[:2], inv_columns[2], tx_columns[2])
+    assert sum(covered) == 101 * 77 and len(covered) == 3
+
+
+def test_parallel_reconcile_matches_single_process(monkeypatch):
+    monkeypatch.setattr(settings, "RECONCILE_BATCH_MIN_PAIRS", 0)
+    monkeypatch.setattr(settings, "RECONCILE_PARALLEL_MIN_PAIRS", 0)
+
+    with SessionLocal() as db:
+        single_tenant = _seed_random_tenant(db, 7)
+        parallel_tenant = _seed_random_tenant(db, 7)
+
+        single = reconcile(db, single_tenant, mode="top_k")
+
+        monkeypatch.setattr(settings, "RECONCILE_PROCESSES", 2)
+        monkeypatch.setattr(parallel.os, "cpu_count", lambda: 2)
+        try:
+            sharded = reconcile(db, parallel_tenant, mode="top_k")
+            assert parallel._executor is not None
+        finally:
+            parallel.shutdown()
+
+        descriptions = {}
+        for table in (models.Invoice, models.BankTransaction):
+            for row in db.query(table):
+                descriptions[row.id] = (row.amount, row.description)
+
+    def _key(matches):
+        return [
+            (descriptions[m["invoice_id"]], descriptions[m["bank_transaction_id"]], m["score"])
+            for m in matches
+        ]
+
+    assert single
+    assert _key(sharded) == _key(single)
+
+
+def _rescore_after_description_change(client, tenant_id):
+    with SessionLocal() as db:
+        db.query(models.BankTransaction).filter_by(tenant_id=tenant_id).update(
+            {"description": "Unrelated"}
+        )
+        db.commit()
+    return client.post(f"/tenants/{tenant_id}/reconcile", params={"full": True}).json()
+
+
+def test_full_reconcile_rescores_proposals_in_place(client, monkeypatch):
+    for engine_name in ("python", "sql"):
+        monkeypatch.setattr(settings, "RECONCILE_ENGINE", engine_name)
+        tenant_id = _setup_invoice_and_transaction(client)
+
+        first = client.post(f"/tenants/{tenant_id}/reconcile").json()
+        assert [m["score"] for m in first] == [80]
+
+        rescored = _rescore_after_description_change(client, tenant_id)
+        assert [(m["id"], m["score"]) for m in rescored] == [(first[0]["id"], 70)]
+
+        with SessionLocal() as db:
+            rows = db.query(models.Match).filter_by(tenant_id=tenant_id).all()
+            assert [(row.id, row.score) for row in rows] == [(first[0]["id"], 70)]
+
+
+def test_full_reconcile_withdraws_proposals_that_drop_below_min_score(client, monkeypatch):
+    for engine_name in ("python", "sql"):
+        monkeypatch.setattr(settings, "RECONCILE_ENGINE", engine_name)
+        tenant_id = _setup_invoice_and_transaction(client)
+        assert len(client.post(f"/tenants/{tenant_id}/reconcile").json()) == 1
+
+        with SessionLocal() as db:
+            db.query(models.BankTransaction).filter_by(tenant_id=tenant_id).update(
+                {"description": "Unrelated"}
+            )
+            db.commit()
+        rescored = client.post(
+            f"/tenants/{tenant_id}/reconcile", params={"full": True, "min_score": 75}
+        ).json()
+        assert rescored == []
+
+        with SessionLocal() as db:
+            assert db.query(models.Match).filter_by(tenant_id=tenant_id).count() == 0
+
+
+def test_full_reconcile_withdraws_proposals_that_stop_scoring(client, monkeypatch):
+    for engine_name in ("python", "sql"):
+        monkeypatch.setattr(settings, "RECONCILE_ENGINE", engine_name)
+        tenant_id = _setup_invoice_and_transaction(client)
+        assert len(client.post(f"/tenants/{tenant_id}/reconcile").json()) == 1
+
+        with SessionLocal() as db:
+            db.query(models.BankTransaction).filter_by(tenant_id=tenant_id).update(
+                {"amount": 900, "description": "Unrelated", "posted_at": datetime(2025, 1, 1)}
+            )
+            db.commit()
+        assert client.post(f"/tenants/{tenant_id}/reconcile", params={"full": True}).json() == []
+
+        with SessionLocal() as db:
+            assert db.query(models.Match).filter_by(tenant_id=tenant_id).count() == 0
+
+
+def test_only_rescored_proposals_are_upserted(client):
+    from app.profiling import capture_queries
+
+    tenant_id = _setup_invoice_and_transaction(client)
+
+    with capture_queries() as first:
+        assert len(client.post(f"/tenants/{tenant_id}/reconcile").json()) == 1
+    with capture_queries() as rescore:
+        assert len(_rescore_after_description_change(client, tenant_id)) == 1
+
+    def upserts(capture):
+        return [s for s in capture.statements if "INSERT INTO matches" in s and "ON CONFLICT" in s]
+
+    assert not upserts(first)
+    assert upserts(rescore)
+
+
+def test_confirmed_matches_are_not_rescored(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+    match = client.post(f"/tenants/{tenant_id}/reconcile").json()[0]
+    client.post(f"/tenants/{tenant_id}/matches/{match['id']}/confirm")
+
+    assert _rescore_after_description_change(client, tenant_id) == []
+    with SessionLocal() as db:
+        stored = db.get(models.Match, match["id"])
+        assert (stored.status, stored.score) == ("confirmed", 80)
+
+
+def test_capped_reruns_replace_proposals_instead_of_adding(client):
+    tenant_id = _setup_invoice_and_transaction(client)
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "reconcile-rerun"},
+        json=[
+            {"external_id": f"tx-3{n}", "amount": 100 + n, "currency": "USD",
+             "posted_at": "2026-02-22T00:00:00"}
+            for n in range(3)
+        ],
+    )
+
+    def proposals():
+        with SessionLocal() as db:
+            return sorted(
+                (match.score, match.id)
+                for match in db.query(models.Match).filter_by(tenant_id=tenant_id)
+            )
+
+    for mode in ("top_k", "assignment"):
+        for _ in range(4):
+            client.post(
+                f"/tenants/{tenant_id}/reconcile",
+                params={"mode": mode, "top_k": 1, "full": True},
+            )
+            assert [score for score, _ in proposals()] == [80]
+
+    first = proposals()
+    client.post(f"/tenants/{tenant_id}/reconcile", params={"mode": "top_k", "top_k": 2, "full": True})
+    second = proposals()
+    assert len(second) == 2 and first[0] in second
+
+    # A better transaction arriving later replaces the weaker proposal.
+    client.post(
+        f"/tenants/{tenant_id}/bank-transactions/import",
+        headers={"Idempotency-Key": "reconcile-rerun-better"},
+        json=[{
+            "external_id": "tx-400",
+            "amount": 100,
+            "currency": "USD",
+            "description": "Office Supplies Payment",
+            "posted_at": "2026-02-20T00:00:00",
+        }],
+    )
+    delta = client.post(f"/tenants/{tenant_id}/reconcile", params={"mode": "top_k", "top_k": 2}).json()
+    assert [m["score"] for m in delta] == [80]
+    assert [score for score, _ in proposals()] == [80, 80]
+
+
+def test_only_matches_near_the_scored_pairs_are_loaded():
+    from app.services import _existing_matches
+
+    with SessionLocal() as db:
+        tenant = models.Tenant(name="Neighbours")
+        db.add(tenant)
+        db.flush()
+        invoices = [models.Invoice(tenant_id=tenant.id, amount=100) for _ in range(3)]
+        transactions = [models.BankTransaction(tenant_id=tenant.id, amount=100) for _ in range(3)]
+        db.add_all(invoices + transactions)
+        db.flush()
+        (a, b, c), (t1, t2, t3) = invoices, transactions
+        db.add_all([
+            models.Match(tenant_id=tenant.id, invoice_id=a.id, bank_transaction_id=t1.id, score=50),
+            models.Match(tenant_id=tenant.id, invoice_id=b.id, bank_transaction_id=t2.id, score=50),
+            models.Match(
+                tenant_id=tenant.id, invoice_id=c.id, bank_transaction_id=t1.id, score=90, status="confirmed"
+            ),
+        ])
+        db.commit()
+
+        scored = [(SimpleNamespace(id=a.id), SimpleNamespace(id=t3.id), 70)]
+        assert set(_existing_matches(db, tenant.id, scored, "all")) == {(a.id, t1.id)}
+        # The confirmed match on t1 rules out the standing proposal (a, t1).
+        assert set(_existing_matches(db, tenant.id, scored, "top_k")) == {(a.id, t1.id), (c.id, t1.id)}
+
+
+def test_first_reconcile_losing_the_watermark_insert_keeps_the_winners_row(monkeypatch):
+    from app.services import _get_watermark
+
+    mark = datetime(2026, 2, 20)
+    with SessionLocal() as db:
+        tenant = models.Tenant(name="Racing")
+        db.add(tenant)
+        db.flush()
+        db.add(models.ReconcileWatermark(tenant_id=tenant.id, invoices_created_at=mark))
+        db.commit()
+        tenant_id = tenant.id
+
+    with SessionLocal() as db:
+        # The concurrent reconcile inserted its row after this one looked.
+        lookups = []
+        real_get = db.get
+
+        def get(model, ident):
+            lookups.append(ident)
+            return None if len(lookups) == 1 else real_get(model, ident)
+
+        monkeypatch.setattr(db, "get", get)
+        assert _get_watermark(db, tenant_id).invoices_created_at == mark
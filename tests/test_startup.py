@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+from app.config import settings
+from app.database import Base, engine
+from app.main import app
+from benchmarks.importtime import LAZY
+
+
+def test_app_import_is_lazy_and_side_effect_free(tmp_path):
+    db_path = tmp_path / "startup.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+    code = (
+        "import sys, app.main; "
+        f"print(sorted({{m.split('.')[0] for m in sys.modules}} & set({LAZY!r})))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parents[1],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
+    assert not db_path.exists()
+
+
+def test_lifespan_creates_schema_unless_disabled(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+
+    monkeypatch.setattr(settings, "CREATE_SCHEMA_ON_STARTUP", False)
+    with TestClient(app):
+        assert not inspect(engine).has_table("tenants")
+
+    monkeypatch.setattr(settings, "CREATE_SCHEMA_ON_STARTUP", True)
+    with TestClient(app):
+        assert inspect(engine).has_table("tenants")
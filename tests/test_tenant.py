@@ -0,0 +1,23 @@
+from sqlalchemy import event
+
+from app import services
+from app.database import engine
+
+
+def test_tenant_lookup_is_cached(client):
+    tenant_id = client.post("/tenants", json={"name": "A"}).json()["id"]
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        resp = client.post(f"/tenants/{tenant_id}/invoices", json={"amount": 10})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert resp.status_code == 200
+    assert not any("FROM tenants" in statement for statement in statements)
+
+    services.invalidate_tenant(tenant_id)
+    assert client.post(f"/tenants/{tenant_id}/invoices", json={"amount": 10}).status_code == 200
+    assert client.post("/tenants/missing/invoices", json={"amount": 10}).status_code == 404